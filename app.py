@@ -1,22 +1,19 @@
-import json
 import streamlit as st
 from modules.api_functions import generate_access_token
+from modules.dashboard_functions import select_athlete
 from modules.objects.RideDataProcessor import RideDataProcessor
-from modules.objects.RideHub import RideHub
-
-with open('data/saved_strava_rides.json', 'rb') as file:
-    saved_ride_hub = RideHub(*json.load(file))
 
 st.set_page_config(page_title="Home Page", layout="centered")
 
 
 def main():
     st.title("Frank's Ride Views")
+    athlete, ride_hub = select_athlete()
 
     if st.button("Refresh Data"):
-        token = generate_access_token()
+        token = generate_access_token(athlete.refresh_token)
         headers = {'Authorization': f'Authorization: Bearer {token}'}
-        processor = RideDataProcessor(token, headers, saved_ride_hub)
+        processor = RideDataProcessor(token, headers, ride_hub, save_path=athlete.rides_path, ftp=athlete.ftp)
 
         status_placeholder = st.empty()
         updated_count = processor.retrieve_and_process_new_ride_data(status_placeholder)
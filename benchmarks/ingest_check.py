@@ -0,0 +1,73 @@
+"""
+End-to-end check of the ingest path: synthetic rides are pushed through `RideDataProcessor.process_single_ride()`
+(with the Strava streams request answered locally), and every value derived at ingest must already be in place when
+the hub's listeners are notified.  In particular, the gear ledger's TSS for each ride must equal the ride's TSS as
+calculated afterwards from the hub.
+
+    python -m benchmarks.ingest_check
+    python -m benchmarks.ingest_check --rides 20
+"""
+import argparse
+import math
+import sys
+import numpy as np
+from benchmarks.synthetic_rides import generate_synthetic_ride_history
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rides', type=int, default=5)
+    parser.add_argument('--duration', type=int, default=1800, help="Mean ride duration in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def run_ingest_check(n_rides: int, mean_duration_seconds: int, seed: int) -> list[str]:
+    """Returns a description of every ride whose derived values were missing or wrong when listeners saw it"""
+    from modules.objects import RideDataProcessor as ride_data_processor_module
+    from modules.objects.GearLedger import GearLedger
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.objects.RideMetadataTable import _calculate_ride_training_stress_score
+
+    history = generate_synthetic_ride_history(n_rides=n_rides, mean_duration_seconds=mean_duration_seconds,
+                                              seed=seed)
+    streams = {ride['id']: ride['metrics_dict'] for ride in history}
+    activities = [{key: value for key, value in ride['metadata'].items() if key != 'ftp'} for ride in history]
+
+    ride_hub = IsolatedRideHub()
+    gear_ledger = GearLedger()
+    ride_hub.register_listener(gear_ledger)
+    processor = ride_data_processor_module.RideDataProcessor('', {}, ride_hub, save_path='', ftp=250)
+
+    # The only network request in process_single_ride() is the streams request
+    original_get_activity_streams = ride_data_processor_module.get_activity_streams
+    ride_data_processor_module.get_activity_streams = lambda token, activity_id: streams[activity_id]
+    try:
+        for activity in activities:
+            processor.process_single_ride(activity['id'], activities)
+    finally:
+        ride_data_processor_module.get_activity_streams = original_get_activity_streams
+
+    failures = []
+    for ride in ride_hub:
+        expected_tss = _calculate_ride_training_stress_score(ride)
+        ledger_tss = (gear_ledger.get_ride_contribution(ride.id) or {}).get('tss', 0.0)
+        # The ledger rounds its totals to 2 decimal places
+        if math.isnan(expected_tss) or not np.isclose(ledger_tss, expected_tss, atol=0.01):
+            failures.append(f"ride {ride.id}: ledger TSS {ledger_tss:.1f}, ride TSS {expected_tss:.1f}")
+        if not ride.metrics_dict.get('power_curve') or 'quality_flags' not in ride.metrics_dict:
+            failures.append(f"ride {ride.id}: power curve or quality flags missing")
+    return failures
+
+
+def main() -> int:
+    args = parse_args()
+    failures = run_ingest_check(args.rides, args.duration, args.seed)
+    for failure in failures:
+        print(failure)
+    print(f"{'FAILED' if failures else 'OK'}: {args.rides} rides ingested")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
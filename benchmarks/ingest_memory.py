@@ -0,0 +1,101 @@
+"""
+Peak-memory check for the streaming JSON ingest path (`modules.ride_io.iter_rides_from_json_file`).
+
+A synthetic history is written to a temporary file, then each ingest path runs in a fresh interpreter which reports
+its peak resident set size (RSS).  The streaming path must stay within `--max-ride-multiple` times the size of the
+largest single ride (as JSON) above the interpreter's baseline, no matter how large the whole file is.  `json.load`
+is measured alongside for comparison.
+
+    python -m benchmarks.ingest_memory
+    python -m benchmarks.ingest_memory --rides 400 --max-ride-multiple 25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each snippet imports everything it needs first, records the RSS, runs the ingest, and prints both RSS values (KB)
+_MEASUREMENT_TEMPLATE = """
+import json, resource, sys
+from modules.ride_io import iter_rides_from_json_file
+from modules.stream_codec import encode_metrics_dict
+baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+{body}
+print(json.dumps({{'baseline_kb': baseline_kb, 'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+INGEST_PATHS = {
+    'streaming': "for ride in iter_rides_from_json_file(sys.argv[1]):\n"
+                 "    encode_metrics_dict(ride['metrics_dict'])",
+    'json.load': "for ride in json.load(open(sys.argv[1])):\n"
+                 "    encode_metrics_dict(ride['metrics_dict'])",
+}
+
+
+def measure_peak_rss(ingest_path: str, data_path: str) -> dict:
+    """Runs one ingest path in a fresh interpreter and returns its baseline and peak RSS in bytes"""
+    code = _MEASUREMENT_TEMPLATE.format(body=INGEST_PATHS[ingest_path])
+    result = subprocess.run([sys.executable, '-c', code, data_path], cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"The `{ingest_path}` measurement failed:\n{result.stderr[-2000:]}")
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    # ru_maxrss is reported in KB on Linux
+    return {key.replace('_kb', '_bytes'): value * 1024 for key, value in measurement.items()}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that streaming ingest memory is bounded by the largest ride")
+    parser.add_argument('--rides', type=int, default=200)
+    parser.add_argument('--duration', type=int, default=5400, help="Mean ride duration in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-ride-multiple', type=float, default=20,
+                        help="Allowed peak RSS growth, as a multiple of the largest ride's JSON size")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic_rides import generate_synthetic_ride_history
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, 'saved_strava_rides.json')
+        largest_ride_bytes = 0
+        with open(data_path, 'w') as file:
+            file.write('[')
+            # Generated in batches so the generator itself doesn't hold the whole history either
+            for batch_start in range(0, args.rides, 20):
+                batch = generate_synthetic_ride_history(n_rides=min(20, args.rides - batch_start),
+                                                        mean_duration_seconds=args.duration,
+                                                        seed=args.seed + batch_start)
+                for ride in batch:
+                    ride['id'] += batch_start
+                    ride_json = json.dumps(ride)
+                    largest_ride_bytes = max(largest_ride_bytes, len(ride_json))
+                    file.write((', ' if file.tell() > 1 else '') + ride_json)
+            file.write(']')
+
+        file_bytes = os.path.getsize(data_path)
+        print(f"History: {args.rides} rides, {file_bytes / 1e6:.1f} MB, largest ride {largest_ride_bytes / 1e6:.2f} MB")
+        print(f"{'ingest path':<14}{'peak growth (MB)':>18}{'x largest ride':>16}{'x file size':>13}")
+        print('-' * 61)
+
+        results = {}
+        for ingest_path in INGEST_PATHS:
+            measurement = measure_peak_rss(ingest_path, data_path)
+            growth = measurement['peak_bytes'] - measurement['baseline_bytes']
+            results[ingest_path] = growth
+            print(f"{ingest_path:<14}{growth / 1e6:>18.1f}{growth / largest_ride_bytes:>16.1f}"
+                  f"{growth / file_bytes:>13.2f}")
+
+    allowed_bytes = args.max_ride_multiple * largest_ride_bytes
+    if results['streaming'] > allowed_bytes:
+        print(f"\nStreaming ingest grew by {results['streaming'] / 1e6:.1f} MB, more than "
+              f"{args.max_ride_multiple:g}x the largest ride ({allowed_bytes / 1e6:.1f} MB)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
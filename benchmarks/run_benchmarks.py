@@ -0,0 +1,237 @@
+"""
+Times the hot paths of the project against a synthetic ride history, and compares the results to a stored baseline.
+
+Run from the repository root (`global_variables.py` must be importable):
+
+    python -m benchmarks.run_benchmarks                  # run and compare against benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --save-baseline  # run and store the results as the new baseline
+    python -m benchmarks.run_benchmarks --rides 500 --codec-report
+
+The process exits with a non-zero status if any benchmark is slower than its baseline by more than `--tolerance`, or
+if there is no baseline recorded with the same synthetic history settings to compare against.  With `--codec-report`
+it also fails if a `latlng` stream does not survive an encode/decode round trip to 6 decimal places.  The committed
+baseline uses the default settings; timings depend on the machine, so re-record it with `--save-baseline` wherever
+the comparison runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+POWER_CURVE_RIDE_ID = 1
+
+
+# Internal use
+def _parse_arguments(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths against a synthetic ride history")
+    parser.add_argument('--rides', type=int, default=200, help="Number of rides in the synthetic history")
+    parser.add_argument('--duration', type=int, default=5400, help="Mean ride duration in seconds")
+    parser.add_argument('--outdoor-fraction', type=float, default=0.6, help="Fraction of rides with GPS data")
+    parser.add_argument('--power-curve-seconds', type=int, default=900,
+                        help="Length of the ride used for the power curve benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="Number of timed runs per benchmark")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown relative to the baseline before failing (0.25 = 25%%)")
+    parser.add_argument('--codec-report', action='store_true',
+                        help="Also report bytes per ride before and after stream encoding, and check that "
+                             "coordinates round-trip through both codec layouts")
+    return parser.parse_args(argv)
+
+
+def _time_function(function: Callable, repeat: int) -> dict:
+    """Runs `function` once to warm up, then `repeat` more times, returning the median and minimum in seconds"""
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def _write_synthetic_history(directory: str, args: argparse.Namespace) -> str:
+    """Writes a synthetic `data/saved_strava_rides.json` into `directory`, returning its path"""
+    from benchmarks.synthetic_rides import generate_synthetic_ride, generate_synthetic_ride_history
+
+    rides = generate_synthetic_ride_history(n_rides=args.rides,
+                                            mean_duration_seconds=args.duration,
+                                            outdoor_fraction=args.outdoor_fraction,
+                                            seed=args.seed)
+    # The power curve is O(n^2) in ride length, so it gets its own short ride to keep the benchmark quick
+    rides.append(generate_synthetic_ride(np.random.default_rng(args.seed), ride_id=POWER_CURVE_RIDE_ID,
+                                         start_date=datetime(2020, 1, 1), duration_seconds=args.power_curve_seconds,
+                                         outdoor=False))
+
+    os.makedirs(os.path.join(directory, 'data'), exist_ok=True)
+    path = os.path.join(directory, 'data', 'saved_strava_rides.json')
+    with open(path, 'w') as file:
+        json.dump(rides, file)
+    return path
+
+
+def _create_benchmarks(data_path: str) -> dict[str, Callable]:
+    """
+    Loads the synthetic history into a hub, and returns the hot paths to time over it
+    """
+    from modules.data_functions import create_ride_summary_dataframe
+    from modules.objects.RideDataProcessor import RideDataProcessor
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.ride_io import load_ride_hub
+    from modules.plotting import plot_weekly_tss
+    from modules.power_functions import calculate_normalized_power_for_rides, create_individual_ride_power_curve_array
+    from modules.training_stress_balance_functions import get_ctl_and_atl_dataframe, project_ctl_atl_tsb
+
+    # With the shared ride list re-loading the same file would be a no-op, so each load gets its own list
+    def load_hub():
+        load_ride_hub(data_path, ride_hub_class=IsolatedRideHub)
+
+    ride_hub = load_ride_hub(data_path, ride_hub_class=IsolatedRideHub)
+    processor = RideDataProcessor(token='', headers={}, ride_hub=ride_hub)
+    forecast_plans = np.random.default_rng(0).uniform(0, 150, (1000, 12 * 7))
+    return {'hub_load': load_hub,
+            'create_ride_summary_dataframe': lambda: create_ride_summary_dataframe(ride_hub),
+            'create_individual_ride_power_curve_array':
+                lambda: create_individual_ride_power_curve_array(ride_hub, POWER_CURVE_RIDE_ID),
+            'normalized_power_all_rides': lambda: calculate_normalized_power_for_rides(ride_hub),
+            'get_ctl_and_atl_dataframe': lambda: get_ctl_and_atl_dataframe(ride_hub),
+            'summary_last_six_weeks':
+                lambda: create_ride_summary_dataframe(ride_hub.query(start=datetime.today() - timedelta(weeks=6))),
+            'plot_weekly_tss': lambda: plot_weekly_tss(ride_hub),
+            'project_1000_plans_12_weeks': lambda: project_ctl_atl_tsb(forecast_plans, 60, 70),
+            'json_save': processor._save_ride_hub_to_file}
+
+
+def _print_results_table(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints a comparison table and returns the names of any benchmarks which regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<42}{'median (ms)':>14}{'min (ms)':>12}{'baseline (ms)':>16}{'change':>10}")
+    print('-' * 94)
+    for name, timing in results.items():
+        baseline_median = baseline.get(name, {}).get('median')
+        baseline_text, change_text = '-', '-'
+        if baseline_median:
+            change = timing['median'] / baseline_median - 1
+            baseline_text, change_text = f"{baseline_median * 1000:.1f}", f"{change:+.0%}"
+            if change > tolerance:
+                regressions.append(name)
+                change_text += ' !'
+        print(f"{name:<42}{timing['median'] * 1000:>14.1f}{timing['min'] * 1000:>12.1f}"
+              f"{baseline_text:>16}{change_text:>10}")
+    return regressions
+
+
+def _check_latlng_round_trip(metrics_dicts: list[dict]) -> list[str]:
+    """
+    Returns a description of every `latlng` stream which does not come back from the raw and compact codec layouts
+    as the original coordinates rounded to 6 decimal places (the precision Strava reports)
+    """
+    from modules.stream_codec import convert_typed_array_to_stream, decode_metrics_dict, encode_metrics_dict
+
+    # Coordinates which float32 cannot hold to 6 decimal places
+    metrics_dicts = [{'time': [0, 1, 2], 'latlng': [[51.6, -0.127758], [51.500012, -0.1], None]}] + metrics_dicts
+    failures = []
+    for idx, metrics_dict in enumerate(metrics_dicts):
+        if 'latlng' not in metrics_dict:
+            continue
+        expected = [None if point is None else (np.round(np.asarray(point, dtype=np.float64) * 1e6) / 1e6).tolist()
+                    for point in metrics_dict['latlng']]
+        for compact in (False, True):
+            decoded = decode_metrics_dict(encode_metrics_dict(metrics_dict, compact=compact))
+            if convert_typed_array_to_stream('latlng', decoded['latlng']) != expected:
+                failures.append(f"metrics_dict {idx} ({'compact' if compact else 'raw'} layout)")
+    return failures
+
+
+def _print_codec_report(data_path: str) -> list[str]:
+    """
+    Prints the average bytes per ride for each storage representation (see modules.stream_codec)
+
+    Returns:
+    -----------
+        - A description of every coordinate stream which did not round-trip (see `_check_latlng_round_trip()`)
+    """
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.ride_io import load_ride_hub
+    from modules.stream_codec import create_stream_encoding_report
+
+    ride_hub = load_ride_hub(data_path, ride_hub_class=IsolatedRideHub)
+    report = create_stream_encoding_report(ride_hub)
+    print(f"\nStream storage, average bytes per ride over {len(report)} rides")
+    print('-' * 60)
+    for column in ['python_object_bytes', 'json_bytes', 'typed_array_bytes', 'compact_bytes']:
+        average = np.mean([row[column] for row in report])
+        print(f"{column:<30}{average:>16,.0f}{average / np.mean([row['json_bytes'] for row in report]):>13.1%}")
+
+    failures = _check_latlng_round_trip([ride.metrics_dict for ride in ride_hub])
+    print(f"\nCoordinate round trip: {'FAILED for ' + ', '.join(failures) if failures else 'OK'}")
+    return failures
+
+
+def main(argv: list[str] = None) -> int:
+    args = _parse_arguments(argv)
+    baseline_path = os.path.abspath(args.baseline)
+    sys.path.insert(0, REPO_ROOT)
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = _write_synthetic_history(directory, args)
+        print(f"Synthetic history: {args.rides} rides, {os.path.getsize(data_path) / 1e6:.1f} MB of JSON")
+
+        # The project reads and writes `data/...` relative to the working directory
+        original_directory = os.getcwd()
+        os.chdir(directory)
+        codec_failures = []
+        try:
+            results = {name: _time_function(function, args.repeat)
+                       for name, function in _create_benchmarks(data_path).items()}
+            if args.codec_report:
+                codec_failures = _print_codec_report(data_path)
+        finally:
+            os.chdir(original_directory)
+
+    # Timings are only comparable when the synthetic history is the same
+    config = {key: getattr(args, key) for key in ['rides', 'duration', 'outdoor_fraction', 'power_curve_seconds',
+                                                  'seed']}
+    baseline, baseline_problem = {}, None
+    if not os.path.exists(baseline_path):
+        baseline_problem = f"No baseline at {baseline_path}"
+    else:
+        with open(baseline_path, 'r') as file:
+            stored_baseline = json.load(file)
+        if stored_baseline.get('config') == config:
+            baseline = stored_baseline['results']
+        else:
+            baseline_problem = f"Baseline at {baseline_path} was recorded with {stored_baseline.get('config')}, " \
+                               f"not {config}"
+
+    regressions = _print_results_table(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as file:
+            json.dump({'config': config, 'results': results}, file, indent=2)
+        print(f"\nSaved baseline to {baseline_path}")
+        return 0
+
+    if codec_failures:
+        return 1
+    if baseline_problem:
+        print(f"\n{baseline_problem}, so nothing was compared.  Record one with --save-baseline")
+        return 2
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Startup check for the command line entry point, based on `python -X importtime`.
+
+For each `cli.py` subcommand, a fresh interpreter imports exactly what that subcommand imports (without running it).
+The check fails if a subcommand pulls in pandas, plotly or streamlit, or if its startup exceeds the budget.
+`export` builds DataFrames, so it is not checked.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget-ms 500 --verbose
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'plotly', 'streamlit')
+CHECKED_SUBCOMMANDS = ('sync', 'recompute', 'stats', 'migrate', 'forecast', 'near', 'athletes', 'gear', 'webhook')
+
+
+# Internal use
+def _parse_importtime_output(stderr: str) -> list[tuple[str, int, int]]:
+    """
+    Parses `-X importtime` lines of the form 'import time:   self [us] |   cumulative | module' into
+    (module, self_us, cumulative_us) tuples.  The module name keeps its leading spaces, which show nesting depth
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_subcommand_startup(subcommand: str) -> dict:
+    """
+    Imports a subcommand's dependencies in a fresh interpreter with `-X importtime`.
+
+    Returns:
+    -----------
+        - A dictionary with the wall-clock time of the whole process, the total import time, the imported top-level
+          packages and the slowest imports
+    """
+    code = f"import cli; cli.SUBCOMMAND_IMPORTERS[{subcommand!r}]()"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    wall_clock_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the `{subcommand}` dependencies failed:\n{result.stderr[-2000:]}")
+
+    rows = _parse_importtime_output(result.stderr)
+    top_level_rows = [row for row in rows if not row[0].startswith('  ')]
+    return {'wall_clock_ms': wall_clock_ms,
+            'import_ms': sum(row[2] for row in top_level_rows) / 1000,
+            'packages': {row[0].strip().split('.')[0] for row in rows},
+            'slowest': sorted(top_level_rows, key=lambda x: x[2], reverse=True)[:10]}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the CLI's startup cost with -X importtime")
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help="Maximum wall-clock startup time for each subcommand")
+    parser.add_argument('--verbose', action='store_true', help="Show the slowest imports for each subcommand")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'subcommand':<12}{'wall clock (ms)':>18}{'imports (ms)':>15}   heavy modules")
+    print('-' * 64)
+    for subcommand in CHECKED_SUBCOMMANDS:
+        measurement = measure_subcommand_startup(subcommand)
+        heavy_modules = sorted(set(HEAVY_MODULES) & measurement['packages'])
+        print(f"{subcommand:<12}{measurement['wall_clock_ms']:>18.0f}{measurement['import_ms']:>15.0f}   "
+              f"{', '.join(heavy_modules) or '-'}")
+        if args.verbose:
+            for module, _, cumulative_us in measurement['slowest']:
+                print(f"{'':<14}{module.strip():<40}{cumulative_us / 1000:>8.1f} ms")
+
+        if heavy_modules:
+            failures.append(f"`{subcommand}` imports {', '.join(heavy_modules)}")
+        if measurement['wall_clock_ms'] > args.budget_ms:
+            failures.append(f"`{subcommand}` took {measurement['wall_clock_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
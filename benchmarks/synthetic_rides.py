@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+import numpy as np
+from modules.geo_functions import encode_polyline
+
+# A handful of loop "routes" around a home location, so that outdoor rides repeat the same roads like real history does
+HOME_LATLNG = (39.9612, -82.9988)
+N_ROUTES = 8
+SYNTHETIC_FTP = 250
+SYNTHETIC_ATHLETE_ID = 1
+
+
+# Internal use
+def _generate_power_array(rng: np.random.Generator, n_seconds: int) -> np.ndarray:
+    """
+    Power with a realistic structure: a slowly wandering base effort, second-to-second noise, occasional hard
+    efforts of 30 seconds to 5 minutes, and coasting (zero watts) about 10% of the time
+    """
+    base = SYNTHETIC_FTP * 0.65 + np.cumsum(rng.normal(0, 1.5, n_seconds)).clip(-60, 60)
+    watts = base + rng.normal(0, 25, n_seconds)
+    for _ in range(max(1, n_seconds // 900)):
+        start, length = rng.integers(0, n_seconds), rng.integers(30, 300)
+        watts[start:start + length] += SYNTHETIC_FTP * rng.uniform(0.3, 0.8)
+    watts[rng.random(n_seconds) < 0.1] = 0
+    return np.round(watts.clip(0, 1500)).astype(np.int64)
+
+
+def _generate_route_latlng_array(rng: np.random.Generator, route_number: int, n_seconds: int) -> np.ndarray:
+    """A noisy loop around the home location.  The same route_number always produces (roughly) the same loop"""
+    route_rng = np.random.default_rng(route_number)
+    radius_degrees = route_rng.uniform(0.05, 0.2)
+    center = np.array(HOME_LATLNG) + route_rng.normal(0, radius_degrees / 2, 2)
+    angles = np.linspace(0, 2 * np.pi, n_seconds) + route_rng.uniform(0, 2 * np.pi)
+    wobble = 1 + 0.15 * np.sin(angles * route_rng.integers(2, 6))
+    latlng = np.column_stack((center[0] + radius_degrees * wobble * np.sin(angles),
+                              center[1] + radius_degrees * wobble * np.cos(angles) / np.cos(np.radians(center[0]))))
+    return latlng + rng.normal(0, 0.00002, latlng.shape)
+
+
+def generate_synthetic_ride(rng: np.random.Generator,
+                            ride_id: int,
+                            start_date: datetime,
+                            duration_seconds: int,
+                            outdoor: bool) -> dict:
+    """
+    Generates a single ride in the same dictionary format as `StravaRide.to_dict()`, with every metadata field the
+    summary dataframe uses and every stream requested by `RideDataProcessor`.  Indoor (trainer) rides have no
+    `latlng` stream, start/end coordinates or polyline, matching what Strava returns.
+    """
+    n_seconds = int(duration_seconds)
+    watts = _generate_power_array(rng, n_seconds)
+    moving = watts > 0 if not outdoor else rng.random(n_seconds) > 0.03
+    velocity = np.where(moving, (watts ** (1 / 3)) * 1.35 + rng.normal(0, 0.3, n_seconds), 0).clip(0, None)
+    distance = np.cumsum(velocity)
+    altitude = 250 + np.cumsum(rng.normal(0, 0.3, n_seconds)) if outdoor else np.zeros(n_seconds)
+    heartrate = np.round(95 + 0.3 * np.convolve(watts, np.ones(60) / 60, mode='same')
+                         + rng.normal(0, 2, n_seconds)).clip(60, 200).astype(np.int64)
+    cadence = np.where(watts > 0, rng.normal(88, 6, n_seconds), 0).round().clip(0, 140).astype(np.int64)
+
+    metrics_dict = {'time': list(range(n_seconds)),
+                    'distance': np.round(distance, 1).tolist(),
+                    'altitude': np.round(altitude, 1).tolist(),
+                    'velocity_smooth': np.round(velocity, 3).tolist(),
+                    'heartrate': heartrate.tolist(),
+                    'cadence': cadence.tolist(),
+                    'watts': watts.tolist(),
+                    'temp': np.full(n_seconds, int(rng.integers(5, 30))).tolist(),
+                    'moving': moving.tolist(),
+                    'grade_smooth': np.round(np.gradient(altitude) / np.maximum(velocity, 1) * 100, 1).tolist()}
+
+    latlng = np.empty((0, 2))
+    if outdoor:
+        latlng = np.round(_generate_route_latlng_array(rng, int(rng.integers(N_ROUTES)), n_seconds), 6)
+        metrics_dict['latlng'] = latlng.tolist()
+
+    moving_time = int(moving.sum())
+    metadata = {'resource_state': 2,
+                'id': ride_id,
+                'athlete': {'id': SYNTHETIC_ATHLETE_ID, 'resource_state': 1},
+                'name': f"{'Outdoor' if outdoor else 'Indoor'} Ride {ride_id}",
+                'distance': float(distance[-1]),
+                'moving_time': moving_time,
+                'elapsed_time': n_seconds,
+                'total_elevation_gain': float(np.clip(np.diff(altitude), 0, None).sum()),
+                'type': 'Ride' if outdoor else 'VirtualRide',
+                'sport_type': 'Ride' if outdoor else 'VirtualRide',
+                'workout_type': None,
+                'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'location_city': None,
+                'location_state': None,
+                'location_country': 'United States',
+                'achievement_count': int(rng.integers(0, 5)),
+                'kudos_count': int(rng.integers(0, 20)),
+                'comment_count': 0,
+                'athlete_count': 1,
+                'photo_count': 0,
+                'map': {'id': f'a{ride_id}',
+                        'summary_polyline': encode_polyline(latlng[::30]),
+                        'resource_state': 2},
+                'trainer': not outdoor,
+                'manual': False,
+                'private': False,
+                'visibility': 'everyone',
+                'flagged': False,
+                'gear_id': f'b{int(rng.integers(1, 3))}',
+                'start_latlng': latlng[0].tolist() if outdoor else [],
+                'end_latlng': latlng[-1].tolist() if outdoor else [],
+                'average_speed': float(distance[-1] / max(moving_time, 1)),
+                'max_speed': float(velocity.max()),
+                'average_cadence': float(cadence[cadence > 0].mean()),
+                'average_temp': int(metrics_dict['temp'][0]),
+                'average_watts': float(watts.mean()),
+                'max_watts': int(watts.max()),
+                'weighted_average_watts': int(np.mean(watts.astype(np.float64) ** 4) ** 0.25),
+                'kilojoules': float(watts.sum() / 1000),
+                'device_watts': True,
+                'has_heartrate': True,
+                'average_heartrate': float(heartrate.mean()),
+                'max_heartrate': float(heartrate.max()),
+                'heartrate_opt_out': False,
+                'display_hide_heartrate_option': True,
+                'elev_high': float(altitude.max()),
+                'elev_low': float(altitude.min()),
+                'upload_id': ride_id * 10,
+                'upload_id_str': str(ride_id * 10),
+                'external_id': f'{ride_id}.fit',
+                'from_accepted_tag': False,
+                'pr_count': 0,
+                'total_photo_count': 0,
+                'has_kudoed': False,
+                'suffer_score': None,
+                'ftp': SYNTHETIC_FTP}
+
+    return {'id': ride_id, 'metadata': metadata, 'metrics_dict': metrics_dict}
+
+
+def generate_synthetic_ride_history(n_rides: int = 200,
+                                    mean_duration_seconds: int = 5400,
+                                    outdoor_fraction: float = 0.6,
+                                    end_date: datetime = None,
+                                    seed: int = 0) -> list[dict]:
+    """
+    Generates a reproducible ride history in the same format as `data/saved_strava_rides.json`.
+
+    Parameters:
+    -----------
+        - n_rides: int
+            Number of rides to generate.  Rides are spaced roughly every 1-3 days, ending on `end_date`
+        - mean_duration_seconds: int
+            Average ride length.  Individual rides vary between 30% and 200% of this value
+        - outdoor_fraction: float
+            Fraction of rides which are outdoors (with GPS data).  The rest are indoor trainer rides
+        - end_date: datetime
+            Date of the most recent ride.  Defaults to today, so that the TSB/CTL/ATL views have recent data
+        - seed: int
+            Seed for the random number generator.  The same seed always produces the same history
+
+    Returns:
+    -----------
+        - A list of ride dictionaries, oldest first
+    """
+    rng = np.random.default_rng(seed)
+    end_date = end_date or datetime.today().replace(hour=7, minute=0, second=0, microsecond=0)
+    days_between_rides = rng.integers(1, 4, n_rides)
+    days_before_end_date = days_between_rides.sum() - np.cumsum(days_between_rides)
+    start_dates = [end_date - timedelta(days=int(days)) for days in days_before_end_date]
+    durations = (mean_duration_seconds * rng.uniform(0.3, 2.0, n_rides)).astype(np.int64).clip(600, None)
+    outdoor = rng.random(n_rides) < outdoor_fraction
+
+    return [generate_synthetic_ride(rng, ride_id=10_000_000 + i, start_date=start_dates[i],
+                                    duration_seconds=durations[i], outdoor=bool(outdoor[i]))
+            for i in range(n_rides)]
@@ -0,0 +1,509 @@
+"""
+Command line entry point.
+
+    python cli.py sync                       # pull new rides from Strava (suitable for cron)
+    python cli.py recompute --power-curves   # re-derive stored metrics for saved rides
+    python cli.py export --output rides.csv  # write the ride summary table
+    python cli.py export --format parquet --output data/export  # summary + per-second streams, incrementally
+    python cli.py stats                      # quick summary of the saved history
+    python cli.py migrate --output-directory data/ride_store  # stream the history into encoded per-ride files
+    python cli.py forecast --race-date 2025-06-01 --target-tsb 10  # search taper plans for race-day form
+    python cli.py near --latitude 51.5055 --longitude -0.0754  # rides whose GPS track passes near a point
+
+Multiple athletes (see modules/athlete_functions.py):
+
+    python cli.py athletes add 12345 --name "Sam" --refresh-token ... --ftp 260 --lactate-threshold 172
+    python cli.py athletes list
+    python cli.py --all-athletes sync         # sync every athlete in parallel under one shared Strava rate budget
+    python cli.py --athlete 12345 recompute   # --athlete can be repeated
+
+Gear and component wear (see modules/objects/GearLedger.py):
+
+    python cli.py gear install b1234 chain --installed-on 2025-03-01 --max-distance-km 3000
+    python cli.py gear status                 # odometers per bike and per component, and any thresholds reached
+
+Push ingestion from Strava webhook events (see modules/webhook_functions.py):
+
+    python cli.py webhook --port 8787 --verify-token <token>   # endpoint + worker in one process
+
+Only the standard library is imported at startup.  Each subcommand imports what it needs when it runs, so that
+`sync` never pays for pandas, plotly or streamlit.  `benchmarks/startup.py` checks this stays true.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+DEFAULT_DATA_PATH = 'data/saved_strava_rides.json'
+
+
+# Internal use
+def _import_sync_dependencies() -> dict:
+    from modules.api_functions import generate_access_token
+    from modules.gear_functions import create_gear_ledger
+    from modules.objects.RideDataProcessor import RideDataProcessor
+    from modules.ride_io import load_ride_hub
+    return {'generate_access_token': generate_access_token,
+            'create_gear_ledger': create_gear_ledger,
+            'RideDataProcessor': RideDataProcessor,
+            'load_ride_hub': load_ride_hub}
+
+
+def _import_recompute_dependencies() -> dict:
+    from modules.power_functions import recompute_ride_metrics
+    from modules.ride_io import load_ride_hub, lock_rides_file, write_rides_to_json_file
+    return {'recompute_ride_metrics': recompute_ride_metrics,
+            'load_ride_hub': load_ride_hub,
+            'lock_rides_file': lock_rides_file,
+            'write_rides_to_json_file': write_rides_to_json_file}
+
+
+def _import_export_dependencies() -> dict:
+    from modules.export_functions import export_rides_to_parquet
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.objects.StravaRide import StravaRide
+    from modules.ride_io import iter_rides_from_json_file, load_ride_hub
+    from modules.summary_functions import create_ride_summary_dataframe
+    return {'create_ride_summary_dataframe': create_ride_summary_dataframe,
+            'export_rides_to_parquet': export_rides_to_parquet,
+            'IsolatedRideHub': IsolatedRideHub,
+            'StravaRide': StravaRide,
+            'iter_rides_from_json_file': iter_rides_from_json_file,
+            'load_ride_hub': load_ride_hub}
+
+
+def _import_stats_dependencies() -> dict:
+    from modules.ride_io import iter_rides_from_json_file
+    return {'iter_rides_from_json_file': iter_rides_from_json_file}
+
+
+def _import_migrate_dependencies() -> dict:
+    from modules.ride_io import migrate_json_file_to_encoded_store
+    return {'migrate_json_file_to_encoded_store': migrate_json_file_to_encoded_store}
+
+
+def _import_forecast_dependencies() -> dict:
+    from modules import forecast_functions
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.ride_io import load_ride_hub
+    return {'forecast_functions': forecast_functions,
+            'IsolatedRideHub': IsolatedRideHub,
+            'load_ride_hub': load_ride_hub}
+
+
+def _import_near_dependencies() -> dict:
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.ride_io import load_ride_hub
+    return {'IsolatedRideHub': IsolatedRideHub, 'load_ride_hub': load_ride_hub}
+
+
+def _import_athlete_dependencies() -> dict:
+    from modules import athlete_functions, athlete_scheduler
+    return {'athlete_functions': athlete_functions, 'athlete_scheduler': athlete_scheduler}
+
+
+def _run_for_selected_athletes(args: argparse.Namespace, task) -> int:
+    """Runs a per-athlete task for the athletes chosen with --athlete/--all-athletes, printing one line per athlete"""
+    dependencies = _import_athlete_dependencies()
+    athlete_functions = dependencies['athlete_functions']
+    profiles = athlete_functions.list_athlete_profiles() if args.all_athletes \
+        else [athlete_functions.load_athlete_profile(athlete_id) for athlete_id in args.athlete]
+
+    results = dependencies['athlete_scheduler'].run_for_athletes(profiles, task, max_workers=args.workers)
+    for athlete_id, outcome in sorted(results.items()):
+        print(f"{athlete_id:<16}{outcome.get('result', 'failed: ' + outcome.get('error', ''))}")
+    return 1 if any('error' in outcome for outcome in results.values()) else 0
+
+
+def _import_gear_dependencies() -> dict:
+    from modules import gear_functions
+    from modules.athlete_functions import load_athlete_profile, load_athlete_ride_hub
+    from modules.objects.RideHub import IsolatedRideHub
+    from modules.ride_io import load_ride_hub
+    return {'gear_functions': gear_functions,
+            'load_athlete_profile': load_athlete_profile,
+            'load_athlete_ride_hub': load_athlete_ride_hub,
+            'IsolatedRideHub': IsolatedRideHub,
+            'load_ride_hub': load_ride_hub}
+
+
+def _get_gear_path(args: argparse.Namespace) -> str:
+    """The gear file alongside the rides file: the first --athlete's, or next to --data-path"""
+    if args.athlete:
+        return _import_gear_dependencies()['load_athlete_profile'](args.athlete[0]).gear_path
+    return os.path.join(os.path.dirname(args.data_path), 'gear.json')
+
+
+def _import_webhook_dependencies() -> dict:
+    from modules import webhook_functions
+    from modules.objects.EventQueue import EventQueue
+    return {'webhook_functions': webhook_functions, 'EventQueue': EventQueue}
+
+
+# Used by the startup benchmark to import exactly what a subcommand would, without running it
+SUBCOMMAND_IMPORTERS = {'sync': _import_sync_dependencies,
+                        'recompute': _import_recompute_dependencies,
+                        'export': _import_export_dependencies,
+                        'stats': _import_stats_dependencies,
+                        'migrate': _import_migrate_dependencies,
+                        'forecast': _import_forecast_dependencies,
+                        'near': _import_near_dependencies,
+                        'athletes': _import_athlete_dependencies,
+                        'gear': _import_gear_dependencies,
+                        'webhook': _import_webhook_dependencies}
+
+
+def run_sync(args: argparse.Namespace) -> int:
+    """Fetches any new rides with power data from Strava and saves them"""
+    if args.athlete or args.all_athletes:
+        return _run_for_selected_athletes(args, _import_athlete_dependencies()['athlete_scheduler'].sync_athlete)
+
+    dependencies = _import_sync_dependencies()
+    ride_hub = dependencies['load_ride_hub'](args.data_path)
+    dependencies['create_gear_ledger'](ride_hub, _get_gear_path(args))
+    token = dependencies['generate_access_token']()
+    headers = {'Authorization': f'Authorization: Bearer {token}'}
+    processor = dependencies['RideDataProcessor'](token, headers, ride_hub, save_path=args.data_path)
+    new_ride_count = processor.retrieve_and_process_new_ride_data()
+    print(f"{new_ride_count} new rides added")
+    return 0
+
+
+def run_recompute(args: argparse.Namespace) -> int:
+    """Re-derives stored per-ride values (power curves, FTP, quality flags) for saved rides and saves the result"""
+    since = args.since.strftime('%Y-%m-%d') if args.since else None
+    if args.athlete or args.all_athletes:
+        if args.ftp is not None:
+            print("--ftp can't be combined with --athlete/--all-athletes.  Use --settings-ftp to apply each "
+                  "athlete's own FTP")
+            return 2
+        recompute_athlete = _import_athlete_dependencies()['athlete_scheduler'].recompute_athlete
+        return _run_for_selected_athletes(args, lambda profile: recompute_athlete(profile,
+                                                                                  power_curves=args.power_curves,
+                                                                                  since=since,
+                                                                                  update_ftp=args.settings_ftp,
+                                                                                  screen_quality=args.quality))
+
+    dependencies = _import_recompute_dependencies()
+    with dependencies['lock_rides_file'](args.data_path):
+        ride_hub = dependencies['load_ride_hub'](args.data_path)
+        updated_count, ride_count = dependencies['recompute_ride_metrics'](ride_hub, power_curves=args.power_curves,
+                                                                            ftp=args.ftp, since=since,
+                                                                            screen_quality=args.quality)
+        if updated_count:
+            dependencies['write_rides_to_json_file'](ride_hub.ride_list, args.data_path)
+    print(f"Recomputed {updated_count} of {ride_count} rides")
+    return 0
+
+
+def run_export(args: argparse.Namespace) -> int:
+    """
+    Writes the ride summary table to a file.  `--format parquet` instead writes the summary and every ride's streams
+    to a Parquet dataset in the `--output` directory, streaming rides from the saved file one at a time
+    """
+    dependencies = _import_export_dependencies()
+    if args.format == 'parquet':
+        rides = (dependencies['StravaRide'].from_dict(ride_dict)
+                 for ride_dict in dependencies['iter_rides_from_json_file'](args.data_path))
+        counts = dependencies['export_rides_to_parquet'](rides, args.output, overwrite=args.overwrite)
+        print(f"Exported {counts['summary_rides_added']} new rides to {args.output} "
+              f"({counts['stream_rides_added']} new stream partitions)")
+        return 0
+
+    ride_hub = dependencies['load_ride_hub'](args.data_path, ride_hub_class=dependencies['IsolatedRideHub'])
+    summary_df = dependencies['create_ride_summary_dataframe'](ride_hub)
+    if args.format == 'csv':
+        summary_df.to_csv(args.output, index=False)
+    else:
+        summary_df.to_json(args.output, orient='records', date_format='iso')
+    print(f"Wrote {len(summary_df)} rides to {args.output}")
+    return 0
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    """
+    Prints a quick summary of the saved ride history without building any DataFrames.
+    Rides are streamed from the file and only their metadata is kept, so this works on histories of any size
+    """
+    dependencies = _import_stats_dependencies()
+    metadata = [ride['metadata'] for ride in dependencies['iter_rides_from_json_file'](args.data_path)]
+    start_dates = sorted(ride.get('start_date', '') for ride in metadata)
+    stats = {'n_rides': len(metadata),
+             'n_indoor_rides': sum(bool(ride.get('trainer')) for ride in metadata),
+             'first_ride': start_dates[0] if start_dates else None,
+             'last_ride': start_dates[-1] if start_dates else None,
+             'total_distance_miles': round(sum(ride.get('distance') or 0 for ride in metadata) * 0.000621371, 1),
+             'total_moving_hours': round(sum(ride.get('moving_time') or 0 for ride in metadata) / 3600, 1),
+             'total_kilojoules': round(sum(ride.get('kilojoules') or 0 for ride in metadata))}
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        for key, value in stats.items():
+            print(f"{key:<24}{value}")
+    return 0
+
+
+def run_migrate(args: argparse.Namespace) -> int:
+    """Streams the saved rides file into per-ride encoded stream files, one ride at a time"""
+    dependencies = _import_migrate_dependencies()
+    ride_count = dependencies['migrate_json_file_to_encoded_store'](args.data_path, args.output_directory,
+                                                                    compact=not args.raw)
+    print(f"Migrated {ride_count} rides to {args.output_directory}")
+    return 0
+
+
+def run_forecast(args: argparse.Namespace) -> int:
+    """
+    Projects CTL, ATL and TSB from today to `--race-date` for a grid of steady-load-then-taper plans, and prints the
+    plan which arrives closest to `--target-tsb` with the most fitness, without ramping CTL faster than
+    `--max-weekly-ramp`
+    """
+    dependencies = _import_forecast_dependencies()
+    forecast_functions = dependencies['forecast_functions']
+    ride_hub = dependencies['load_ride_hub'](args.data_path, ride_hub_class=dependencies['IsolatedRideHub'])
+    checkpoint_date, ctl0, atl0 = forecast_functions.get_fitness_checkpoint(ride_hub)
+
+    n_days = (args.race_date.date() - checkpoint_date.date()).days
+    if n_days < 1:
+        print(f"--race-date must be after the last day of training ({checkpoint_date.date()})")
+        return 2
+    plan_matrix, plans = forecast_functions.create_taper_plan_matrix(
+        n_days,
+        daily_tss_levels=range(args.min_daily_tss, args.max_daily_tss + 1, args.daily_tss_step),
+        taper_days=range(0, min(n_days, 22)),
+        taper_fractions=(0.3, 0.4, 0.5, 0.6, 0.7, 0.8))
+    try:
+        best_index, race_day = forecast_functions.find_plan_for_target_tsb(plan_matrix, args.target_tsb, ctl0, atl0,
+                                                                      max_weekly_ctl_ramp=args.max_weekly_ramp)
+    except ValueError as error:
+        print(f"{error}.  Try a lower --min-daily-tss or a higher --max-weekly-ramp")
+        return 1
+
+    best_plan = plans[best_index]
+    print(f"Today ({checkpoint_date.date()}): CTL {ctl0:.1f}  ATL {atl0:.1f}  TSB {ctl0 - atl0:.1f}")
+    print(f"Searched {len(plans)} plans over {n_days} days")
+    print(f"Best plan: {best_plan['daily_tss']:.0f} TSS/day, then a {best_plan['taper_days']}-day taper at "
+          f"{best_plan['taper_fraction']:.0%}")
+    print(f"Race day ({args.race_date.date()}): CTL {race_day['ctl']:.1f}  ATL {race_day['atl']:.1f}  "
+          f"TSB {race_day['tsb']:.1f}")
+    return 0
+
+
+def run_near(args: argparse.Namespace) -> int:
+    """Lists the rides whose GPS track passes within `--radius-meters` of a point, oldest first"""
+    dependencies = _import_near_dependencies()
+    ride_hub = dependencies['load_ride_hub'](args.data_path, ride_hub_class=dependencies['IsolatedRideHub'])
+    rides = ride_hub.query(start=args.since, near=(args.latitude, args.longitude, args.radius_meters))
+    for ride in rides:
+        print(f"{(ride.metadata.get('start_date') or '')[:10]:<12}{ride.id:<14}{ride.metadata.get('name', '')}")
+    print(f"{len(rides)} rides within {args.radius_meters:.0f} m of ({args.latitude}, {args.longitude})")
+    return 0
+
+
+def run_athletes(args: argparse.Namespace) -> int:
+    """Lists the configured athletes, or adds one"""
+    athlete_functions = _import_athlete_dependencies()['athlete_functions']
+    if args.athletes_command == 'add':
+        profile = athlete_functions.create_athlete_profile(args.athlete_id, args.name, args.refresh_token,
+                                                           ftp=args.ftp, lactate_threshold=args.lactate_threshold)
+        print(f"Added athlete {profile.athlete_id} ({profile.data_directory})")
+        return 0
+
+    for profile in athlete_functions.list_athlete_profiles():
+        print(f"{profile.athlete_id:<16}{profile.name:<24}FTP {profile.ftp:<6}LT {profile.lactate_threshold:<6}"
+              f"{profile.data_directory}")
+    return 0
+
+
+def run_gear(args: argparse.Namespace) -> int:
+    """
+    Installs a component, or prints each bike's totals, each component's odometer since its install date, and any
+    thresholds which have been reached.  Uses the first --athlete's data, or --data-path
+    """
+    dependencies = _import_gear_dependencies()
+    gear_functions = dependencies['gear_functions']
+    gear_path = _get_gear_path(args)
+    if args.gear_command == 'install':
+        thresholds = {metric: limit for metric, limit in (('distance_km', args.max_distance_km),
+                                                          ('moving_hours', args.max_hours),
+                                                          ('kilojoules', args.max_kilojoules),
+                                                          ('tss', args.max_tss)) if limit is not None}
+        installed_on = args.installed_on.strftime('%Y-%m-%d') if args.installed_on else None
+        component = gear_functions.install_gear_component(gear_path, args.gear_id, args.component,
+                                                          installed_on=installed_on, thresholds=thresholds)
+        print(f"Installed {component.component} on {component.gear_id} from {component.installed_on}")
+        return 0
+
+    if args.athlete:
+        ride_hub = dependencies['load_athlete_ride_hub'](dependencies['load_athlete_profile'](args.athlete[0]))
+    else:
+        ride_hub = dependencies['load_ride_hub'](args.data_path, ride_hub_class=dependencies['IsolatedRideHub'])
+    gear_ledger = gear_functions.create_gear_ledger(ride_hub, gear_path)
+
+    print(f"{'gear':<16}{'rides':>8}{'km':>12}{'hours':>10}{'kJ':>12}{'TSS':>10}")
+    for gear_id, totals in gear_ledger.get_gear_totals().items():
+        print(f"{gear_id:<16}{totals['n_rides']:>8}{totals['distance_km']:>12.1f}{totals['moving_hours']:>10.1f}"
+              f"{totals['kilojoules']:>12.0f}{totals['tss']:>10.0f}")
+    for status in gear_ledger.get_component_status():
+        used = ', '.join(f"{metric} {fraction:.0%}" for metric, fraction in status['threshold_used'].items())
+        print(f"{status['gear_id']:<16}{status['component']:<12} since {status['installed_on']}: "
+              f"{status['distance_km']:.1f} km, {status['moving_hours']:.1f} h, {status['tss']:.0f} TSS"
+              f"{'  (' + used + ')' if used else ''}")
+    alerts = gear_ledger.get_alerts()
+    for alert in alerts:
+        print(f"REPLACE {alert['component']} on {alert['gear_id']}: {alert['value']:.0f} {alert['metric']} "
+              f"(threshold {alert['threshold']})")
+    return 1 if alerts else 0
+
+
+def run_webhook(args: argparse.Namespace) -> int:
+    """
+    Serves the Strava push subscription endpoint, queueing events on disk, and applies them in a worker thread.
+    With --no-worker only the endpoint runs (e.g. when a separate process runs `webhook --worker-only`)
+    """
+    dependencies = _import_webhook_dependencies()
+    webhook_functions = dependencies['webhook_functions']
+    event_queue = dependencies['EventQueue'](args.queue_directory, recover_claimed_events=not args.no_worker)
+
+    stop_event = threading.Event()
+    worker_thread = None
+    if not args.no_worker:
+        worker = webhook_functions.WebhookEventWorker(event_queue)
+        worker_thread = threading.Thread(target=worker.run, args=(stop_event,), name='webhook-worker', daemon=True)
+        worker_thread.start()
+        print(f"Worker processing events from {args.queue_directory} ({len(event_queue)} pending)")
+
+    if args.worker_only:
+        try:
+            worker_thread.join()
+        except KeyboardInterrupt:
+            pass
+        stop_event.set()
+        return 0
+
+    if not args.verify_token:
+        print("A verify token is required (--verify-token or STRAVA_WEBHOOK_VERIFY_TOKEN)")
+        return 2
+    server = webhook_functions.create_webhook_server(event_queue, args.verify_token, host=args.host, port=args.port)
+    print(f"Listening for Strava events on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stop_event.set()
+        if worker_thread:
+            worker_thread.join(timeout=5)
+    return 0
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Strava ride data tools")
+    parser.add_argument('--data-path', default=DEFAULT_DATA_PATH, help="Path to the saved rides JSON file")
+    parser.add_argument('--athlete', action='append', default=[],
+                        help="sync/recompute (or gear) this athlete's data instead of --data-path.  Can be repeated")
+    parser.add_argument('--all-athletes', action='store_true', help="sync/recompute every configured athlete")
+    parser.add_argument('--workers', type=int, default=4, help="Athletes processed in parallel")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help="Pull new rides from Strava")
+    sync_parser.set_defaults(handler=run_sync)
+
+    recompute_parser = subparsers.add_parser('recompute', help="Re-derive stored metrics for saved rides")
+    recompute_parser.add_argument('--power-curves', action='store_true',
+                                  help="Recompute every power curve, not just missing ones")
+    recompute_parser.add_argument('--ftp', type=int, help="Overwrite the FTP stored on each ride")
+    recompute_parser.add_argument('--since', type=lambda x: datetime.strptime(x, '%Y-%m-%d'),
+                                  help="Only recompute rides on or after this date (YYYY-MM-DD)")
+    recompute_parser.add_argument('--settings-ftp', action='store_true',
+                                  help="With --athlete/--all-athletes, store each athlete's FTP from their settings")
+    recompute_parser.add_argument('--quality', action='store_true',
+                                  help="Re-screen every ride's streams for sensor faults, not just unscreened ones")
+    recompute_parser.set_defaults(handler=run_recompute)
+
+    export_parser = subparsers.add_parser('export', help="Write the ride summary table")
+    export_parser.add_argument('--output', required=True)
+    export_parser.add_argument('--format', choices=['csv', 'json', 'parquet'], default='csv',
+                               help="'parquet' writes a directory with the summary table and per-second streams")
+    export_parser.add_argument('--overwrite', action='store_true',
+                               help="Parquet only: re-export rides which were exported before")
+    export_parser.set_defaults(handler=run_export)
+
+    stats_parser = subparsers.add_parser('stats', help="Summarize the saved ride history")
+    stats_parser.add_argument('--json', action='store_true', help="Print machine-readable JSON")
+    stats_parser.set_defaults(handler=run_stats)
+
+    migrate_parser = subparsers.add_parser('migrate', help="Stream the history into encoded per-ride files")
+    migrate_parser.add_argument('--output-directory', required=True)
+    migrate_parser.add_argument('--raw', action='store_true',
+                                help="Use the uncompressed, zero-copy stream layout instead of the compact one")
+    migrate_parser.set_defaults(handler=run_migrate)
+
+    forecast_parser = subparsers.add_parser('forecast', help="Search training plans for a target race-day TSB")
+    forecast_parser.add_argument('--race-date', required=True, type=lambda x: datetime.strptime(x, '%Y-%m-%d'))
+    forecast_parser.add_argument('--target-tsb', type=float, default=10.0)
+    forecast_parser.add_argument('--min-daily-tss', type=int, default=30)
+    forecast_parser.add_argument('--max-daily-tss', type=int, default=150)
+    forecast_parser.add_argument('--daily-tss-step', type=int, default=5)
+    forecast_parser.add_argument('--max-weekly-ramp', type=float, default=7.0,
+                                 help="Largest CTL increase allowed in any week of the plan")
+    forecast_parser.set_defaults(handler=run_forecast)
+
+    near_parser = subparsers.add_parser('near', help="List rides whose GPS track passes near a point")
+    near_parser.add_argument('--latitude', type=float, required=True)
+    near_parser.add_argument('--longitude', type=float, required=True)
+    near_parser.add_argument('--radius-meters', type=float, default=200)
+    near_parser.add_argument('--since', type=lambda x: datetime.strptime(x, '%Y-%m-%d'),
+                             help="Only rides on or after this date (YYYY-MM-DD)")
+    near_parser.set_defaults(handler=run_near)
+
+    athletes_parser = subparsers.add_parser('athletes', help="List or add athletes")
+    athletes_subparsers = athletes_parser.add_subparsers(dest='athletes_command', required=True)
+    athletes_subparsers.add_parser('list', help="List the configured athletes")
+    add_athlete_parser = athletes_subparsers.add_parser('add', help="Add (or update) an athlete")
+    add_athlete_parser.add_argument('athlete_id')
+    add_athlete_parser.add_argument('--name', required=True)
+    add_athlete_parser.add_argument('--refresh-token', required=True)
+    add_athlete_parser.add_argument('--ftp', type=int, required=True)
+    add_athlete_parser.add_argument('--lactate-threshold', type=int, required=True)
+    athletes_parser.set_defaults(handler=run_athletes)
+
+    gear_parser = subparsers.add_parser('gear', help="Track gear and component wear")
+    gear_subparsers = gear_parser.add_subparsers(dest='gear_command', required=True)
+    gear_subparsers.add_parser('status', help="Print odometers, and exit 1 if any threshold has been reached")
+    install_parser = gear_subparsers.add_parser('install', help="Record a new component (e.g. a chain) on a bike")
+    install_parser.add_argument('gear_id', help="Strava gear ID, as in each ride's gear_id (e.g. b1234)")
+    install_parser.add_argument('component', help="e.g. chain, cassette, rear-tire")
+    install_parser.add_argument('--installed-on', type=lambda x: datetime.strptime(x, '%Y-%m-%d'),
+                                help="Install date (YYYY-MM-DD).  Defaults to today")
+    install_parser.add_argument('--max-distance-km', type=float)
+    install_parser.add_argument('--max-hours', type=float)
+    install_parser.add_argument('--max-kilojoules', type=float)
+    install_parser.add_argument('--max-tss', type=float)
+    gear_parser.set_defaults(handler=run_gear)
+
+    webhook_parser = subparsers.add_parser('webhook', help="Ingest rides from Strava push subscription events")
+    webhook_parser.add_argument('--host', default='127.0.0.1')
+    webhook_parser.add_argument('--port', type=int, default=8787)
+    webhook_parser.add_argument('--verify-token', default=os.environ.get('STRAVA_WEBHOOK_VERIFY_TOKEN'),
+                                help="Token Strava echoes back when validating the subscription")
+    webhook_parser.add_argument('--queue-directory', default='data/webhook_queue')
+    worker_group = webhook_parser.add_mutually_exclusive_group()
+    worker_group.add_argument('--no-worker', action='store_true', help="Only queue events, don't process them")
+    worker_group.add_argument('--worker-only', action='store_true', help="Only process queued events")
+    webhook_parser.set_defaults(handler=run_webhook)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = create_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
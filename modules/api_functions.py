@@ -1,14 +1,21 @@
 import requests
 from global_variables import CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN
+from modules.objects.RateLimiter import RateLimiter
 
 TOKEN_AUTH_URL = 'https://www.strava.com/oauth/token'
 ACTIVITIES_ENDPOINT = "https://www.strava.com/api/v3/athlete/activities"
+ACTIVITY_ENDPOINT = "https://www.strava.com/api/v3/activities/{activity_id}"
+ACTIVITY_STREAMS_ENDPOINT = "https://www.strava.com/api/v3/activities/{activity_id}/streams"
+STREAM_KEYS = 'time,distance,latlng,altitude,velocity_smooth,heartrate,cadence,watts,temp,moving,grade_smooth'
 TOKEN_PARAM_DICT = {'client_id': CLIENT_ID,
                     'client_secret': CLIENT_SECRET,
                     'refresh_token': REFRESH_TOKEN,
                     'grant_type': "refresh_token",
                     'f': 'json'}
 
+# Strava's rate limits apply to the application as a whole, so every athlete (and thread) shares one budget
+strava_rate_limiter = RateLimiter()
+
 
 # Internal use
 def _validate_status_code(response_object: requests.models.Response):
@@ -18,11 +25,22 @@ def _validate_status_code(response_object: requests.models.Response):
         raise ValueError(f"Response status code was {response_object.status_code}")
 
 
-def generate_access_token() -> str:
+def _rate_limited_get(url: str, headers: dict, params: dict = None) -> requests.models.Response:
+    """GET request which waits for room in the shared rate budget, then records the usage Strava reports"""
+    strava_rate_limiter.acquire()
+    response = requests.get(url, headers=headers, params=params)
+    usage = response.headers.get('X-RateLimit-Usage')
+    if usage:
+        strava_rate_limiter.update_from_usage([int(count) for count in usage.split(',')])
+    return response
+
+
+def generate_access_token(refresh_token: str = REFRESH_TOKEN) -> str:
     """Uses the client ID, secret, and authorization-specific refresh token to generate a temporary
-    access token"""
+    access token.  `refresh_token` defaults to the one in global_variables.py; pass an athlete's own token to act on
+    their behalf"""
 
-    response = requests.post(url=TOKEN_AUTH_URL, params=TOKEN_PARAM_DICT)
+    response = requests.post(url=TOKEN_AUTH_URL, params={**TOKEN_PARAM_DICT, 'refresh_token': refresh_token})
     _validate_status_code(response_object=response)
     return response.json()['access_token']
 
@@ -32,9 +50,28 @@ def get_activity_data(access_token: str, params: dict = None) -> list[dict]:
     Returns a dictionary (response.json()) representing the user's 30 most recent activities
     """
     headers = {'Authorization': f'Authorization: Bearer {access_token}'}
-    if not params:
-        response = requests.get(ACTIVITIES_ENDPOINT, headers=headers)
-    else:
-        response = requests.get(ACTIVITIES_ENDPOINT, headers=headers, params=params)
+    response = _rate_limited_get(ACTIVITIES_ENDPOINT, headers=headers, params=params or None)
+    _validate_status_code(response_object=response)
+    return response.json()
+
+
+def get_activity_by_id(access_token: str, activity_id: int) -> dict:
+    """
+    Returns a single activity (response.json()), in the same format as the entries returned by `get_activity_data()`
+    """
+    headers = {'Authorization': f'Authorization: Bearer {access_token}'}
+    response = _rate_limited_get(ACTIVITY_ENDPOINT.format(activity_id=activity_id), headers=headers)
     _validate_status_code(response_object=response)
     return response.json()
+
+
+def get_activity_streams(access_token: str, activity_id: int) -> dict[str, list]:
+    """
+    Returns every stream recorded for an activity, in the {stream name: list of values} format of
+    StravaRide.metrics_dict
+    """
+    headers = {'Authorization': f'Authorization: Bearer {access_token}'}
+    response = _rate_limited_get(ACTIVITY_STREAMS_ENDPOINT.format(activity_id=activity_id), headers=headers,
+                                 params={'keys': STREAM_KEYS, 'key_by_type': 'true'})
+    _validate_status_code(response_object=response)
+    return {key: array['data'] for key, array in response.json().items()}
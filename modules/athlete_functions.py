@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+from global_variables import CURRENT_FTP, CURRENT_LACTATE_THRESHOLD, REFRESH_TOKEN
+from modules.create_logger import create_logger
+from modules.objects.AthleteProfile import AthleteProfile
+from modules.objects.Base import RideHubBase
+from modules.objects.RideHub import IsolatedRideHub, RideHub
+from modules.ride_io import get_rides_file_modified_time, load_ride_hub, sync_ride_hub_with_json_file
+
+ATHLETES_DIRECTORY = 'data/athletes'
+SETTINGS_FILE_NAME = 'settings.json'
+# The single-athlete setup from global_variables.py and data/saved_strava_rides.json
+DEFAULT_ATHLETE_ID = 'default'
+
+logger = create_logger('AthleteLogger', 'info')
+
+_ride_hubs = {}
+_ride_hubs_lock = threading.Lock()
+
+
+def create_default_athlete_profile() -> AthleteProfile:
+    """Returns the original single-athlete setup: the global variables file and the top-level data directory"""
+    return AthleteProfile(athlete_id=DEFAULT_ATHLETE_ID,
+                          name='Default',
+                          refresh_token=REFRESH_TOKEN,
+                          ftp=CURRENT_FTP,
+                          lactate_threshold=CURRENT_LACTATE_THRESHOLD,
+                          data_directory='data')
+
+
+def save_athlete_profile(profile: AthleteProfile) -> None:
+    """Writes an athlete's settings to `<data_directory>/settings.json`"""
+    os.makedirs(profile.data_directory, exist_ok=True)
+    path = os.path.join(profile.data_directory, SETTINGS_FILE_NAME)
+    with open(f"{path}.tmp", 'w') as file:
+        json.dump(profile.to_dict(), file, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def create_athlete_profile(athlete_id: str,
+                           name: str,
+                           refresh_token: str,
+                           ftp: int = CURRENT_FTP,
+                           lactate_threshold: int = CURRENT_LACTATE_THRESHOLD,
+                           directory: str = ATHLETES_DIRECTORY) -> AthleteProfile:
+    """Creates (or overwrites) an athlete, with their data stored under `<directory>/<athlete_id>/`"""
+    profile = AthleteProfile(athlete_id=str(athlete_id),
+                             name=name,
+                             refresh_token=refresh_token,
+                             ftp=ftp,
+                             lactate_threshold=lactate_threshold,
+                             data_directory=os.path.join(directory, str(athlete_id)))
+    save_athlete_profile(profile)
+    logger.info(f"Saved settings for athlete {profile.athlete_id} to {profile.data_directory}")
+    return profile
+
+
+def load_athlete_profile(athlete_id: str, directory: str = ATHLETES_DIRECTORY) -> AthleteProfile:
+    """Loads an athlete's settings.  The default athlete always exists"""
+    if str(athlete_id) == DEFAULT_ATHLETE_ID:
+        return create_default_athlete_profile()
+
+    path = os.path.join(directory, str(athlete_id), SETTINGS_FILE_NAME)
+    if not os.path.exists(path):
+        raise ValueError(f"Athlete {athlete_id} does not exist.  Expected settings at {path}")
+    with open(path, 'r') as file:
+        return AthleteProfile.from_dict(json.load(file))
+
+
+def list_athlete_profiles(directory: str = ATHLETES_DIRECTORY) -> list[AthleteProfile]:
+    """
+    Returns the default athlete followed by every athlete with a settings file under `directory`, sorted by name.
+    The default athlete is left out only when other athletes have been set up and it has no saved rides
+    """
+    athlete_ids = []
+    if os.path.isdir(directory):
+        athlete_ids = [name for name in os.listdir(directory) if name != DEFAULT_ATHLETE_ID
+                       and os.path.exists(os.path.join(directory, name, SETTINGS_FILE_NAME))]
+    profiles = sorted((load_athlete_profile(athlete_id, directory) for athlete_id in athlete_ids),
+                      key=lambda profile: profile.name)
+    default_profile = create_default_athlete_profile()
+    if not profiles or os.path.exists(default_profile.rides_path):
+        profiles.insert(0, default_profile)
+    return profiles
+
+
+def load_athlete_ride_hub(profile: AthleteProfile) -> RideHub:
+    """
+    Loads an athlete's saved rides into a hub of their own.
+    The default athlete uses the shared RideHub, so that any hub loaded from data/saved_strava_rides.json sees its rides
+    """
+    ride_hub_class = RideHub if profile.athlete_id == DEFAULT_ATHLETE_ID else IsolatedRideHub
+    if not os.path.exists(profile.rides_path):
+        return ride_hub_class()
+    return load_ride_hub(profile.rides_path, ride_hub_class=ride_hub_class)
+
+
+def get_athlete_ride_hub(athlete_id: str, reload: bool = False) -> RideHub:
+    """
+    Returns an athlete's ride hub, loading it the first time it is asked for.
+    Hubs are cached per process, so switching between athletes never reloads an athlete who was already loaded, and
+    never loads athletes who aren't asked for.  If the athlete's rides file has been written since (e.g. by the
+    webhook worker), the cached hub is brought up to date in place rather than reloaded
+    """
+    athlete_id = str(athlete_id)
+    with _ride_hubs_lock:
+        profile = load_athlete_profile(athlete_id)
+        modified_time = get_rides_file_modified_time(profile.rides_path)
+        if reload or athlete_id not in _ride_hubs:
+            _ride_hubs[athlete_id] = (load_athlete_ride_hub(profile), modified_time)
+        elif modified_time > _ride_hubs[athlete_id][1]:
+            ride_hub, _ = _ride_hubs[athlete_id]
+            counts = sync_ride_hub_with_json_file(ride_hub, profile.rides_path)
+            logger.info(f"Refreshed athlete {athlete_id} from {profile.rides_path}: {counts}")
+            _ride_hubs[athlete_id] = (ride_hub, modified_time)
+        return _ride_hubs[athlete_id][0]
+
+
+def resolve_ride_hub(rides: RideHubBase = None) -> RideHubBase:
+    """
+    Returns `rides`, or the default athlete's hub when it is None.  Functions which default to "the full ride hub"
+    resolve it here when they are called, so that importing them never loads anyone's history
+    """
+    return get_athlete_ride_hub(DEFAULT_ATHLETE_ID) if rides is None else rides
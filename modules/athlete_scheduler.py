@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+from modules.api_functions import generate_access_token
+from modules.athlete_functions import load_athlete_ride_hub
+from modules.create_logger import create_logger
+from modules.gear_functions import create_gear_ledger
+from modules.instrumentation import timed
+from modules.objects.AthleteProfile import AthleteProfile
+from modules.objects.RideDataProcessor import RideDataProcessor
+from modules.power_functions import recompute_ride_metrics
+from modules.ride_io import lock_rides_file, write_rides_to_json_file
+
+DEFAULT_MAX_WORKERS = 4
+
+logger = create_logger('AthleteSchedulerLogger', 'info')
+
+
+def sync_athlete(profile: AthleteProfile) -> int:
+    """
+    Fetches any new rides with power data for one athlete and saves them to the athlete's rides file.
+    Gear thresholds reached by the new rides are logged (see gear_functions.create_gear_ledger())
+    """
+    ride_hub = load_athlete_ride_hub(profile)
+    create_gear_ledger(ride_hub, profile.gear_path)
+    token = generate_access_token(profile.refresh_token)
+    headers = {'Authorization': f'Authorization: Bearer {token}'}
+    processor = RideDataProcessor(token, headers, ride_hub, save_path=profile.rides_path, ftp=profile.ftp)
+    return processor.retrieve_and_process_new_ride_data()
+
+
+def recompute_athlete(profile: AthleteProfile,
+                      power_curves: bool = False,
+                      since: str = None,
+                      update_ftp: bool = False,
+                      screen_quality: bool = False) -> int:
+    """
+    Re-derives stored per-ride values for one athlete (see `recompute_ride_metrics()`) and saves them.
+    If `update_ftp` is True, every ride's stored FTP is set to the FTP in the athlete's settings
+    """
+    # Loaded inside the lock, so that rides saved by a sync or the webhook worker meanwhile aren't overwritten
+    with lock_rides_file(profile.rides_path):
+        ride_hub = load_athlete_ride_hub(profile)
+        updated_count, _ = recompute_ride_metrics(ride_hub, power_curves=power_curves,
+                                                  ftp=profile.ftp if update_ftp else None, since=since,
+                                                  screen_quality=screen_quality)
+        if updated_count:
+            write_rides_to_json_file(ride_hub.ride_list, profile.rides_path)
+    return updated_count
+
+
+@timed('ingest.run_for_athletes')
+def run_for_athletes(profiles: list[AthleteProfile],
+                     task: Callable[[AthleteProfile], int],
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Runs `task` (e.g. `sync_athlete`) for every athlete in parallel.
+
+    Each athlete has their own hub and rides file, so tasks share nothing but the Strava rate budget
+    (`api_functions.strava_rate_limiter`), which keeps the combined request rate under the application's limits no
+    matter how many athletes are synced at once.  A failure for one athlete is logged and reported without stopping
+    the others.
+
+    Returns:
+    -----------
+        - {athlete_id: {'result': <task return value>} or {'error': <message>}}
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='athlete') as executor:
+        futures = {executor.submit(task, profile): profile for profile in profiles}
+        for future in as_completed(futures):
+            profile = futures[future]
+            try:
+                results[profile.athlete_id] = {'result': future.result()}
+            except Exception as error:
+                logger.error(f"{getattr(task, '__name__', 'Task')} failed for athlete {profile.athlete_id}: {error}")
+                results[profile.athlete_id] = {'error': str(error)}
+    return results
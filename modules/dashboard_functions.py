@@ -0,0 +1,22 @@
+import streamlit as st
+from modules.athlete_functions import get_athlete_ride_hub, list_athlete_profiles
+from modules.objects.AthleteProfile import AthleteProfile
+from modules.objects.RideHub import RideHub
+
+
+def select_athlete() -> tuple[AthleteProfile, RideHub]:
+    """
+    Renders the athlete selector in the sidebar and returns the selected athlete along with their ride hub.
+    The selection is kept in the session so it carries across pages.  Hubs are loaded on first use and cached
+    for the life of the server (see `get_athlete_ride_hub()`), so switching athletes never reloads anyone's data.
+    """
+    profiles = {profile.athlete_id: profile for profile in list_athlete_profiles()}
+    athlete_ids = list(profiles)
+    selected_athlete_id = st.session_state.get('athlete_id')
+    if selected_athlete_id not in profiles:
+        selected_athlete_id = athlete_ids[0]
+
+    selected_athlete_id = st.sidebar.selectbox("Athlete", athlete_ids, index=athlete_ids.index(selected_athlete_id),
+                                               format_func=lambda athlete_id: profiles[athlete_id].name)
+    st.session_state['athlete_id'] = selected_athlete_id
+    return profiles[selected_athlete_id], get_athlete_ride_hub(selected_athlete_id)
@@ -1,72 +1,14 @@
-import json
-from typing import Any
 import pandas as pd
+from global_variables import CURRENT_LACTATE_THRESHOLD
+from modules.athlete_functions import resolve_ride_hub
+from modules.instrumentation import timed
+from modules.objects.Base import RideHubBase
 from modules.objects.RideHub import RideHub
-from modules.power_functions import calculate_normalized_power_from_metrics_dict, calculate_training_stress_score, \
-    identify_heart_rate_zone
-
-master_column_list = ['resource_state',
-                      'id',
-                      'athlete_id',
-                      'name',
-                      'distance',
-                      'moving_time',
-                      'moving_time_seconds',
-                      'elapsed_time',
-                      'elapsed_time_seconds',
-                      'total_elevation_gain',
-                      'type',
-                      'sport_type',
-                      'workout_type',
-                      'start_date',
-                      'location_city',
-                      'location_state',
-                      'location_country',
-                      'achievement_count',
-                      'kudos_count',
-                      'comment_count',
-                      'athlete_count',
-                      'photo_count',
-                      'map_id',
-                      'polyline',
-                      'trainer',
-                      'manual',
-                      'private',
-                      'visibility',
-                      'flagged',
-                      'gear_id',
-                      'starting_latitude',
-                      'starting_longitude',
-                      'ending_latitude',
-                      'ending_longitude',
-                      'average_speed',
-                      'max_speed',
-                      'average_cadence',
-                      'average_temp',
-                      'average_watts',
-                      'max_watts',
-                      'weighted_average_watts',
-                      'kilojoules',
-                      'device_watts',
-                      'has_heartrate',
-                      'average_heartrate',
-                      'max_heartrate',
-                      'heartrate_opt_out',
-                      'display_hide_heartrate_option',
-                      'elev_high',
-                      'elev_low',
-                      'upload_id',
-                      'upload_id_str',
-                      'external_id',
-                      'from_accepted_tag',
-                      'pr_count',
-                      'total_photo_count',
-                      'has_kudoed',
-                      'suffer_score',
-                      'ftp',
-                      'normalized_power',
-                      'intensity_factor',
-                      'tss']
+from modules.power_functions import calculate_normalized_power, identify_heart_rate_zone
+from modules.quality_functions import QUALITY_FLAG_BITS, get_screened_stream
+# The ride summary table lives in summary_functions so that it can be imported on its own (e.g. by the exporter)
+from modules.summary_functions import _convert_meters_to_feet, _convert_meters_to_miles, _convert_mps_to_mph, \
+    _grab_element_of_list_if_exists, create_normalized_power_dict, create_ride_summary_dataframe, master_column_list
 
 individual_ride_fields_outdoors = ['temp',
                                    'watts',
@@ -93,120 +35,35 @@ individual_ride_fields_indoors = ['temp',
                                   'altitude',
                                   'time']
 
-with open('data/saved_strava_rides.json', 'r') as f:
-    ride_hub = RideHub(*json.load(f))
-
-
-# Internal
-def _convert_mps_to_mph(value: float) -> float:
-    """Converts meters per second to miles per hour"""
-    return value * 2.23694
-
-
-def _convert_meters_to_miles(value: float) -> float:
-    """Converts meters to miles"""
-    return value * 0.000621371
-
-
-def _convert_meters_to_feet(value: float) -> float:
-    """Converts meters to feet"""
-    return value * 3.28084
-
-
-def _grab_element_of_list_if_exists(input_list: list, element_number: int) -> Any:
-    """Simple function to return a specific element of a list if it exists. Returns None otherwise"""
-    return input_list[element_number] if input_list else None
 
-
-def _convert_total_seconds_to_HMS_format(total_seconds: int) -> str:
-    """
-    Function converts an integer value representing total seconds elapsed into a string representing
-    "Hours: minutes: seconds"
-    """
-    minutes, seconds = divmod(total_seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    return f"{hours}:{minutes}:{seconds}"
-
-
-def _apply_training_stress_score(row):
+@timed('dataframe.create_individual_ride_metrics')
+def create_individual_ride_metrics_dataframe(ride_id: int,
+                                             rides: RideHubBase = None,
+                                             lactate_threshold: int = CURRENT_LACTATE_THRESHOLD) -> pd.DataFrame:
     """
-    Quick mapping function to apply the TSS calculation across several fields.
-    Will be used in tandem with Pandas' `apply()` method.
+    Creates a dataframe of metrics for a given ride ID, with the power, heart rate and cadence streams screened (see
+    `get_screened_stream()`).  `rides` defaults to the full ride hub, and heart rate zones use `lactate_threshold`
     """
-    return calculate_training_stress_score(row.moving_time_seconds,
-                                           row.normalized_power,
-                                           row.intensity_factor,
-                                           row.ftp)
-
-
-def create_normalized_power_dict() -> dict:
-    """
-    Returns a dictionary for format {ride_id:normalized power value}.
-    This is primarily used as a mapping for the summary dataframe
-    """
-    return {ride.id: calculate_normalized_power_from_metrics_dict(ride.metrics_dict) for ride in ride_hub}
-
-
-def create_ride_summary_dataframe() -> pd.DataFrame:
-    """
-    This function pulls and cleans the metadata for each ride.  The intended use of this DataFrame is to visualize
-    trends over time This could be in the form of distance, average power, etc.
-    """
-
-    raw_df = pd.DataFrame([ride.metadata for ride in ride_hub])
-    output_df = raw_df.copy()
-    # Convert speed to MPH
-    output_df.average_speed = output_df.average_speed.map(_convert_mps_to_mph)
-    output_df.max_speed = output_df.average_speed.map(_convert_mps_to_mph)
-    # Break out starting/ending latitude and longitude
-    output_df['starting_latitude'] = output_df.start_latlng.map(lambda x: _grab_element_of_list_if_exists(x, 0))
-    output_df['starting_longitude'] = output_df.start_latlng.map(lambda x: _grab_element_of_list_if_exists(x, 1))
-    output_df['ending_latitude'] = output_df.end_latlng.map(lambda x: _grab_element_of_list_if_exists(x, 0))
-    output_df['ending_longitude'] = output_df.end_latlng.map(lambda x: _grab_element_of_list_if_exists(x, 1))
-    # Pull Athlete ID out from dictionary
-    output_df['athlete_id'] = output_df.athlete.map(lambda x: x['id'])
-    # Do the same for maps
-    output_df['map_id'] = output_df.map.map(lambda x: x['id'])
-    output_df['polyline'] = output_df.map.map(lambda x: x['summary_polyline'])
-    # Convert to miles
-
-    output_df.distance = output_df.distance.map(_convert_meters_to_miles)
-    # Convert meters to feet
-    output_df.total_elevation_gain = output_df.total_elevation_gain.map(_convert_meters_to_feet)
-    output_df.elev_high = output_df.elev_high.map(_convert_meters_to_feet)
-    output_df.elev_low = output_df.elev_low.map(_convert_meters_to_feet)
-    # Address moving time
-    output_df = output_df.rename(columns={'moving_time': 'moving_time_seconds'})
-    output_df = output_df.rename(columns={'elapsed_time': 'elapsed_time_seconds'})
-    output_df['moving_time'] = output_df.moving_time_seconds.map(_convert_total_seconds_to_HMS_format)
-    output_df['elapsed_time'] = output_df.elapsed_time_seconds.map(_convert_total_seconds_to_HMS_format)
-
-    # Add normalized power, IF and TSS
-    output_df['normalized_power'] = output_df.id.map(create_normalized_power_dict())
-    output_df['intensity_factor'] = output_df.normalized_power / output_df.ftp
-    output_df['tss'] = output_df.apply(lambda x: _apply_training_stress_score(x), axis=1)
-
-    # Convert start date to proper datetime format
-    output_df.start_date = pd.to_datetime(output_df.start_date)
-    # Return the output with the correct columns/order with the most recent being first
-    return output_df[master_column_list].sort_values('start_date', ascending=False).drop_duplicates()
-
-
-def create_individual_ride_metrics_dataframe(ride_id: int) -> pd.DataFrame:
-    """Creates a dataframe of metrics for a given ride ID"""
+    rides = resolve_ride_hub(rides)
 
     # Fail fast
-    if not ride_hub.get_ride(ride_id):
+    if ride_id not in rides:
         raise ValueError(f"Ride {ride_id} does not exist in the RideHub."
                          f"Call the ride_list() method to see available rides")
 
-    output_df = pd.DataFrame(ride_hub[ride_id].metrics_dict)
+    metrics_dict = rides[ride_id].metrics_dict
+    output_df = pd.DataFrame(metrics_dict)
+    # Samples flagged by stream quality screening (e.g. an HR strap dropout) are interpolated over, so they neither
+    # land in zone 1 nor show up as drops in the plots
+    for stream_name in QUALITY_FLAG_BITS:
+        if stream_name in output_df.columns:
+            output_df[stream_name] = get_screened_stream(metrics_dict, stream_name)
     # Convert speed/Distance
     output_df.velocity_smooth = output_df.velocity_smooth.map(_convert_meters_to_feet)
     output_df.distance = output_df.distance.map(_convert_meters_to_miles)
 
     # Assign heart rate zones
-    output_df['hr_zone'] = output_df.heartrate.map(identify_heart_rate_zone)
+    output_df['hr_zone'] = output_df.heartrate.map(lambda x: identify_heart_rate_zone(x, lactate_threshold))
     # Determine whether it was an indoor or outdoor ride, Indoor trainer sessions have no 'latlng' field.
     is_outdoors = 'latlng' in output_df.columns
     if is_outdoors:
@@ -217,3 +74,42 @@ def create_individual_ride_metrics_dataframe(ride_id: int) -> pd.DataFrame:
     return output_df[individual_ride_fields_indoors]
 
 
+@timed('dataframe.create_route_performance')
+def create_route_performance_dataframe(ride_id: int, rides: RideHub = None) -> pd.DataFrame:
+    """
+    Creates a dataframe tracking performance over time for every ride on the same route as `ride_id`
+    (including `ride_id` itself).  Only the rides on the route are touched, so this stays cheap as the history grows.
+
+    Parameters:
+    -----------
+        - ride_id: int
+            Any ride on the route of interest.  Raises ValueError if the ride has no polyline
+        - rides: RideHub
+            The hub to search, whose `route_index` is built the first time it is needed.
+            Defaults to the full ride hub
+
+    Returns:
+    -----------
+        - A DataFrame with one row per ride on the route, oldest first
+    """
+    rides = resolve_ride_hub(rides)
+    route_matches = [(ride_id, 1.0)] + rides.route_index.find_rides_on_same_route(ride_id)
+    rows = []
+    for matched_ride_id, similarity in route_matches:
+        if matched_ride_id not in rides:
+            continue
+        ride = rides[matched_ride_id]
+        rows.append({'id': ride.id,
+                     'name': ride.metadata.get('name'),
+                     'start_date': ride.metadata.get('start_date'),
+                     'route_similarity': similarity,
+                     'moving_time_seconds': ride.metadata.get('moving_time'),
+                     'distance': _convert_meters_to_miles(ride.metadata.get('distance', 0)),
+                     'average_speed': _convert_mps_to_mph(ride.metadata.get('average_speed', 0)),
+                     'average_watts': ride.metadata.get('average_watts'),
+                     'normalized_power': calculate_normalized_power(ride),
+                     'average_heartrate': ride.metadata.get('average_heartrate')})
+
+    output_df = pd.DataFrame(rows)
+    output_df.start_date = pd.to_datetime(output_df.start_date)
+    return output_df.sort_values('start_date').reset_index(drop=True)
@@ -0,0 +1,229 @@
+import glob
+import os
+import uuid
+from typing import Iterable
+import numpy as np
+import pandas as pd
+from modules.create_logger import create_logger
+from modules.instrumentation import increment_counter, timed
+from modules.objects.RideHubView import RideHubView
+from modules.objects.StravaRide import StravaRide
+from modules.stream_codec import convert_stream_to_float_array, convert_stream_to_typed_array
+from modules.summary_functions import create_ride_summary_dataframe, master_column_list
+
+DEFAULT_EXPORT_DIRECTORY = 'data/export'
+SUMMARY_DIRECTORY_NAME = 'summary'
+# Exports before the summary became a dataset wrote it as this single file.  It is still read as part of the summary
+LEGACY_SUMMARY_FILE_NAME = 'ride_summary.parquet'
+STREAMS_DIRECTORY_NAME = 'streams'
+STREAMS_FILE_NAME = 'streams.parquet'
+# Rides are summarized in batches so that only `batch_size` rides' streams are held at once
+DEFAULT_SUMMARY_BATCH_SIZE = 50
+
+# One fixed Arrow type per stream, so every file in the dataset has the same schema and readers never have to
+# reconcile types.  `latlng` is split into two columns so that either can be read on its own
+STREAM_ARROW_TYPES = {'time': 'int32',
+                      'distance': 'float32',
+                      'altitude': 'float32',
+                      'velocity_smooth': 'float32',
+                      'grade_smooth': 'float32',
+                      'watts': 'int32',
+                      'heartrate': 'int16',
+                      'cadence': 'int16',
+                      'temp': 'int16',
+                      'moving': 'bool',
+                      'quality_flags': 'uint8',
+                      'latitude': 'float64',
+                      'longitude': 'float64'}
+
+logger = create_logger('ExportLogger', 'info')
+
+
+# Internal use
+def _import_pyarrow():
+    """pyarrow is only needed for exporting, so it is an optional dependency"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("Parquet export requires pyarrow.  Install it with `pip install pyarrow`") from error
+    return pyarrow, pyarrow.parquet
+
+
+def _get_ride_partition_directory(directory: str, ride: StravaRide) -> str:
+    """Hive-style partition path for a ride's streams: <directory>/streams/start_date=YYYY-MM-DD/ride_id=<id>"""
+    start_date = (ride.metadata.get('start_date') or 'unknown')[:10]
+    return os.path.join(directory, STREAMS_DIRECTORY_NAME, f"start_date={start_date}", f"ride_id={ride.id}")
+
+
+def _get_summary_paths(directory: str) -> list[str]:
+    """Every file of the summary dataset, including a summary written by an older export as a single file"""
+    paths = sorted(glob.glob(os.path.join(directory, SUMMARY_DIRECTORY_NAME, '*.parquet')))
+    legacy_path = os.path.join(directory, LEGACY_SUMMARY_FILE_NAME)
+    return [legacy_path] + paths if os.path.exists(legacy_path) else paths
+
+
+def _read_summary_table(directory: str, columns: list[str] = None):
+    pyarrow, parquet = _import_pyarrow()
+    import pyarrow.dataset
+
+    paths = _get_summary_paths(directory)
+    if not paths:
+        return None
+    # A column which is empty in one batch is null-typed in that file, so the files' schemas are merged
+    schema = pyarrow.unify_schemas([parquet.read_schema(path) for path in paths])
+    return pyarrow.dataset.dataset(paths, schema=schema, format='parquet').to_table(columns=columns)
+
+
+def _read_exported_summary_ride_ids(directory: str) -> set:
+    table = _read_summary_table(directory, columns=['id'])
+    return set() if table is None else set(table.column('id').to_pylist())
+
+
+def _write_summary_batch(summary_df: pd.DataFrame, directory: str) -> None:
+    """Writes a batch of summary rows as a new file of the summary dataset, moving it into place once complete"""
+    pyarrow, parquet = _import_pyarrow()
+
+    summary_directory = os.path.join(directory, SUMMARY_DIRECTORY_NAME)
+    os.makedirs(summary_directory, exist_ok=True)
+    path = os.path.join(summary_directory, f"part-{uuid.uuid4().hex}.parquet")
+    temporary_path = f"{path}.tmp"
+    parquet.write_table(pyarrow.Table.from_pandas(summary_df, preserve_index=False), temporary_path,
+                        compression='zstd')
+    os.replace(temporary_path, path)
+
+
+def read_exported_summary(directory: str = DEFAULT_EXPORT_DIRECTORY) -> pd.DataFrame:
+    """
+    Reads the summary dataset written by `export_rides_to_parquet()` as one table.
+
+    Returns:
+    -----------
+        - A DataFrame with the same columns as `create_ride_summary_dataframe()`, most recent ride first
+    """
+    table = _read_summary_table(directory)
+    if table is None:
+        return pd.DataFrame(columns=master_column_list)
+    return table.to_pandas().sort_values('start_date', ascending=False).reset_index(drop=True)
+
+
+def convert_metrics_dict_to_arrow_table(metrics_dict: dict):
+    """
+    Converts a StravaRide.metrics_dict into a pyarrow Table with one column per per-second stream, typed as in
+    `STREAM_ARROW_TYPES`.  Streams which are not one value per sample (e.g. 'power_curve') are left out, and
+    streams the ride doesn't have are filled with nulls so that every table has the same schema.  Missing samples
+    (e.g. a power meter dropout) are nulls too, rather than zero.
+    """
+    pyarrow, _ = _import_pyarrow()
+
+    n_samples = len(metrics_dict.get('time') or [])
+    arrays = {}
+    if len(metrics_dict.get('latlng') or []) == n_samples and n_samples:
+        latlng = convert_stream_to_float_array(metrics_dict['latlng']).reshape(-1, 2)
+        is_missing = np.isnan(latlng).any(axis=1)
+        arrays['latitude'] = np.ma.MaskedArray(latlng[:, 0], mask=is_missing)
+        arrays['longitude'] = np.ma.MaskedArray(latlng[:, 1], mask=is_missing)
+    for stream_name in STREAM_ARROW_TYPES:
+        stream = metrics_dict.get(stream_name)
+        if stream_name not in arrays and stream is not None and len(stream) == n_samples:
+            arrays[stream_name] = convert_stream_to_typed_array(stream_name, stream)
+
+    columns = {stream_name: pyarrow.array(np.ma.getdata(arrays[stream_name]),
+                                          mask=np.ma.getmaskarray(arrays[stream_name]), type=arrow_type)
+               if stream_name in arrays else pyarrow.nulls(n_samples, type=arrow_type)
+               for stream_name, arrow_type in STREAM_ARROW_TYPES.items()}
+    return pyarrow.table(columns)
+
+
+def write_ride_streams_to_parquet(ride: StravaRide, directory: str = DEFAULT_EXPORT_DIRECTORY,
+                                  overwrite: bool = False) -> bool:
+    """
+    Writes one ride's per-second streams to its own partition of the streams dataset.
+    The file is written to a temporary path and then moved into place, so an interrupted export never leaves a
+    partial partition that a later incremental export would skip.
+
+    Returns:
+    -----------
+        - True if the ride was written, False if its partition already existed and `overwrite` is False
+    """
+    _, parquet = _import_pyarrow()
+
+    partition_directory = _get_ride_partition_directory(directory, ride)
+    path = os.path.join(partition_directory, STREAMS_FILE_NAME)
+    if os.path.exists(path) and not overwrite:
+        return False
+
+    os.makedirs(partition_directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    parquet.write_table(convert_metrics_dict_to_arrow_table(ride.metrics_dict), temporary_path,
+                        compression='zstd')
+    os.replace(temporary_path, path)
+    return True
+
+
+@timed('export.rides_to_parquet')
+def export_rides_to_parquet(rides: Iterable[StravaRide],
+                            directory: str = DEFAULT_EXPORT_DIRECTORY,
+                            overwrite: bool = False,
+                            batch_size: int = DEFAULT_SUMMARY_BATCH_SIZE) -> dict:
+    """
+    Exports rides for analysis in DuckDB, Polars, pandas, etc. as two Parquet datasets:
+
+        <directory>/summary/part-<id>.parquet
+            One row per ride, with the same columns as `create_ride_summary_dataframe()`.  Each batch of newly
+            exported rides is a file of its own, so an export only writes the new rows; read the directory as one
+            table with `read_exported_summary()`
+        <directory>/streams/start_date=YYYY-MM-DD/ride_id=<id>/streams.parquet
+            Every per-second stream, one column per stream.  `start_date` and `ride_id` come from the hive-style
+            partition directories, so filters on either only open the matching files
+
+    Rides are consumed one at a time, so `rides` can be a generator over the saved rides file and the whole history
+    never has to be in memory.  Exports are incremental: rides already in the summary and stream partitions which
+    already exist are skipped, unless `overwrite` is True.
+
+        export_rides_to_parquet(ride_hub)
+        duckdb.sql("SELECT ride_id, avg(watts) FROM 'data/export/streams/**/*.parquet' GROUP BY ride_id")
+        duckdb.sql("SELECT * FROM read_parquet('data/export/summary/*.parquet', union_by_name = true)")
+
+    Parameters:
+    -----------
+        - rides: Iterable[StravaRide]
+            e.g. a RideHub, a `ride_hub.query(...)` view or a generator
+        - directory: str
+            Output directory
+        - overwrite: bool
+            Rewrite rides which have already been exported.  The existing summary is replaced
+        - batch_size: int
+            Number of rides summarized at once.  Only this many rides' streams are held in memory
+
+    Returns:
+    -----------
+        - {'summary_rides_added': int, 'stream_rides_added': int}
+    """
+    _import_pyarrow()
+
+    os.makedirs(directory, exist_ok=True)
+    # When overwriting, the previous summary is only removed once the new one has been written
+    replaced_summary_paths = _get_summary_paths(directory) if overwrite else []
+    exported_ride_ids = set() if overwrite else _read_exported_summary_ride_ids(directory)
+
+    batch, summary_rides_added, stream_rides_added = [], 0, 0
+    for ride in rides:
+        stream_rides_added += write_ride_streams_to_parquet(ride, directory, overwrite=overwrite)
+        if ride.id not in exported_ride_ids:
+            exported_ride_ids.add(ride.id)
+            batch.append(ride)
+        if len(batch) >= batch_size:
+            _write_summary_batch(create_ride_summary_dataframe(RideHubView(batch)), directory)
+            summary_rides_added += len(batch)
+            batch = []
+    if batch:
+        _write_summary_batch(create_ride_summary_dataframe(RideHubView(batch)), directory)
+        summary_rides_added += len(batch)
+    for path in replaced_summary_paths:
+        os.remove(path)
+
+    increment_counter('export.rides_exported', stream_rides_added)
+    logger.info(f"Exported {summary_rides_added} new summary rows and {stream_rides_added} new stream partitions "
+                f"to {directory}")
+    return {'summary_rides_added': summary_rides_added, 'stream_rides_added': stream_rides_added}
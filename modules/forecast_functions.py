@@ -0,0 +1,147 @@
+from datetime import date, datetime
+from typing import Iterable, Union
+import numpy as np
+from modules.athlete_functions import resolve_ride_hub
+from modules.instrumentation import timed
+from modules.objects.RideHub import RideHub
+
+# Alpha values for CTL and ATL (acute and chronic training loads)
+ALPHA_CTL = 2 / (42 + 1)
+ALPHA_ATL = 2 / (7 + 1)
+
+
+def get_fitness_checkpoint(rides: RideHub = None) -> tuple[datetime, float, float]:
+    """
+    Returns (date, CTL, ATL) as of today, including today's rides.  This is the starting point for
+    `project_ctl_atl_tsb()`, whose first planned day is tomorrow.  `rides` defaults to the full ride hub.
+
+    Matches the latest row of `get_ctl_and_atl_dataframe()`: daily TSS from the first ride to today, with days
+    without training as zero, and both loads starting from the first day's TSS.  Built with numpy alone
+    """
+    start_dates, tss_values = resolve_ride_hub(rides).get_training_stress_scores()
+    if not len(start_dates):
+        raise ValueError("Can't calculate fitness without any rides")
+    days = start_dates.astype('datetime64[D]')
+    first_day = days.min()
+    n_days = int((np.datetime64(date.today(), 'D') - first_day).astype(int)) + 1
+    daily_tss = np.bincount((days - first_day).astype(int), weights=np.nan_to_num(tss_values),
+                            minlength=n_days)[:n_days]
+
+    ctl = atl = float(daily_tss[0])
+    for tss in daily_tss[1:]:
+        ctl = tss * ALPHA_CTL + (1 - ALPHA_CTL) * ctl
+        atl = tss * ALPHA_ATL + (1 - ALPHA_ATL) * atl
+    return datetime.today().replace(hour=0, minute=0, second=0, microsecond=0), float(ctl), float(atl)
+
+
+def create_ewma_projection_matrix(n_days: int, alpha: float) -> np.ndarray:
+    """
+    Returns the (n_days, n_days) lower-triangular matrix M with M[t, k] = alpha * (1 - alpha) ** (t - k) for k <= t.
+    Unrolling the EWMA recursion, the values over a plan of daily TSS values p are then M @ p, plus the starting
+    value decayed by (1 - alpha) ** (t + 1), so a whole batch of plans is projected with one matrix product
+    """
+    days = np.arange(n_days)
+    lags = days[:, None] - days[None, :]
+    return np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)
+
+
+@timed('forecast.project_ctl_atl_tsb')
+def project_ctl_atl_tsb(plan_matrix: Union[list, np.ndarray],
+                        ctl0: float,
+                        atl0: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Projects CTL, ATL and TSB forward for many planned daily TSS schedules at once.
+
+    Parameters:
+    -----------
+        - plan_matrix: (n_plans, n_days) array-like
+            Planned TSS for each day, one plan per row, starting the day after the checkpoint.  A single plan (1D) is
+            treated as one row
+        - ctl0, atl0: float
+            CTL and ATL at the checkpoint (see `get_fitness_checkpoint()`)
+
+    Returns:
+    -----------
+        - ctl, atl, tsb: (n_plans, n_days) arrays.  As in the TSB plot, a day's TSB is the previous day's CTL minus ATL,
+          i.e. the form going into that day before its own training
+    """
+    plans = np.atleast_2d(np.asarray(plan_matrix, dtype=np.float64))
+    n_days = plans.shape[1]
+    decay_exponents = np.arange(1, n_days + 1)
+
+    ctl = plans @ create_ewma_projection_matrix(n_days, ALPHA_CTL).T + ctl0 * (1 - ALPHA_CTL) ** decay_exponents
+    atl = plans @ create_ewma_projection_matrix(n_days, ALPHA_ATL).T + atl0 * (1 - ALPHA_ATL) ** decay_exponents
+    tsb = np.empty_like(ctl)
+    tsb[:, 0] = ctl0 - atl0
+    tsb[:, 1:] = ctl[:, :-1] - atl[:, :-1]
+    return ctl, atl, tsb
+
+
+def create_taper_plan_matrix(n_days: int,
+                             daily_tss_levels: Iterable[float],
+                             taper_days: Iterable[int],
+                             taper_fractions: Iterable[float]) -> tuple[np.ndarray, list[dict]]:
+    """
+    Builds a grid of candidate plans ending on race day (the last day): a steady block at each daily TSS level,
+    followed by a taper of each length at each fraction of that level.  Tapers of `n_days` or more are skipped.
+
+    Returns:
+    -----------
+        - The (n_plans, n_days) plan matrix
+        - One {'daily_tss', 'taper_days', 'taper_fraction'} dict per row, describing each plan
+    """
+    parameters = [{'daily_tss': float(level), 'taper_days': int(days), 'taper_fraction': float(fraction)}
+                  for level in daily_tss_levels for days in taper_days for fraction in taper_fractions
+                  if days < n_days]
+    if not parameters:
+        return np.zeros((0, n_days)), []
+
+    levels = np.array([plan['daily_tss'] for plan in parameters])[:, None]
+    taper_starts = n_days - np.array([plan['taper_days'] for plan in parameters])[:, None]
+    fractions = np.array([plan['taper_fraction'] for plan in parameters])[:, None]
+    is_taper = np.arange(n_days)[None, :] >= taper_starts
+    return np.where(is_taper, levels * fractions, levels), parameters
+
+
+def calculate_max_weekly_ctl_ramp(ctl: np.ndarray, ctl0: float) -> np.ndarray:
+    """
+    Returns the largest rise in CTL over any 7 days of each projected plan (rows of `ctl` from
+    `project_ctl_atl_tsb()`).  Plans shorter than a week are measured from the checkpoint
+    """
+    ctl_with_checkpoint = np.hstack((np.full((len(ctl), 1), ctl0), ctl))
+    lag = min(7, ctl.shape[1])
+    return (ctl_with_checkpoint[:, lag:] - ctl_with_checkpoint[:, :-lag]).max(axis=1)
+
+
+@timed('forecast.find_plan_for_target_tsb')
+def find_plan_for_target_tsb(plan_matrix: Union[list, np.ndarray],
+                             target_tsb: float,
+                             ctl0: float,
+                             atl0: float,
+                             race_day_index: int = -1,
+                             tsb_tolerance: float = 2.0,
+                             max_weekly_ctl_ramp: float = None) -> tuple[int, dict]:
+    """
+    Searches a batch of candidate plans for the one which arrives at race day closest to `target_tsb`.
+    Among the plans within `tsb_tolerance` of the target, the one with the highest race-day CTL (the most fitness)
+    wins.  Plans which build CTL faster than `max_weekly_ctl_ramp` points in any week are ruled out, since the
+    highest CTL is otherwise always the heaviest plan.
+
+    Returns:
+    -----------
+        - The index (row) of the best plan in `plan_matrix`
+        - {'ctl', 'atl', 'tsb'} on race day for that plan
+    """
+    ctl, atl, tsb = project_ctl_atl_tsb(plan_matrix, ctl0, atl0)
+    is_allowed = np.ones(len(ctl), dtype=bool)
+    if max_weekly_ctl_ramp is not None and len(ctl):
+        is_allowed = calculate_max_weekly_ctl_ramp(ctl, ctl0) <= max_weekly_ctl_ramp
+    if not is_allowed.any():
+        raise ValueError(f"None of the {len(ctl)} plans stay within a weekly CTL ramp of {max_weekly_ctl_ramp}")
+
+    tsb_error = np.where(is_allowed, np.abs(tsb[:, race_day_index] - target_tsb), np.inf)
+    within_tolerance = tsb_error <= max(tsb_tolerance, tsb_error.min())
+    best_index = int(np.argmax(np.where(within_tolerance, ctl[:, race_day_index], -np.inf)))
+    return best_index, {'ctl': float(ctl[best_index, race_day_index]),
+                        'atl': float(atl[best_index, race_day_index]),
+                        'tsb': float(tsb[best_index, race_day_index])}
@@ -0,0 +1,63 @@
+import json
+import os
+from datetime import date
+from modules.create_logger import create_logger
+from modules.objects.GearComponent import GearComponent
+from modules.objects.GearLedger import GearLedger
+from modules.objects.RideHub import RideHub
+
+logger = create_logger('GearLogger', 'info')
+
+
+# Internal use
+def _log_gear_alert(alert: dict) -> None:
+    """Default `GearLedger.on_alert`"""
+    logger.warning(f"{alert['component']} on {alert['gear_id']} reached {alert['value']:.0f} {alert['metric']} "
+                   f"(threshold {alert['threshold']}) with ride {alert['ride_id']}")
+
+
+def load_gear_components(path: str) -> list[GearComponent]:
+    """Loads the installed components from a gear file.  Returns an empty list if there isn't one yet"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        return [GearComponent.from_dict(component) for component in json.load(file)]
+
+
+def save_gear_components(components: list[GearComponent], path: str) -> None:
+    """Writes the installed components to a gear file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'w') as file:
+        json.dump([component.to_dict() for component in components], file, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def install_gear_component(path: str,
+                           gear_id: str,
+                           component: str,
+                           installed_on: str = None,
+                           thresholds: dict = None) -> GearComponent:
+    """
+    Records a component as installed on a piece of gear, replacing any component with the same name on it (e.g. a
+    new chain), and saves the gear file.  `installed_on` (YYYY-MM-DD) defaults to today
+    """
+    new_component = GearComponent(gear_id=gear_id,
+                                  component=component,
+                                  installed_on=installed_on or date.today().isoformat(),
+                                  thresholds=thresholds or {})
+    components = [existing for existing in load_gear_components(path) if existing.key != new_component.key]
+    save_gear_components(components + [new_component], path)
+    logger.info(f"Installed {component} on {gear_id} from {new_component.installed_on}")
+    return new_component
+
+
+def create_gear_ledger(ride_hub: RideHub, path: str, on_alert=_log_gear_alert) -> GearLedger:
+    """
+    Creates a GearLedger for the components in a gear file and registers it with `ride_hub`, so that it is updated
+    as rides are added and removed.  Alerts go to `on_alert` (logged by default) for rides added from now on; the
+    hub's existing rides only build up the totals
+    """
+    gear_ledger = GearLedger(load_gear_components(path))
+    ride_hub.register_listener(gear_ledger)
+    gear_ledger.on_alert = on_alert
+    return gear_ledger
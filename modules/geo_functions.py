@@ -0,0 +1,159 @@
+from typing import Union
+import numpy as np
+
+EARTH_RADIUS_METERS = 6_371_008.8
+METERS_PER_DEGREE_LATITUDE = 111_320
+
+
+def extract_latlng_array_from_metrics_dict(input_dict: dict) -> np.ndarray:
+    """
+    Returns an (n, 2) float array of [latitude, longitude] pairs from a StravaRide.metrics_dict dictionary.
+    Indoor trainer sessions have no 'latlng' field, so an empty (0, 2) array is returned for those rides.
+    Points which are missing (None) or malformed are dropped.
+    """
+    latlng = input_dict.get('latlng')
+    if not latlng:
+        return np.empty((0, 2), dtype=np.float64)
+
+    try:
+        points = np.asarray(latlng, dtype=np.float64).reshape(-1, 2)
+    except (TypeError, ValueError):
+        # Slow path - only hit when the stream contains gaps
+        points = np.array([point for point in latlng if point and len(point) == 2 and None not in point],
+                          dtype=np.float64).reshape(-1, 2)
+    return points[np.isfinite(points).all(axis=1)]
+
+
+def downsample_latlng_array(latlng_array: np.ndarray, min_spacing_meters: float = 50) -> np.ndarray:
+    """
+    Thins out a GPS track so that consecutive points are at least (approximately) `min_spacing_meters` apart.
+    Strava records roughly one point per second, so a typical ride collapses from thousands of points to a few hundred
+    without losing the shape of the route.  The first and last points are always kept.
+    """
+    if len(latlng_array) < 3:
+        return latlng_array
+
+    step_distances = calculate_haversine_distance_array(latlng_array[1:, 0], latlng_array[1:, 1],
+                                                        latlng_array[:-1, 0], latlng_array[:-1, 1])
+    # Bucket the cumulative distance into `min_spacing_meters`-sized chunks, and keep the first point in each chunk
+    cumulative_distance = np.concatenate(([0.0], np.cumsum(step_distances)))
+    buckets = np.floor(cumulative_distance / min_spacing_meters).astype(np.int64)
+    keep = np.concatenate(([True], buckets[1:] != buckets[:-1]))
+    keep[-1] = True
+    return latlng_array[keep]
+
+
+def calculate_haversine_distance_array(latitudes: Union[float, np.ndarray],
+                                       longitudes: Union[float, np.ndarray],
+                                       reference_latitude: Union[float, np.ndarray],
+                                       reference_longitude: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Returns the great-circle distance, in meters, between each (latitude, longitude) pair and the reference point(s).
+    All inputs are in degrees and are broadcast against one another.
+    """
+    lat1, lng1 = np.radians(latitudes), np.radians(longitudes)
+    lat2, lng2 = np.radians(reference_latitude), np.radians(reference_longitude)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def convert_latlng_array_to_grid_cells(latlng_array: np.ndarray, cell_size_degrees: float) -> np.ndarray:
+    """
+    Quantizes an (n, 2) array of [latitude, longitude] pairs onto a regular grid.
+    Returns an (n, 2) integer array of [row, column] cell coordinates
+    """
+    return np.floor(np.asarray(latlng_array, dtype=np.float64) / cell_size_degrees).astype(np.int64)
+
+
+def decode_polyline(polyline: str, precision: int = 5) -> np.ndarray:
+    """
+    Decodes an encoded polyline string (the format used by Strava's `map.summary_polyline`) into an (n, 2) array of
+    [latitude, longitude] pairs.
+
+    Rather than looping over the string character by character, every character is converted to its 5-bit chunk at
+    once, the chunks are grouped into values using the continuation bit, and the zigzag-encoded deltas are
+    cumulatively summed back into coordinates.
+    """
+    if not polyline:
+        return np.empty((0, 2), dtype=np.float64)
+
+    chunks = np.frombuffer(polyline.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    # A chunk without the 0x20 continuation bit terminates a value
+    is_last_chunk = (chunks & 0x20) == 0
+    value_ids = np.concatenate(([0], np.cumsum(is_last_chunk)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], value_ids[1:] != value_ids[:-1])))
+    chunk_positions = np.arange(len(chunks)) - value_starts[value_ids]
+    values = np.add.reduceat((chunks & 0x1f) << (5 * chunk_positions), value_starts)
+
+    # Undo the zigzag encoding
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    if len(deltas) % 2:
+        raise ValueError("Polyline is malformed.  It does not decode to an even number of values")
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def encode_polyline(latlng_array: np.ndarray, precision: int = 5) -> str:
+    """
+    Encodes an (n, 2) array of [latitude, longitude] pairs as a polyline string.  Inverse of `decode_polyline()`
+    """
+    if not len(latlng_array):
+        return ''
+
+    coordinates = np.round(np.asarray(latlng_array, dtype=np.float64) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(coordinates, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Split each value into 5-bit chunks, keeping only as many chunks as each value needs
+    shifts = np.arange(7) * 5
+    chunks = (values[:, None] >> shifts[None, :]) & 0x1f
+    chunk_counts = 1 + np.count_nonzero((values[:, None] >> shifts[None, 1:]) > 0, axis=1)
+    continuation = np.arange(7)[None, :] < (chunk_counts - 1)[:, None]
+    needed = np.arange(7)[None, :] < chunk_counts[:, None]
+    return ((chunks | (continuation * 0x20)) + 63)[needed].astype(np.uint8).tobytes().decode('ascii')
+
+
+def resample_latlng_array(latlng_array: np.ndarray, spacing_meters: float) -> np.ndarray:
+    """
+    Re-samples a path at (approximately) even `spacing_meters` intervals by linearly interpolating along each segment.
+    Summary polylines are simplified and can have long gaps between points, so this fills them in before the path is
+    bucketed into grid cells.
+    """
+    if len(latlng_array) < 2:
+        return latlng_array
+
+    step_distances = calculate_haversine_distance_array(latlng_array[1:, 0], latlng_array[1:, 1],
+                                                        latlng_array[:-1, 0], latlng_array[:-1, 1])
+    cumulative_distance = np.concatenate(([0.0], np.cumsum(step_distances)))
+    targets = np.arange(0, cumulative_distance[-1] + spacing_meters, spacing_meters)
+    targets[-1] = min(targets[-1], cumulative_distance[-1])
+    return np.column_stack((np.interp(targets, cumulative_distance, latlng_array[:, 0]),
+                            np.interp(targets, cumulative_distance, latlng_array[:, 1])))
+
+
+def convert_latlng_array_to_mercator_pixels(latlng_array: np.ndarray,
+                                            zoom: int,
+                                            tile_size: int = 256) -> np.ndarray:
+    """
+    Projects an (n, 2) array of [latitude, longitude] pairs onto the Web-Mercator pixel grid used by map tiles at the
+    given zoom level.  Returns an (n, 2) integer array of global [x, y] pixel coordinates.
+    """
+    world_size = tile_size * 2 ** zoom
+    latitudes = np.clip(latlng_array[:, 0], -85.05112878, 85.05112878)
+    sin_latitudes = np.sin(np.radians(latitudes))
+    x = (latlng_array[:, 1] + 180) / 360 * world_size
+    y = (0.5 - np.log((1 + sin_latitudes) / (1 - sin_latitudes)) / (4 * np.pi)) * world_size
+    return np.clip(np.column_stack((x, y)).astype(np.int64), 0, world_size - 1)
+
+
+def convert_mercator_pixels_to_latlng_array(pixel_array: np.ndarray,
+                                            zoom: int,
+                                            tile_size: int = 256) -> np.ndarray:
+    """
+    Inverse of `convert_latlng_array_to_mercator_pixels()`.  Returns the [latitude, longitude] of each pixel's center
+    """
+    world_size = tile_size * 2 ** zoom
+    x = (pixel_array[:, 0] + 0.5) / world_size
+    y = (pixel_array[:, 1] + 0.5) / world_size
+    longitudes = x * 360 - 180
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y))))
+    return np.column_stack((latitudes, longitudes))
@@ -0,0 +1,180 @@
+import functools
+import io
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable
+from modules.create_logger import create_logger
+
+# Set STRAVA_PROFILE=1 to capture a cProfile + tracemalloc report for every `profile_block()`
+PROFILING_ENVIRONMENT_VARIABLE = 'STRAVA_PROFILE'
+# Upper bounds (in milliseconds) of the timing histogram buckets.  The last bucket catches everything slower
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+logger = create_logger('InstrumentationLogger', 'info')
+
+_lock = threading.Lock()
+_timings = defaultdict(lambda: {'count': 0,
+                                'total_ms': 0.0,
+                                'min_ms': float('inf'),
+                                'max_ms': 0.0,
+                                'last_ms': 0.0,
+                                'histogram': [0] * len(HISTOGRAM_BUCKETS_MS)})
+_counters = defaultdict(int)
+_profiles = {}
+
+
+# Internal use
+def _record_timing(name: str, elapsed_ms: float) -> None:
+    with _lock:
+        stats = _timings[name]
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['min_ms'] = min(stats['min_ms'], elapsed_ms)
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        stats['last_ms'] = elapsed_ms
+        bucket = next(idx for idx, upper_bound in enumerate(HISTOGRAM_BUCKETS_MS) if elapsed_ms <= upper_bound)
+        stats['histogram'][bucket] += 1
+
+
+def is_profiling_enabled() -> bool:
+    """Returns True if the STRAVA_PROFILE environment variable is set to a truthy value"""
+    return os.environ.get(PROFILING_ENVIRONMENT_VARIABLE, '').lower() in ('1', 'true', 'yes')
+
+
+@contextmanager
+def timer(name: str):
+    """
+    Context manager which records how long the enclosed block took under `name`.
+
+    Example:
+    --------
+        with timer('ingest.fetch_streams'):
+            response = requests.get(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_timing(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name: str = None) -> Callable:
+    """
+    Decorator which records the run time of every call to the decorated function.
+    Timings are recorded under `name`, which defaults to '<module>.<function name>'
+    """
+
+    def decorator(function: Callable) -> Callable:
+        timing_name = name or f"{function.__module__.split('.')[-1]}.{function.__name__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(timing_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def increment_counter(name: str, value: int = 1) -> None:
+    """Increments an in-process counter, e.g. the number of rides ingested"""
+    with _lock:
+        _counters[name] += value
+
+
+@contextmanager
+def profile_block(name: str, top_n: int = 25):
+    """
+    Opt-in profiling for a block of code.  When STRAVA_PROFILE is set, the block runs under cProfile and tracemalloc,
+    and a text report (the top `top_n` functions by cumulative time, plus peak traced memory) is stored under `name`
+    and available from `get_profile_reports()`.  When profiling is disabled this only records the block's timing.
+    """
+    if not is_profiling_enabled():
+        with timer(name):
+            yield
+        return
+
+    # Imported here so that the (common) non-profiling path doesn't pay for them at startup
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top_n)
+        with _lock:
+            _profiles[name] = {'captured_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                               'elapsed_ms': elapsed_ms,
+                               'peak_memory_bytes': peak_bytes,
+                               'report': report.getvalue()}
+        _record_timing(name, elapsed_ms)
+        logger.info(f"Captured profile for {name}: {elapsed_ms:.0f} ms, peak traced memory {peak_bytes / 1e6:.1f} MB")
+
+
+def get_metrics_snapshot() -> dict:
+    """
+    Returns a copy of every recorded timing and counter.
+
+    Returns:
+    -----------
+        - A dictionary of the form
+            {'timings': {name: {'count', 'total_ms', 'mean_ms', 'min_ms', 'max_ms', 'last_ms', 'histogram'}},
+             'counters': {name: value},
+             'histogram_buckets_ms': [...]}
+    """
+    with _lock:
+        timings = {name: {**stats,
+                          'histogram': list(stats['histogram']),
+                          'mean_ms': stats['total_ms'] / stats['count']}
+                   for name, stats in _timings.items()}
+        counters = dict(_counters)
+    return {'timings': timings,
+            'counters': counters,
+            'histogram_buckets_ms': [str(bound) for bound in HISTOGRAM_BUCKETS_MS]}
+
+
+def get_profile_reports() -> dict:
+    """Returns the most recent profile captured for each `profile_block()` name"""
+    with _lock:
+        return dict(_profiles)
+
+
+def dump_metrics(path: str = None) -> str:
+    """
+    Serializes the current metrics snapshot (and any captured profiles) to JSON.
+    Writes to `path` if one is provided, and returns the JSON string either way
+    """
+    output = json.dumps({**get_metrics_snapshot(), 'profiles': get_profile_reports()}, indent=2)
+    if path:
+        with open(path, 'w') as file:
+            file.write(output)
+    return output
+
+
+def reset_metrics() -> None:
+    """Clears every recorded timing, counter and profile"""
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _profiles.clear()
@@ -0,0 +1,52 @@
+import os
+from dataclasses import asdict, dataclass
+
+RIDES_FILE_NAME = 'saved_strava_rides.json'
+GEAR_FILE_NAME = 'gear.json'
+
+
+@dataclass
+class AthleteProfile:
+    """
+    Simple dataclass created to house an athlete's settings.
+
+    Every athlete's files live under their own `data_directory`: the saved rides file, plus anything derived from it
+    (e.g. the heatmap), so that athletes can be loaded, synced and recomputed independently of one another.
+    """
+
+    athlete_id: str
+    name: str
+    refresh_token: str
+    ftp: int
+    lactate_threshold: int
+    data_directory: str
+
+    @property
+    def rides_path(self) -> str:
+        return os.path.join(self.data_directory, RIDES_FILE_NAME)
+
+    @property
+    def gear_path(self) -> str:
+        return os.path.join(self.data_directory, GEAR_FILE_NAME)
+
+    @property
+    def heatmap_directory(self) -> str:
+        return os.path.join(self.data_directory, 'heatmap')
+
+    def to_dict(self):
+        """
+        Method to return the settings in a Python dictionary format
+        """
+
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, input_dict: dict) -> 'AthleteProfile':
+        """
+        Class method to create an AthleteProfile from a dictionary which contains the necessary keys
+        """
+
+        missing_keys = [key for key in cls.__dataclass_fields__ if key not in input_dict]
+        if missing_keys:
+            raise AttributeError(f"Athlete settings are missing {missing_keys}")
+        return cls(**{key: input_dict[key] for key in cls.__dataclass_fields__})
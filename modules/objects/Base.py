@@ -8,10 +8,17 @@ def validate_strava_ride(obj) -> None:
         raise ValueError(f"The input passed must be of type StravaRide.  Object passed was of type {type(obj)}")
 
 
+def validate_ride_hub_listener(obj) -> None:
+    if not all(callable(getattr(obj, method, None)) for method in ['on_ride_added', 'on_ride_removed']):
+        raise ValueError(f"Listeners must implement `on_ride_added()` and `on_ride_removed()`.  Object passed was of "
+                         f"type {type(obj)}")
+
+
 class RideHubBase(ABC):
     _ride_list = []
 
     def __init__(self, *args):
+        self._listeners = []
 
         for sub_dict in args:
 
@@ -74,3 +81,35 @@ class RideHubBase(ABC):
 
         return self._ride_list
 
+    def register_listener(self, listener, replay_existing_rides: bool = True) -> None:
+        """
+        Registers an object which is kept in sync with the hub as rides are added and removed.
+        Listeners must implement `on_ride_added(ride)` and `on_ride_removed(ride)`.  Derived structures (indexes,
+        ledgers, etc.) use this to update incrementally rather than rebuilding from the full ride list.
+
+        Parameters:
+        -----------
+            - listener: Any object implementing `on_ride_added()` and `on_ride_removed()`
+            - replay_existing_rides: bool
+                If True, `on_ride_added()` is called once for every ride already in the hub
+        """
+        validate_ride_hub_listener(listener)
+        self._listeners.append(listener)
+        if replay_existing_rides:
+            for ride in self._ride_list:
+                listener.on_ride_added(ride)
+
+    def unregister_listener(self, listener) -> None:
+        """
+        Stops notifying a previously registered listener
+        """
+        self._listeners = [i for i in self._listeners if i is not listener]
+
+    # Internal use
+    def _notify_ride_added(self, ride: StravaRide) -> None:
+        for listener in self._listeners:
+            listener.on_ride_added(ride)
+
+    def _notify_ride_removed(self, ride: StravaRide) -> None:
+        for listener in self._listeners:
+            listener.on_ride_removed(ride)
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Union
+from modules.create_logger import create_logger
+
+logger = create_logger('EventQueueLogger', 'info')
+
+
+class EventQueue:
+    """
+    Durable, first-in-first-out queue of JSON events, stored as one file per event.
+
+    Events move between sub-directories with atomic renames, so a crash at any point leaves each event in exactly one
+    state and nothing is lost:
+
+        pending/      waiting to be processed
+        processing/   claimed by a worker.  Moved back to pending/ when a worker next opens the queue (crash recovery)
+        failed/       gave up after `max_attempts`, kept along with the last error for inspection
+
+    Processed events are deleted.  File names start with the nanosecond timestamp at which the event becomes
+    available, so sorting them gives arrival order, and retried events are simply given a timestamp in the future.
+    A producer (e.g. the webhook endpoint) and consumers in other threads or processes can share a directory.
+
+    Methods:
+
+        put(self, event: dict):
+            Durably adds an event.  Returns once the event is on disk.
+
+        claim(self, timeout: float = 0):
+            Returns the oldest pending event (and a handle for it), waiting up to `timeout` seconds for one to arrive.
+
+        complete(self, handle: str) / fail(self, handle: str, error: str):
+            Removes a processed event, or returns it to the queue (moving it to failed/ after `max_attempts`).
+    """
+
+    def __init__(self, directory: str, max_attempts: int = 5, retry_delay_seconds: float = 30,
+                 poll_interval_seconds: float = 1.0, recover_claimed_events: bool = True):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._new_event = threading.Condition()
+        for state in ('pending', 'processing', 'failed'):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+        # Producers which share the directory with a running worker must not steal the events it has claimed
+        if recover_claimed_events:
+            self._recover_claimed_events()
+
+    def __str__(self):
+        return f"EventQueue(directory={self.directory}, pending={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self._list_event_files('pending'))
+
+    def put(self, event: dict) -> str:
+        """
+        Writes an event to pending/.  The file is fully written and flushed to disk under a temporary name before it
+        is renamed into place, so consumers never see a partial event.
+
+        Returns:
+        -----------
+            - The event's file name
+        """
+        file_name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json"
+        temporary_path = os.path.join(self.directory, f".{file_name}.tmp")
+        with open(temporary_path, 'w') as file:
+            json.dump({'event': event, 'attempts': 0, 'errors': []}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self._get_path('pending', file_name))
+
+        with self._new_event:
+            self._new_event.notify_all()
+        return file_name
+
+    def claim(self, timeout: float = 0) -> Union[tuple[str, dict], None]:
+        """
+        Moves the oldest pending event to processing/ and returns (handle, event).
+        Waits up to `timeout` seconds for an event if none are pending, and returns None if none arrive
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time_ns()
+            for file_name in self._list_event_files('pending'):
+                if int(file_name[:20]) > now:
+                    # Waiting to be retried.  Everything after this is later still
+                    break
+                try:
+                    # Renames are atomic, so if two workers race for the same event only one of them gets it
+                    os.replace(self._get_path('pending', file_name), self._get_path('processing', file_name))
+                except FileNotFoundError:
+                    continue
+                with open(self._get_path('processing', file_name), 'r') as file:
+                    return file_name, json.load(file)['event']
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Woken immediately by puts from this process; polls for puts from other processes
+            with self._new_event:
+                self._new_event.wait(min(remaining, self.poll_interval_seconds))
+
+    def complete(self, handle: str) -> None:
+        """Deletes a claimed event once it has been processed"""
+        os.remove(self._get_path('processing', handle))
+
+    def fail(self, handle: str, error: str) -> None:
+        """
+        Records an error for a claimed event.  The event goes back to pending/ to be retried after an exponential
+        backoff (`retry_delay_seconds`, doubling each attempt), or to failed/ once it has been attempted `max_attempts`
+        times
+        """
+        path = self._get_path('processing', handle)
+        with open(path, 'r') as file:
+            record = json.load(file)
+        record['attempts'] += 1
+        record['errors'].append(error)
+
+        failed = record['attempts'] >= self.max_attempts
+        retry_at = time.time_ns() + int(self.retry_delay_seconds * 2 ** (record['attempts'] - 1) * 1e9)
+        state, file_name = ('failed', handle) if failed else ('pending', f"{retry_at:020d}-{handle[21:]}")
+        temporary_path = os.path.join(self.directory, f".{file_name}.tmp")
+        with open(temporary_path, 'w') as file:
+            json.dump(record, file)
+        os.replace(temporary_path, self._get_path(state, file_name))
+        os.remove(path)
+        if failed:
+            logger.error(f"Event {handle} failed {record['attempts']} times and was moved to failed/: {error}")
+
+    # Internal use
+    def _get_path(self, state: str, file_name: str) -> str:
+        return os.path.join(self.directory, state, file_name)
+
+    def _list_event_files(self, state: str) -> list[str]:
+        return sorted(name for name in os.listdir(os.path.join(self.directory, state)) if name.endswith('.json'))
+
+    def _recover_claimed_events(self) -> None:
+        """Returns events which were claimed by a worker that never finished them (e.g. it crashed) to pending/"""
+        for file_name in self._list_event_files('processing'):
+            os.replace(self._get_path('processing', file_name), self._get_path('pending', file_name))
+            logger.info(f"Recovered unfinished event {file_name}")
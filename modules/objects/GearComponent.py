@@ -0,0 +1,43 @@
+from dataclasses import asdict, dataclass, field
+from typing import Dict
+
+
+@dataclass
+class GearComponent:
+    """
+    Simple dataclass created to house a wearing component (e.g. a chain) fitted to a piece of Strava gear (a bike).
+
+    The component's odometer counts every ride on `gear_id` from `installed_on` (YYYY-MM-DD, inclusive).  `thresholds`
+    maps GearLedger metrics ('distance_km', 'moving_hours', 'kilojoules', 'tss') to the value at which the component
+    is due for replacement.
+    """
+
+    gear_id: str
+    component: str
+    installed_on: str
+    thresholds: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.gear_id, self.component
+
+    def to_dict(self):
+        """
+        Method to return the component in a Python dictionary format
+        """
+
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, input_dict: dict) -> 'GearComponent':
+        """
+        Class method to create a GearComponent from a dictionary which contains the necessary keys
+        """
+
+        missing_keys = [key for key in ('gear_id', 'component', 'installed_on') if key not in input_dict]
+        if missing_keys:
+            raise AttributeError(f"Gear component is missing {missing_keys}")
+        return cls(gear_id=input_dict['gear_id'],
+                   component=input_dict['component'],
+                   installed_on=input_dict['installed_on'],
+                   thresholds=dict(input_dict.get('thresholds') or {}))
@@ -0,0 +1,188 @@
+from typing import Callable, Iterable, Union
+import numpy as np
+from modules.objects.GearComponent import GearComponent
+from modules.objects.RideMetadataTable import _calculate_ride_training_stress_score
+from modules.objects.StravaRide import StravaRide
+
+GEAR_METRICS = ('distance_km', 'moving_hours', 'kilojoules', 'tss')
+
+
+# Internal use
+def _get_ride_date(ride: StravaRide) -> str:
+    """The ride's local start date (YYYY-MM-DD), which is what install dates are compared against"""
+    return (ride.metadata.get('start_date_local') or ride.metadata.get('start_date') or '')[:10]
+
+
+def _calculate_ride_contribution(ride: StravaRide) -> np.ndarray:
+    """One ride's addition to each of GEAR_METRICS.  Missing values (e.g. no TSS without an FTP) count as zero"""
+    metadata = ride.metadata
+    return np.nan_to_num(np.array([(metadata.get('distance') or 0) / 1000,
+                                   (metadata.get('moving_time') or 0) / 3600,
+                                   metadata.get('kilojoules') or 0,
+                                   _calculate_ride_training_stress_score(ride)], dtype=np.float64))
+
+
+class GearLedger:
+    """
+    Running totals of distance, moving time, kJ and TSS per piece of gear (`metadata['gear_id']`), and per installed
+    component (see GearComponent) since its install date.
+
+    The ledger is a RideHub listener, so totals are kept up to date incrementally: each ride's contribution is
+    calculated once when it is added and stored, added to its gear and to that gear's components, and subtracted
+    again when the ride is removed.  Nothing is recomputed from the full history, except a single component's
+    odometer when it is (re)installed.
+
+        gear_ledger = GearLedger(load_gear_components(profile.gear_path))
+        ride_hub.register_listener(gear_ledger)
+
+    When an added ride takes a component past one of its thresholds, `on_alert` is called with an alert dict (see
+    `get_alerts()`).  Set it after registering to stay quiet while the hub replays the rides it already has.
+
+    Methods:
+
+        install_component(self, component: GearComponent):
+            Fits a component, replacing any component of the same name on that gear, and builds its odometer.
+
+        get_ride_contribution(self, ride_id: int) -> dict:
+            What one ride added to each metric of its gear.
+
+        get_gear_totals(self) -> dict:
+            {gear_id: {'n_rides': int, metric: total}} over every ride on each piece of gear.
+
+        get_component_status(self) -> list[dict]:
+            Each component's odometer, thresholds and how much of each threshold has been used.
+
+        get_alerts(self) -> list[dict]:
+            Every threshold which has been reached.
+    """
+
+    def __init__(self, components: Iterable[GearComponent] = (), on_alert: Callable[[dict], None] = None):
+        self.on_alert = on_alert
+        # ride_id -> (gear_id, ride date, contribution array)
+        self._contributions = {}
+        self._gear_totals = {}
+        self._gear_ride_counts = {}
+        # gear_id -> {component name: GearComponent}
+        self._components = {}
+        self._component_totals = {}
+        for component in components:
+            self.install_component(component)
+
+    def __str__(self):
+        return f"GearLedger(n_gear={len(self._gear_totals)}, n_components={len(self._component_totals)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self._contributions)
+
+    def on_ride_added(self, ride: StravaRide) -> None:
+        """RideHub listener hook"""
+        if ride.id in self._contributions:
+            self._remove_contribution(ride.id)
+        gear_id = ride.metadata.get('gear_id')
+        if not gear_id:
+            return
+
+        ride_date, contribution = _get_ride_date(ride), _calculate_ride_contribution(ride)
+        self._contributions[ride.id] = (gear_id, ride_date, contribution)
+        self._gear_totals[gear_id] = self._gear_totals.get(gear_id, np.zeros(len(GEAR_METRICS))) + contribution
+        self._gear_ride_counts[gear_id] = self._gear_ride_counts.get(gear_id, 0) + 1
+
+        for component in self._components.get(gear_id, {}).values():
+            if ride_date < component.installed_on:
+                continue
+            previous_totals = self._component_totals[component.key]
+            self._component_totals[component.key] = previous_totals + contribution
+            self._check_thresholds(component, previous_totals, ride.id)
+
+    def on_ride_removed(self, ride: StravaRide) -> None:
+        """RideHub listener hook"""
+        if ride.id in self._contributions:
+            self._remove_contribution(ride.id)
+
+    def install_component(self, component: GearComponent) -> None:
+        """
+        Fits a component, replacing any component with the same name on the same gear (e.g. a new chain).
+        Its odometer is built from the stored contributions of the rides on that gear since its install date
+        """
+        unknown_metrics = [metric for metric in component.thresholds if metric not in GEAR_METRICS]
+        if unknown_metrics:
+            raise ValueError(f"Unknown threshold metrics {unknown_metrics}.  Expected any of {GEAR_METRICS}")
+        self._components.setdefault(component.gear_id, {})[component.component] = component
+        contributions = [contribution for gear_id, ride_date, contribution in self._contributions.values()
+                         if gear_id == component.gear_id and ride_date >= component.installed_on]
+        self._component_totals[component.key] = np.sum(contributions, axis=0) if contributions \
+            else np.zeros(len(GEAR_METRICS))
+
+    def remove_component(self, gear_id: str, component_name: str) -> None:
+        """Stops tracking a component"""
+        self._components.get(gear_id, {}).pop(component_name, None)
+        self._component_totals.pop((gear_id, component_name), None)
+
+    def get_ride_contribution(self, ride_id: int) -> Union[dict[str, float], None]:
+        """What one ride added to its gear, {metric: value}, or None if the ledger hasn't counted the ride"""
+        if ride_id not in self._contributions:
+            return None
+        return self._convert_totals_to_dict(self._contributions[ride_id][2])
+
+    def get_gear_totals(self) -> dict[str, dict[str, Union[int, float]]]:
+        """Returns {gear_id: {'n_rides': int, metric: total}} for every piece of gear with at least one ride"""
+        return {gear_id: {'n_rides': self._gear_ride_counts[gear_id], **self._convert_totals_to_dict(totals)}
+                for gear_id, totals in sorted(self._gear_totals.items())}
+
+    def get_component_status(self) -> list[dict]:
+        """
+        Returns one dict per component: its gear_id, name and install date, its odometer (one key per GEAR_METRICS),
+        its thresholds, and 'threshold_used', the fraction of each threshold reached so far
+        """
+        status = []
+        for gear_id in sorted(self._components):
+            for name, component in sorted(self._components[gear_id].items()):
+                totals = self._convert_totals_to_dict(self._component_totals[component.key])
+                status.append({'gear_id': gear_id,
+                               'component': name,
+                               'installed_on': component.installed_on,
+                               **totals,
+                               'thresholds': dict(component.thresholds),
+                               'threshold_used': {metric: totals[metric] / limit
+                                                  for metric, limit in component.thresholds.items() if limit}})
+        return status
+
+    def get_alerts(self) -> list[dict]:
+        """
+        Returns one alert per component threshold which has been reached:
+        {'gear_id', 'component', 'metric', 'value', 'threshold'}
+        """
+        return [{'gear_id': status['gear_id'], 'component': status['component'], 'metric': metric,
+                 'value': status[metric], 'threshold': status['thresholds'][metric]}
+                for status in self.get_component_status()
+                for metric, used in status['threshold_used'].items() if used >= 1]
+
+    # Internal use
+    def _remove_contribution(self, ride_id: int) -> None:
+        gear_id, ride_date, contribution = self._contributions.pop(ride_id)
+        self._gear_ride_counts[gear_id] -= 1
+        if not self._gear_ride_counts[gear_id]:
+            del self._gear_ride_counts[gear_id], self._gear_totals[gear_id]
+        else:
+            self._gear_totals[gear_id] = self._gear_totals[gear_id] - contribution
+        for component in self._components.get(gear_id, {}).values():
+            if ride_date >= component.installed_on:
+                self._component_totals[component.key] = self._component_totals[component.key] - contribution
+
+    def _check_thresholds(self, component: GearComponent, previous_totals: np.ndarray, ride_id: int) -> None:
+        """Calls `on_alert` for each threshold the component's odometer has just reached"""
+        if self.on_alert is None:
+            return
+        totals = self._component_totals[component.key]
+        for metric, limit in component.thresholds.items():
+            idx = GEAR_METRICS.index(metric)
+            if previous_totals[idx] < limit <= totals[idx]:
+                self.on_alert({'gear_id': component.gear_id, 'component': component.component, 'metric': metric,
+                               'value': float(totals[idx]), 'threshold': limit, 'ride_id': ride_id})
+
+    @staticmethod
+    def _convert_totals_to_dict(totals: np.ndarray) -> dict[str, float]:
+        return {metric: round(float(value), 2) for metric, value in zip(GEAR_METRICS, totals)}
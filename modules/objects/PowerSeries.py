@@ -0,0 +1,152 @@
+from typing import Iterable, Union
+import numpy as np
+
+NORMALIZED_POWER_WINDOW_SECONDS = 30
+XPOWER_TIME_CONSTANT_SECONDS = 25
+# The EWMA behind xPower is evaluated in blocks of this many samples, each one a single matrix product
+EWMA_BLOCK_SIZE = 256
+
+_ewma_block_matrices = {}
+
+
+# Internal use
+def _get_ewma_block_matrix(alpha: float) -> np.ndarray:
+    """
+    Returns the lower-triangular block matrix M with M[t, k] = alpha * (1 - alpha) ** (t - k) for k <= t, which
+    applies an EWMA starting from zero to EWMA_BLOCK_SIZE samples.  Built once per alpha
+    """
+    if alpha not in _ewma_block_matrices:
+        lags = np.arange(EWMA_BLOCK_SIZE)[:, None] - np.arange(EWMA_BLOCK_SIZE)[None, :]
+        _ewma_block_matrices[alpha] = np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)
+    return _ewma_block_matrices[alpha]
+
+
+class PowerSeries:
+    """
+    One cleaned float64 power array and its prefix (cumulative) sum, from which every power metric is derived.
+
+    The prefix sum turns the average over any window into a difference of two values, so a rolling average for any
+    window size is a single O(n) vectorized step, with no convolution and no cleaning or copying of the input.
+    StravaRides keep their series in `StravaRide.stream_cache` (see `power_functions.get_power_series()`), so a ride's
+    stream is only cleaned once however many metrics are read from it.
+
+    Methods:
+
+        rolling_average(self, window_size: int) -> np.ndarray:
+            Average of every `window_size`-sample window.
+
+        normalized_power(self, window_size: int = 30) -> int:
+            Coggan normalized power.  NaN for series shorter than `window_size`.
+
+        xpower(self, time_constant: float = 25) -> int:
+            Skiba xPower, using an exponentially weighted rather than a rolling average.  NaN for an empty series.
+
+        create_power_curve(self) -> np.ndarray:
+            The best average power for every window length from 1 second to the whole series.
+    """
+
+    def __init__(self, watts: Iterable):
+        watts = np.asarray(watts, dtype=np.float64)
+        if np.isnan(watts).any():
+            watts = np.nan_to_num(watts)
+        # A read-only view, since the cumulative sum is only valid for these values
+        self.watts = watts.view()
+        self.watts.flags.writeable = False
+        self.cumulative_sum = np.concatenate(([0.0], np.cumsum(watts)))
+
+    def __str__(self):
+        return f"PowerSeries(n_samples={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.watts)
+
+    def rolling_average(self, window_size: int) -> np.ndarray:
+        """Average of every window of `window_size` consecutive samples.  Empty if the series is shorter"""
+        if window_size < 1:
+            raise ValueError(f"`window_size` must be at least 1.  {window_size} was passed")
+        if len(self) < window_size:
+            return np.array([])
+        return (self.cumulative_sum[window_size:] - self.cumulative_sum[:-window_size]) / window_size
+
+    def normalized_power(self, window_size: int = NORMALIZED_POWER_WINDOW_SECONDS) -> Union[int, float]:
+        """
+        The fourth-power mean of the `window_size`-second rolling average, to the power of one fourth.
+        NaN if the series is shorter than `window_size`, as in `calculate_normalized_power_for_series()`
+        """
+        rolling_average = self.rolling_average(window_size)
+        if not len(rolling_average):
+            return np.nan
+        return round(np.mean(rolling_average ** 4) ** 0.25)
+
+    def ewma(self, time_constant: float = XPOWER_TIME_CONSTANT_SECONDS) -> np.ndarray:
+        """
+        Exponentially weighted moving average with a `time_constant`-second time constant, starting from zero.
+
+        The series is split into blocks which are all smoothed at once with one matrix product, then each block is
+        offset by the carried-over value of the block before it, so only the block boundaries are sequential
+        """
+        n_samples = len(self)
+        if not n_samples:
+            return np.array([])
+        alpha = 1 - np.exp(-1 / time_constant)
+        n_blocks = -(-n_samples // EWMA_BLOCK_SIZE)
+        blocks = np.zeros(n_blocks * EWMA_BLOCK_SIZE)
+        blocks[:n_samples] = self.watts
+        blocks = blocks.reshape(n_blocks, EWMA_BLOCK_SIZE) @ _get_ewma_block_matrix(alpha).T
+
+        decay = (1 - alpha) ** np.arange(1, EWMA_BLOCK_SIZE + 1)
+        carry = 0.0
+        for block in blocks:
+            block += carry * decay
+            carry = block[-1]
+        return blocks.ravel()[:n_samples]
+
+    def xpower(self, time_constant: float = XPOWER_TIME_CONSTANT_SECONDS) -> Union[int, float]:
+        """Normalized power with the rolling average replaced by an EWMA (Skiba's xPower).  NaN for an empty series"""
+        if not len(self):
+            return np.nan
+        return round(np.mean(self.ewma(time_constant) ** 4) ** 0.25)
+
+    def create_power_curve(self) -> np.ndarray:
+        """
+        The maximum average power over every window length: index i holds the best (i + 1)-second average.
+        Each window length is one vectorized pass over the prefix sum
+        """
+        cumulative_sum = self.cumulative_sum
+        return np.array([np.max(cumulative_sum[window_size:] - cumulative_sum[:-window_size]) / window_size
+                         for window_size in range(1, len(self) + 1)])
+
+
+def calculate_normalized_power_for_series(power_series: list[PowerSeries],
+                                          window_size: int = NORMALIZED_POWER_WINDOW_SECONDS) -> np.ndarray:
+    """
+    Normalized power of many series in one vectorized pass.
+
+    The cached prefix sums of all the series are laid end to end, so every series' rolling averages come from one
+    gather over that array, and the fourth powers are summed per series with `np.add.reduceat`.  Nothing is cleaned
+    or summed again.  Series shorter than `window_size` get NaN, as from `PowerSeries.normalized_power()`.
+
+    Returns:
+    -----------
+        - A float array with one normalized power value per series, rounded as `PowerSeries.normalized_power()` does
+    """
+    lengths = np.array([len(series) for series in power_series], dtype=np.int64)
+    n_windows = np.maximum(lengths - window_size + 1, 0)
+    output = np.full(len(power_series), np.nan)
+    has_windows = n_windows > 0
+    if not has_windows.any():
+        return output
+
+    cumulative_sums = np.concatenate([series.cumulative_sum for series in power_series])
+    # Where each series' prefix sum starts in `cumulative_sums`, and where its windows start in the output
+    sum_offsets = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))[has_windows]
+    window_offsets = np.concatenate(([0], np.cumsum(n_windows[has_windows])[:-1]))
+    window_starts = np.repeat(sum_offsets - window_offsets, n_windows[has_windows]) + np.arange(n_windows.sum())
+    rolling_averages = (cumulative_sums[window_starts + window_size] - cumulative_sums[window_starts]) / window_size
+
+    sums = np.add.reduceat(rolling_averages ** 4, window_offsets)
+    output[has_windows] = np.round((sums / n_windows[has_windows]) ** 0.25)
+    return output
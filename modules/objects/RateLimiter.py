@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window rate limiter, shared by every caller of an API.
+
+    Each window is a (max_requests, period_seconds) pair, and a request is only allowed once it fits inside every
+    window.  Strava's default application limits are 100 requests per 15 minutes and 1,000 per day, across every
+    athlete using the application, so a single limiter is shared by all of the threads syncing athletes in parallel.
+
+    Methods:
+
+        acquire(self):
+            Blocks until a request is allowed under every window, then records it.
+
+        update_from_usage(self, usage: list[int]):
+            Brings the limiter in line with the usage the API reports (e.g. Strava's X-RateLimit-Usage header).
+    """
+
+    def __init__(self, windows: tuple = ((100, 15 * 60), (1000, 24 * 60 * 60)), clock=time.monotonic,
+                 sleep=time.sleep):
+        self.windows = tuple(windows)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._request_times = deque()
+
+    def __str__(self):
+        return f"RateLimiter(windows={self.windows}, recent_requests={len(self._request_times)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request is allowed under every window, then records it.
+
+        Returns:
+        -----------
+            - The number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait_seconds = self._get_wait_seconds(self._clock())
+                if wait_seconds <= 0:
+                    self._request_times.append(self._clock())
+                    return waited
+            self._sleep(wait_seconds)
+            waited += wait_seconds
+
+    def update_from_usage(self, usage: list[int]) -> None:
+        """
+        Brings the limiter in line with the request counts the API reports for each window (in the same order as
+        `windows`).  Requests made by other processes using the same credentials then count against this limiter too.
+        Usage below what has been recorded locally is ignored
+        """
+        with self._lock:
+            now = self._clock()
+            for (_, period_seconds), reported_count in zip(self.windows, usage):
+                local_count = sum(1 for request_time in self._request_times if now - request_time < period_seconds)
+                # Unknown requests are recorded as having just happened, which is the conservative assumption
+                self._request_times.extend([now] * max(0, int(reported_count) - local_count))
+            self._request_times = deque(sorted(self._request_times))
+
+    # Internal use
+    def _get_wait_seconds(self, now: float) -> float:
+        longest_period = max(period_seconds for _, period_seconds in self.windows)
+        while self._request_times and now - self._request_times[0] >= longest_period:
+            self._request_times.popleft()
+
+        wait_seconds = 0.0
+        for max_requests, period_seconds in self.windows:
+            in_window = [request_time for request_time in self._request_times if now - request_time < period_seconds]
+            if len(in_window) >= max_requests:
+                # Wait until the oldest request that still counts against this window falls out of it
+                wait_seconds = max(wait_seconds, in_window[-max_requests] + period_seconds - now)
+        return wait_seconds
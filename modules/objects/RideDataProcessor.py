@@ -1,20 +1,50 @@
-import json
-import time
-import numpy as np
-import requests
 from tqdm import tqdm
 from global_variables import CURRENT_FTP
-from modules.api_functions import get_activity_data
+from modules.api_functions import get_activity_by_id, get_activity_data, get_activity_streams
 from modules.create_logger import create_logger
+from modules.instrumentation import increment_counter, timed, timer
 from modules.objects.RideHub import RideHub
 from modules.objects.StravaRide import StravaRide
-from modules.power_functions import create_individual_ride_power_curve_array
-
-ENDPOINT_SUFFIX = ("/streams?keys=time,distance,latlng,altitude,velocity_smooth,heartrate,cadence,watts,temp,moving,"
-                   "grade_smooth&key_by_type=true")
+from modules.power_functions import get_power_series
+from modules.quality_functions import apply_stream_quality_screening
+from modules.ride_io import SAVED_RIDES_PATH, get_rides_file_modified_time, lock_rides_file, \
+    sync_ride_hub_with_json_file, write_rides_to_json_file
 
 logger = create_logger('RideStatusLogger', 'debug')
 
+# The Strava summary fields the repo reads from a ride's metadata: the raw keys of
+# summary_functions.master_column_list plus the nested/location fields its derived columns come from
+SUMMARY_METADATA_KEYS = ('resource_state', 'id', 'athlete', 'name', 'distance', 'moving_time', 'elapsed_time',
+                         'total_elevation_gain', 'type', 'sport_type', 'workout_type', 'start_date',
+                         'start_date_local', 'location_city', 'location_state', 'location_country',
+                         'achievement_count', 'kudos_count', 'comment_count', 'athlete_count', 'photo_count', 'map',
+                         'trainer', 'manual', 'private', 'visibility', 'flagged', 'gear_id',
+                         'start_latlng', 'end_latlng', 'average_speed', 'max_speed', 'average_cadence',
+                         'average_temp', 'average_watts', 'max_watts', 'weighted_average_watts', 'kilojoules',
+                         'device_watts', 'has_heartrate', 'average_heartrate', 'max_heartrate', 'heartrate_opt_out',
+                         'display_hide_heartrate_option', 'elev_high', 'elev_low', 'upload_id', 'upload_id_str',
+                         'external_id', 'from_accepted_tag', 'pr_count', 'total_photo_count', 'has_kudoed',
+                         'suffer_score')
+
+SUMMARY_MAP_KEYS = ('id', 'summary_polyline', 'resource_state')
+
+
+# Internal use
+def _extract_summary_metadata(activity_data: dict) -> dict:
+    """
+    Reduces a DetailedActivity to the summary fields kept as a ride's metadata, leaving out segment efforts,
+    laps, splits, photos and the full-resolution polyline
+
+    Returns:
+    -----------
+    summary_metadata: dict
+    """
+    summary_metadata = {key: activity_data[key] for key in SUMMARY_METADATA_KEYS if key in activity_data}
+    if isinstance(summary_metadata.get('map'), dict):
+        summary_metadata['map'] = {key: summary_metadata['map'][key] for key in SUMMARY_MAP_KEYS
+                                   if key in summary_metadata['map']}
+    return summary_metadata
+
 
 class RideDataProcessor:
     """
@@ -28,15 +58,29 @@ class RideDataProcessor:
         Process_single_ride(self, ride_id: int, all_activities: list):
             Processes a single ride by fetching its detailed data and adding it to the ride hub.
 
+        process_activity_event(self, aspect_type: str, activity_id: int):
+            Applies a single activity create/update/delete (e.g. from a Strava webhook) without polling the activity
+            list, and saves the result.
+
         Save_ride_hub_to_file(self):
             Saves the current state of the ride hub to a JSON file.
+
+    The ride hub is assumed to have just been loaded from `save_path`.  Other processes may write that file too (the
+    dashboard's refresh, `cli.py sync`, the webhook worker), so updates hold the file's lock (see
+    `ride_io.lock_rides_file()`) from start to save, and first bring the hub up to date if the file has been written
+    since this processor last saw it.  Nobody's rides are overwritten by a stale hub.
     """
 
-    def __init__(self, token: str, headers: dict, ride_hub: RideHub):
+    def __init__(self, token: str, headers: dict, ride_hub: RideHub, save_path: str = SAVED_RIDES_PATH,
+                 ftp: int = CURRENT_FTP):
         self.token = token
         self.headers = headers
         self.ride_hub = ride_hub
+        self.save_path = save_path
+        self.ftp = ftp
+        self._saved_modified_time = get_rides_file_modified_time(save_path)
 
+    @timed('ingest.retrieve_and_process_new_ride_data')
     def retrieve_and_process_new_ride_data(self, streamlit_status_placeholder=None) -> int:
         """
         Retrieve and process new ride data that have power meter data available. Optionally
@@ -55,7 +99,64 @@ class RideDataProcessor:
             The number of new rides processed and added to the ride hub.  This is for surfacing
             in Streamlit
         """
-        all_activities = get_activity_data(self.token, params={'per_page': 200})
+        with lock_rides_file(self.save_path):
+            self._sync_with_saved_file()
+            return self._retrieve_and_process_new_ride_data(streamlit_status_placeholder)
+
+    @timed('ingest.process_single_ride')
+    def process_single_ride(self, ride_id: int, all_activities: list[dict]) -> None:
+        """
+        Processes a single ride by fetching the activity data and metrics from the Strava API, creating a StravaRide
+        object, screening its streams for sensor faults, and adding it to the ride hub.
+
+        Arguments:
+        ride_id (int): The unique identifier for the ride.
+        all_activities (list): A list containing metadata for all activities.
+        """
+        # Requests wait on the rate budget shared by every athlete (see api_functions.strava_rate_limiter)
+        with timer('ingest.fetch_streams'):
+            metrics_dict = get_activity_streams(self.token, ride_id)
+
+        activity_data = next(activity for activity in all_activities if activity['id'] == ride_id)
+
+        ride_object = StravaRide(
+            id=ride_id,
+            metadata=activity_data,
+            metrics_dict=metrics_dict
+        )
+        # Everything derived at ingest is in place before the ride is added, since listeners (e.g. the gear ledger's
+        # TSS) read it as soon as they are notified
+        with timer('ingest.screen_streams'):
+            apply_stream_quality_screening(ride_object)
+        ride_object.metadata['ftp'] = self.ftp
+        with timer('ingest.create_power_curve'):
+            ride_object.metrics_dict['power_curve'] = list(get_power_series(ride_object).create_power_curve())
+
+        self.ride_hub.add_ride(ride_object)
+        increment_counter('ingest.rides_added')
+
+    @timed('ingest.process_activity_event')
+    def process_activity_event(self, aspect_type: str, activity_id: int) -> str:
+        """
+        Applies one Strava activity event to the ride hub, fetching only the affected activity, then saves the hub.
+
+        - 'create': fetches the activity and its streams, and adds it if it has power meter data
+        - 'update': refreshes the stored metadata (name, type, etc.).  Streams never change after upload, so they are
+          not fetched again.  Activities which aren't in the hub yet are treated as 'create'
+        - 'delete': removes the activity if it is in the hub
+
+        Returns:
+        -----------
+            - What happened: 'added', 'updated', 'removed' or 'skipped'
+        """
+        with lock_rides_file(self.save_path):
+            self._sync_with_saved_file()
+            return self._apply_activity_event(aspect_type, activity_id)
+
+    # Internal use
+    def _retrieve_and_process_new_ride_data(self, streamlit_status_placeholder=None) -> int:
+        with timer('ingest.fetch_activity_list'):
+            all_activities = get_activity_data(self.token, params={'per_page': 200})
         ride_ids_with_power_meter_data = [activity['id'] for activity in all_activities if activity.get('device_watts')]
         new_ride_ids = [ride_id for ride_id in ride_ids_with_power_meter_data if ride_id not in self.ride_hub]
 
@@ -75,8 +176,6 @@ class RideDataProcessor:
             if streamlit_status_placeholder:
                 streamlit_status_placeholder.info(f"Processing ride {idx} of {total_new_rides}...")
 
-            time.sleep(np.random.randint(5, 8))
-
         # Save
         self._save_ride_hub_to_file()
         if streamlit_status_placeholder:
@@ -84,35 +183,53 @@ class RideDataProcessor:
 
         return total_new_rides
 
-    def process_single_ride(self, ride_id: int, all_activities: list[dict]) -> None:
-        """
-        Processes a single ride by fetching the activity data and metrics from the Strava API, creating a StravaRide
-        object, and adding it to the ride hub.
-
-        Arguments:
-        ride_id (int): The unique identifier for the ride.
-        all_activities (list): A list containing metadata for all activities.
-        """
-        activity_stream_endpoint = f"https://www.strava.com/api/v3/activities/{ride_id}{ENDPOINT_SUFFIX}"
-        response = requests.get(activity_stream_endpoint, headers=self.headers)
-
-        activity_data = next(activity for activity in all_activities if activity['id'] == ride_id)
-
-        ride_object = StravaRide(
-            id=ride_id,
-            metadata=activity_data,
-            metrics_dict={key: array['data'] for key, array in response.json().items()}
-        )
-
-        self.ride_hub.add_ride(ride_object)
-        power_curve = create_individual_ride_power_curve_array(self.ride_hub, ride_id)
-        ride_object.metrics_dict['power_curve'] = list(power_curve)
-        ride_object.metadata['ftp'] = CURRENT_FTP
+    def _apply_activity_event(self, aspect_type: str, activity_id: int) -> str:
+        if aspect_type == 'delete':
+            if activity_id not in self.ride_hub:
+                return 'skipped'
+            self.ride_hub.remove_ride_by_id(activity_id)
+            self._save_ride_hub_to_file()
+            return 'removed'
+
+        if aspect_type not in ('create', 'update'):
+            raise ValueError(f"Unknown activity event aspect type: {aspect_type}")
+
+        with timer('ingest.fetch_activity'):
+            activity_data = get_activity_by_id(self.token, activity_id)
+        if not activity_data.get('device_watts'):
+            return 'skipped'
+
+        summary_metadata = _extract_summary_metadata(activity_data)
+        existing_ride = self.ride_hub.get_ride(activity_id)
+        if existing_ride is None:
+            self.process_single_ride(activity_id, [summary_metadata])
+            outcome = 'added'
+        else:
+            # Re-added so that listeners (metadata table, indexes) see the new metadata
+            self.ride_hub.remove_ride_by_id(activity_id)
+            # Merged into the existing metadata, which keeps the values derived at ingest (ftp, quality)
+            existing_ride.metadata = {**existing_ride.metadata, **summary_metadata}
+            existing_ride.metadata.setdefault('ftp', self.ftp)
+            self.ride_hub.add_ride(existing_ride)
+            outcome = 'updated'
 
+        self._save_ride_hub_to_file()
+        return outcome
+
+    def _sync_with_saved_file(self) -> None:
+        """Brings the ride hub up to date with the saved file if another process has written it since"""
+        modified_time = get_rides_file_modified_time(self.save_path)
+        if modified_time in (self._saved_modified_time, 0.0):
+            return
+        counts = sync_ride_hub_with_json_file(self.ride_hub, self.save_path)
+        self._saved_modified_time = modified_time
+        logger.info(f"{self.save_path} was written by another process.  Synced the ride hub: {counts}")
+
+    @timed('ingest.save_ride_hub')
     def _save_ride_hub_to_file(self) -> None:
         """
         Saves the current ride hub to a file in JSON format.
         """
-        with open('data/saved_strava_rides.json', 'w') as file:
-            json.dump(self.ride_hub.create_json_output(), file)
-            logger.info(f"Successful write, {len(self.ride_hub)} total rides with power data")
+        write_rides_to_json_file(self.ride_hub.ride_list, self.save_path)
+        self._saved_modified_time = get_rides_file_modified_time(self.save_path)
+        logger.info(f"Successful write, {len(self.ride_hub)} total rides with power data")
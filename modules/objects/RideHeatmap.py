@@ -0,0 +1,210 @@
+import json
+import os
+import numpy as np
+from modules.create_logger import create_logger
+from modules.geo_functions import convert_latlng_array_to_mercator_pixels, convert_mercator_pixels_to_latlng_array, \
+    extract_latlng_array_from_metrics_dict
+from modules.objects.StravaRide import StravaRide
+
+DEFAULT_HEATMAP_DIRECTORY = 'data/heatmap'
+DEFAULT_ZOOM_LEVELS = (8, 10, 12, 14)
+
+logger = create_logger('HeatmapLogger', 'info')
+
+
+class RideHeatmap:
+    """
+    Rasterized heatmap of every GPS point recorded on outdoor rides.
+
+    For each zoom level, every `latlng` point is projected onto the Web-Mercator pixel grid (the same grid map tiles
+    use) and counted.  Only non-empty pixels are stored, as two sorted, compact arrays per zoom level: the pixel ID and
+    the number of points which fell into it.  Rendering then sends one weighted point per non-empty pixel to the
+    browser rather than every raw GPS point.
+
+    Rides are added incrementally, and the index can be kept in sync with a RideHub by registering it as a listener:
+
+        heatmap = RideHeatmap.load()
+        heatmap.reconcile(ride_hub)
+        ride_hub.register_listener(heatmap, replay_existing_rides=False)
+        ...
+        if heatmap.has_unsaved_changes:
+            heatmap.save()
+
+    Methods:
+
+        add_ride(self, ride: StravaRide) / add_rides(self, rides):
+            Adds GPS points to every zoom level.  Rides which were already added are skipped.
+
+        remove_ride(self, ride: StravaRide):
+            Subtracts a ride's GPS points from every zoom level.
+
+        reconcile(self, rides):
+            Brings a loaded heatmap in line with a RideHub, rebuilding it if the hub has lost any of its rides.
+
+        get_pixel_counts(self, zoom: int):
+            Returns the [latitude, longitude] of every non-empty pixel along with its point count.
+
+        save(self, directory: str) / load(cls, directory: str):
+            Persists the heatmap as one compressed .npz file per zoom level.
+    """
+
+    def __init__(self, zoom_levels: tuple = DEFAULT_ZOOM_LEVELS, tile_size: int = 256):
+        self.zoom_levels = tuple(sorted(zoom_levels))
+        self.tile_size = tile_size
+        self.ride_ids = set()
+        # True when rides have been added or removed since the heatmap was loaded or saved
+        self.has_unsaved_changes = False
+        self._pixel_ids = {zoom: np.empty(0, dtype=np.int64) for zoom in self.zoom_levels}
+        self._counts = {zoom: np.empty(0, dtype=np.uint32) for zoom in self.zoom_levels}
+
+    def __str__(self):
+        return f"RideHeatmap(n_rides={len(self.ride_ids)}, zoom_levels={self.zoom_levels})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __contains__(self, ride_id: int):
+        return ride_id in self.ride_ids
+
+    def add_ride(self, ride: StravaRide) -> None:
+        """
+        Adds a ride's GPS points to the heatmap.  Rides with no GPS data, or which were already added, are skipped
+        """
+        self.add_rides([ride])
+
+    def add_rides(self, rides) -> int:
+        """
+        Adds any rides from an iterable (a list of StravaRide objects or a RideHub) which are not already in the
+        heatmap.  All new points are merged into the stored bins in a single pass per zoom level.
+
+        Returns:
+        -----------
+            - The number of rides added
+        """
+        new_rides = [ride for ride in rides if ride.id not in self.ride_ids]
+        if not new_rides:
+            return 0
+
+        self._merge_latlng_array(np.concatenate([extract_latlng_array_from_metrics_dict(ride.metrics_dict)
+                                                 for ride in new_rides]), sign=1)
+        self.ride_ids.update(ride.id for ride in new_rides)
+        self.has_unsaved_changes = True
+        return len(new_rides)
+
+    def remove_ride(self, ride: StravaRide) -> None:
+        """
+        Subtracts a previously added ride's GPS points from the heatmap
+        """
+        if ride.id not in self.ride_ids:
+            return
+        self._merge_latlng_array(extract_latlng_array_from_metrics_dict(ride.metrics_dict), sign=-1)
+        self.ride_ids.discard(ride.id)
+        self.has_unsaved_changes = True
+
+    def reconcile(self, rides) -> int:
+        """
+        Brings the heatmap in line with an iterable of rides (usually the RideHub it was built from).  Rides which
+        are missing are added.  If the heatmap includes rides which are no longer there (e.g. deleted since it was
+        saved), their points can't be subtracted, since a saved heatmap only keeps the merged counts, so every zoom
+        level is rebuilt from `rides`.
+
+        Returns:
+        -----------
+            - The number of rides added or removed
+        """
+        rides = list(rides)
+        current_ride_ids = {ride.id for ride in rides}
+        stale_ride_ids = self.ride_ids - current_ride_ids
+        if not stale_ride_ids:
+            return self.add_rides(rides)
+
+        n_new_rides = len(current_ride_ids - self.ride_ids)
+        logger.info(f"{len(stale_ride_ids)} rides in the heatmap no longer exist.  Rebuilding it from {len(rides)} "
+                    f"rides")
+        self.ride_ids = set()
+        for zoom in self.zoom_levels:
+            self._pixel_ids[zoom] = np.empty(0, dtype=np.int64)
+            self._counts[zoom] = np.empty(0, dtype=np.uint32)
+        self.add_rides(rides)
+        self.has_unsaved_changes = True
+        return len(stale_ride_ids) + n_new_rides
+
+    # RideHub listener interface
+    def on_ride_added(self, ride: StravaRide) -> None:
+        self.add_ride(ride)
+
+    def on_ride_removed(self, ride: StravaRide) -> None:
+        self.remove_ride(ride)
+
+    def get_pixel_counts(self, zoom: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the pre-computed bins for a zoom level.
+
+        Returns:
+        -----------
+            - An (n, 2) array with the [latitude, longitude] of each non-empty pixel's center
+            - A length-n array of point counts for each pixel
+        """
+        if zoom not in self._pixel_ids:
+            raise ValueError(f"Zoom level {zoom} has not been computed.  Available zoom levels: {self.zoom_levels}")
+
+        world_size = self.tile_size * 2 ** zoom
+        pixel_ids = self._pixel_ids[zoom]
+        pixels = np.column_stack((pixel_ids % world_size, pixel_ids // world_size))
+        return convert_mercator_pixels_to_latlng_array(pixels, zoom, self.tile_size), self._counts[zoom]
+
+    def save(self, directory: str = DEFAULT_HEATMAP_DIRECTORY) -> None:
+        """
+        Writes one compressed `zoom_<zoom>.npz` file per zoom level, along with the list of ride IDs already included
+        """
+        os.makedirs(directory, exist_ok=True)
+        for zoom in self.zoom_levels:
+            np.savez_compressed(os.path.join(directory, f'zoom_{zoom}.npz'),
+                                pixel_ids=self._pixel_ids[zoom],
+                                counts=self._counts[zoom])
+        with open(os.path.join(directory, 'heatmap_index.json'), 'w') as file:
+            json.dump({'zoom_levels': list(self.zoom_levels),
+                       'tile_size': self.tile_size,
+                       'ride_ids': sorted(self.ride_ids)}, file)
+        self.has_unsaved_changes = False
+        logger.info(f"Saved heatmap covering {len(self.ride_ids)} rides to {directory}")
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_HEATMAP_DIRECTORY) -> 'RideHeatmap':
+        """
+        Loads a heatmap previously written by `save()`.  Returns an empty heatmap if nothing has been saved yet
+        """
+        index_path = os.path.join(directory, 'heatmap_index.json')
+        if not os.path.exists(index_path):
+            return cls()
+
+        with open(index_path, 'r') as file:
+            index = json.load(file)
+
+        heatmap = cls(zoom_levels=tuple(index['zoom_levels']), tile_size=index['tile_size'])
+        heatmap.ride_ids = set(index['ride_ids'])
+        for zoom in heatmap.zoom_levels:
+            with np.load(os.path.join(directory, f'zoom_{zoom}.npz')) as zoom_file:
+                heatmap._pixel_ids[zoom] = zoom_file['pixel_ids']
+                heatmap._counts[zoom] = zoom_file['counts']
+        return heatmap
+
+    # Internal use
+    def _merge_latlng_array(self, latlng_array: np.ndarray, sign: int) -> None:
+        if not len(latlng_array):
+            return
+
+        for zoom in self.zoom_levels:
+            world_size = self.tile_size * 2 ** zoom
+            pixels = convert_latlng_array_to_mercator_pixels(latlng_array, zoom, self.tile_size)
+            new_pixel_ids, new_counts = np.unique(pixels[:, 1] * world_size + pixels[:, 0], return_counts=True)
+
+            # Merge the new bins into the existing bins in one pass
+            merged_ids, inverse = np.unique(np.concatenate((self._pixel_ids[zoom], new_pixel_ids)),
+                                            return_inverse=True)
+            weights = np.concatenate((self._counts[zoom].astype(np.int64), sign * new_counts))
+            merged_counts = np.bincount(inverse, weights=weights, minlength=len(merged_ids)).astype(np.int64)
+
+            non_empty = merged_counts > 0
+            self._pixel_ids[zoom] = merged_ids[non_empty]
+            self._counts[zoom] = merged_counts[non_empty].astype(np.uint32)
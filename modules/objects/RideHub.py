@@ -1,5 +1,10 @@
 from typing import Union
+import numpy as np
 from modules.objects.Base import RideHubBase, validate_strava_ride
+from modules.objects.RideHubView import RideHubView
+from modules.objects.RideMetadataTable import DateLike, RideMetadataTable
+from modules.objects.RideSpatialIndex import RideSpatialIndex
+from modules.objects.RouteIndex import RouteIndex
 from modules.objects.StravaRide import StravaRide
 
 
@@ -17,12 +22,16 @@ class RideHub(RideHubBase):
 
         validate_strava_ride(ride_obj)
         self._ride_list.append(ride_obj)
+        self._notify_ride_added(ride_obj)
 
     def remove_ride(self, ride_to_remove):
         """
         Removes a ride from the internal ride list
         """
+        removed_rides = [ride for ride in self._ride_list if ride.id == ride_to_remove.id]
         self._ride_list = [ride_to_keep for ride_to_keep in self._ride_list if ride_to_keep.id != ride_to_remove.id]
+        for ride in removed_rides:
+            self._notify_ride_removed(ride)
 
     def remove_ride_by_id(self, ride_id_to_remove):
         """
@@ -31,7 +40,10 @@ class RideHub(RideHubBase):
         if ride_id_to_remove not in self.ride_ids:
             raise ValueError(f"Ride {ride_id_to_remove} is not in this RideHub object")
 
+        removed_rides = [ride for ride in self._ride_list if ride.id == ride_id_to_remove]
         self._ride_list = [ride_to_keep for ride_to_keep in self._ride_list if ride_to_keep.id != ride_id_to_remove]
+        for ride in removed_rides:
+            self._notify_ride_removed(ride)
 
     def create_json_output(self) -> list[dict]:
         """
@@ -47,3 +59,92 @@ class RideHub(RideHubBase):
         Returning None if the ride_id is not found rather than raising an error
         """
         return self.__getitem__(ride_id=ride_id) if ride_id in self.ride_ids else None
+
+    def query(self,
+              start: DateLike = None,
+              end: DateLike = None,
+              sport_type: Union[str, list[str]] = None,
+              trainer: bool = None,
+              min_tss: float = None,
+              near: tuple[float, float, float] = None) -> RideHubView:
+        """
+        Returns a read-only view of the rides matching every predicate which is not None, oldest first.
+        The view references this hub's rides rather than copying them, and a date-bounded query only looks at the
+        rides inside the range (see RideMetadataTable).
+
+        Parameters:
+        -----------
+            - start, end: datetime, date or ISO-8601 string
+                Half-open range of ride start dates (UTC): start <= start_date < end
+            - sport_type: str or list of str
+                e.g. 'Ride' or ['Ride', 'VirtualRide']
+            - trainer: bool
+                True for indoor rides only, False for outdoor rides only
+            - min_tss: float
+                Minimum training stress score
+            - near: (latitude, longitude, radius_meters)
+                Only rides whose GPS track passes within `radius_meters` of the point (see `spatial_index`)
+
+        Example:
+        --------
+            last_six_weeks = ride_hub.query(start=datetime.today() - timedelta(weeks=6))
+            outdoor_rides = ride_hub.query(trainer=False)
+            over_the_bridge = ride_hub.query(near=(51.5055, -0.0754, 100))
+        """
+        rides = self.metadata_table.select(start=start, end=end, sport_type=sport_type, trainer=trainer,
+                                           min_tss=min_tss)
+        if near is not None:
+            nearby_ride_ids = set(self.spatial_index.find_rides_near_point(*near))
+            rides = [ride for ride in rides if ride.id in nearby_ride_ids]
+        return RideHubView(rides)
+
+    def get_training_stress_scores(self, start: DateLike = None, end: DateLike = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the start dates and training stress scores of the rides in a date range, oldest first.
+        Scores are cached per ride, so after the first call this never touches the ride streams
+        """
+        return self.metadata_table.get_training_stress_scores(start=start, end=end)
+
+    @property
+    def metadata_table(self) -> RideMetadataTable:
+        """
+        The hub's columnar metadata table, created (and registered as a listener) the first time it is needed
+        """
+        if getattr(self, '_metadata_table', None) is None:
+            self._metadata_table = RideMetadataTable()
+            self.register_listener(self._metadata_table)
+        return self._metadata_table
+
+    @property
+    def spatial_index(self) -> RideSpatialIndex:
+        """
+        The hub's grid index over ride GPS tracks, created (and registered as a listener) the first time it is needed
+        """
+        if getattr(self, '_spatial_index', None) is None:
+            self._spatial_index = RideSpatialIndex()
+            self.register_listener(self._spatial_index)
+        return self._spatial_index
+
+    @property
+    def route_index(self) -> RouteIndex:
+        """
+        The hub's MinHash index over ride routes, created (and registered as a listener) the first time it is needed
+        """
+        if getattr(self, '_route_index', None) is None:
+            self._route_index = RouteIndex()
+            self.register_listener(self._route_index)
+        return self._route_index
+
+
+class IsolatedRideHub(RideHub):
+    """
+    A RideHub with its own ride list.
+
+    RideHubBase keeps rides in a list shared by every hub, so that the dashboards (which each load the saved rides)
+    all see rides added by the refresh button.  When several hubs must stay apart, e.g. one per athlete, each needs
+    its own list instead.
+    """
+
+    def __init__(self, *args):
+        self._ride_list = []
+        super().__init__(*args)
@@ -0,0 +1,22 @@
+from typing import Iterable
+from modules.objects.Base import RideHubBase
+from modules.objects.StravaRide import StravaRide
+
+
+class RideHubView(RideHubBase):
+    """
+    Read-only subset of a RideHub, returned by `RideHub.query()`.
+
+    A view holds references to the hub's own StravaRide objects, so creating one never copies metadata or streams.
+    It supports everything RideHubBase does (iteration, `len()`, `in`, indexing by ride ID, `ride_ids`), so it can be
+    passed anywhere a RideHub is only read from.  Rides added to or removed from the hub afterwards are not reflected;
+    run the query again instead.
+    """
+
+    def __init__(self, rides: Iterable[StravaRide]):
+        # Deliberately not calling RideHubBase.__init__, which appends to the ride list shared by every hub
+        self._ride_list = list(rides)
+        self._listeners = []
+
+    def __str__(self):
+        return f"RideHubView(n_rides={len(self._ride_list)})"
@@ -0,0 +1,180 @@
+from datetime import date, datetime, timezone
+from typing import Union
+import numpy as np
+from modules.objects.StravaRide import StravaRide
+
+DateLike = Union[datetime, date, str, np.datetime64]
+
+
+# Internal use
+def _convert_to_datetime64(value: DateLike) -> np.datetime64:
+    """
+    Converts a date, datetime, ISO-8601 string or numpy datetime64 into a naive UTC np.datetime64[s].
+    Strava start dates look like '2024-01-31T07:00:00Z'; numpy warns on the timezone suffix, so it is dropped
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, str):
+        value = value.rstrip('Z')
+    return np.datetime64(value, 's')
+
+
+def _calculate_ride_training_stress_score(ride: StravaRide) -> float:
+    """TSS for a single ride, calculated the same way as the summary dataframe.  NaN if it can't be calculated"""
+    # Imported here because power_functions imports RideHub, which imports this module
+    from modules.power_functions import calculate_normalized_power, calculate_training_stress_score
+
+    ftp, moving_time = ride.metadata.get('ftp'), ride.metadata.get('moving_time')
+    if not ftp or moving_time is None or not ride.metrics_dict.get('watts'):
+        return np.nan
+    normalized_power = calculate_normalized_power(ride)
+    return calculate_training_stress_score(moving_time, normalized_power, normalized_power / ftp, ftp)
+
+
+class RideMetadataTable:
+    """
+    Typed, columnar copy of the ride metadata used for filtering, sorted by start date.
+
+    Each ride contributes one row of scalar columns (`ride_id`, `start_date`, `sport_type`, `trainer`); streams are
+    never copied, and the table only keeps a reference to each StravaRide so that query results can be handed back
+    without materializing anything.  Date ranges are resolved with a binary search over the sorted `start_date`
+    column, and the other predicates are vectorized masks over just that slice.
+
+    Training stress scores need the power stream, so the `tss` column is filled in lazily: a ride's TSS is calculated
+    the first time a query needs it and cached until the ride is removed.
+
+    The table is kept in sync with a RideHub as a listener (`RideHub.query()` does this automatically):
+
+        metadata_table = RideMetadataTable()
+        ride_hub.register_listener(metadata_table)
+
+    Methods:
+
+        select(self, start=None, end=None, sport_type=None, trainer=None, min_tss=None) -> list[StravaRide]:
+            Returns the rides matching every given predicate, oldest first.
+
+        get_training_stress_scores(self, start=None, end=None) -> tuple[np.ndarray, np.ndarray]:
+            Returns the start dates and TSS of the rides in a date range, oldest first.
+    """
+
+    def __init__(self):
+        self._rides = {}
+        self._tss_cache = {}
+        self._columns = {}
+        self._sorted_rides = []
+        self._is_stale = True
+
+    def __str__(self):
+        return f"RideMetadataTable(n_rides={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self._rides)
+
+    def __contains__(self, ride_id: int):
+        return ride_id in self._rides
+
+    def on_ride_added(self, ride: StravaRide) -> None:
+        """RideHub listener hook"""
+        self._rides[ride.id] = ride
+        self._tss_cache.pop(ride.id, None)
+        self._is_stale = True
+
+    def on_ride_removed(self, ride: StravaRide) -> None:
+        """RideHub listener hook"""
+        self._rides.pop(ride.id, None)
+        self._tss_cache.pop(ride.id, None)
+        self._is_stale = True
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        """
+        The typed columns, sorted by start date: `ride_id` (int64), `start_date` (datetime64[s], UTC),
+        `sport_type` (str) and `trainer` (bool)
+        """
+        self._rebuild_if_stale()
+        return self._columns
+
+    def select(self,
+               start: DateLike = None,
+               end: DateLike = None,
+               sport_type: Union[str, list[str]] = None,
+               trainer: bool = None,
+               min_tss: float = None) -> list[StravaRide]:
+        """
+        Returns the rides matching every predicate which is not None, oldest first.
+
+        Parameters:
+        -----------
+            - start, end: datetime, date or ISO-8601 string
+                Half-open range of ride start dates (UTC): start <= start_date < end
+            - sport_type: str or list of str
+                e.g. 'Ride' or ['Ride', 'VirtualRide']
+            - trainer: bool
+                True for indoor rides only, False for outdoor rides only
+            - min_tss: float
+                Minimum training stress score.  TSS is only calculated for rides which pass every other predicate
+        """
+        positions = self._select_positions(start, end, sport_type, trainer)
+        if min_tss is not None:
+            positions = positions[self._get_tss_array(positions) >= min_tss]
+        return [self._sorted_rides[position] for position in positions]
+
+    def get_training_stress_scores(self, start: DateLike = None, end: DateLike = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the start dates (datetime64[s], UTC) and training stress scores of the rides in a date range, oldest
+        first.  Rides whose TSS can't be calculated (no power data or FTP) have a score of NaN
+        """
+        positions = self._select_positions(start, end)
+        return self._columns['start_date'][positions], self._get_tss_array(positions)
+
+    # Internal use
+    def _rebuild_if_stale(self) -> None:
+        if not self._is_stale:
+            return
+        rides = list(self._rides.values())
+        start_dates = np.array([_convert_to_datetime64(ride.metadata.get('start_date') or 'NaT') for ride in rides],
+                               dtype='datetime64[s]')
+        order = np.argsort(start_dates, kind='stable')
+        self._sorted_rides = [rides[idx] for idx in order]
+        self._columns = {'ride_id': np.array([ride.id for ride in self._sorted_rides], dtype=np.int64),
+                         'start_date': start_dates[order],
+                         'sport_type': np.array([ride.metadata.get('sport_type') or ride.metadata.get('type') or ''
+                                                 for ride in self._sorted_rides], dtype=str),
+                         'trainer': np.array([bool(ride.metadata.get('trainer')) for ride in self._sorted_rides],
+                                             dtype=bool)}
+        self._is_stale = False
+
+    def _select_positions(self,
+                          start: DateLike = None,
+                          end: DateLike = None,
+                          sport_type: Union[str, list[str]] = None,
+                          trainer: bool = None) -> np.ndarray:
+        """Row positions (into the sorted columns) matching the metadata predicates"""
+        self._rebuild_if_stale()
+        start_dates = self._columns['start_date']
+        # NaT sorts last, so rides with no start date are excluded from any date-bounded query
+        first = 0 if start is None else np.searchsorted(start_dates, _convert_to_datetime64(start), side='left')
+        last = len(start_dates) if end is None else np.searchsorted(start_dates, _convert_to_datetime64(end),
+                                                                     side='left')
+        positions = np.arange(first, max(first, last))
+
+        mask = np.ones(len(positions), dtype=bool)
+        if sport_type is not None:
+            sport_types = [sport_type] if isinstance(sport_type, str) else list(sport_type)
+            mask &= np.isin(self._columns['sport_type'][positions], sport_types)
+        if trainer is not None:
+            mask &= self._columns['trainer'][positions] == bool(trainer)
+        return positions[mask]
+
+    def _get_tss_array(self, positions: np.ndarray) -> np.ndarray:
+        """TSS for the rows at `positions`, calculating and caching any which haven't been needed before"""
+        tss = np.empty(len(positions), dtype=np.float64)
+        for idx, position in enumerate(positions):
+            ride = self._sorted_rides[position]
+            if ride.id not in self._tss_cache:
+                self._tss_cache[ride.id] = _calculate_ride_training_stress_score(ride)
+            tss[idx] = self._tss_cache[ride.id]
+        return tss
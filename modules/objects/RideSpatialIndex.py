@@ -0,0 +1,196 @@
+from collections import defaultdict
+import numpy as np
+from modules.geo_functions import METERS_PER_DEGREE_LATITUDE, calculate_haversine_distance_array, \
+    convert_latlng_array_to_grid_cells, downsample_latlng_array, extract_latlng_array_from_metrics_dict
+from modules.objects.StravaRide import StravaRide
+
+
+class RideSpatialIndex:
+    """
+    Grid-bucket spatial index over ride GPS tracks.
+
+    Each outdoor ride's `latlng` stream is thinned out to roughly one point every `point_spacing_meters`, and every
+    remaining point is bucketed into a regular latitude/longitude grid.  Start and end points are bucketed into their
+    own grids.  Queries only look at the handful of grid cells that overlap the search area, and then run an exact
+    distance check on the candidate rides, so lookups do not scale with the size of the ride history.
+
+    Every RideHub builds one on first use and keeps it in sync as a listener (see `RideHub.spatial_index`), which is
+    what `RideHub.query(near=...)` and `cli.py near` search:
+
+        ride_ids = ride_hub.spatial_index.find_rides_near_point(51.5055, -0.0754, radius_meters=100)
+
+    Methods:
+
+        add_ride(self, ride: StravaRide):
+            Indexes a single ride.  Rides with no GPS data are ignored.
+
+        remove_ride_by_id(self, ride_id: int):
+            Removes a single ride from the index.
+
+        find_rides_near_point(self, latitude: float, longitude: float, radius_meters: float):
+            Returns the IDs of rides whose track passes within `radius_meters` of a point.
+
+        find_rides_starting_in_box(self, min_latitude, min_longitude, max_latitude, max_longitude):
+            Returns the IDs of rides which start inside a bounding box.
+    """
+
+    def __init__(self, cell_size_degrees: float = 0.01, point_spacing_meters: float = 50):
+        self.cell_size_degrees = cell_size_degrees
+        self.point_spacing_meters = point_spacing_meters
+        self._track_cells = defaultdict(set)
+        self._start_cells = defaultdict(set)
+        self._end_cells = defaultdict(set)
+        self._track_points = {}
+        self._start_points = {}
+        self._end_points = {}
+
+    def __str__(self):
+        return f"RideSpatialIndex(n_rides={len(self)}, n_cells={len(self._track_cells)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self._track_points.keys() | self._start_points.keys())
+
+    def __contains__(self, ride_id: int):
+        return ride_id in self._track_points or ride_id in self._start_points
+
+    def add_ride(self, ride: StravaRide) -> None:
+        """
+        Adds a ride's downsampled track, start point and end point to the index.  Re-adding a ride replaces it.
+        """
+        if ride.id in self:
+            self.remove_ride_by_id(ride.id)
+
+        track = downsample_latlng_array(extract_latlng_array_from_metrics_dict(ride.metrics_dict),
+                                        min_spacing_meters=self.point_spacing_meters)
+        if len(track):
+            self._track_points[ride.id] = track
+            for cell in self._convert_to_unique_cells(track):
+                self._track_cells[cell].add(ride.id)
+
+        for key, cells, points in [('start_latlng', self._start_cells, self._start_points),
+                                   ('end_latlng', self._end_cells, self._end_points)]:
+            point = self._extract_endpoint(ride, key, track)
+            if point is None:
+                continue
+            points[ride.id] = point
+            cells[self._convert_to_unique_cells(point.reshape(1, 2))[0]].add(ride.id)
+
+    def remove_ride_by_id(self, ride_id: int) -> None:
+        """
+        Removes a ride from the index.  Removing a ride which was never indexed is a no-op
+        """
+        track = self._track_points.pop(ride_id, None)
+        if track is not None:
+            self._discard_from_cells(self._track_cells, self._convert_to_unique_cells(track), ride_id)
+
+        for cells, points in [(self._start_cells, self._start_points), (self._end_cells, self._end_points)]:
+            point = points.pop(ride_id, None)
+            if point is not None:
+                self._discard_from_cells(cells, self._convert_to_unique_cells(point.reshape(1, 2)), ride_id)
+
+    # RideHub listener interface
+    def on_ride_added(self, ride: StravaRide) -> None:
+        self.add_ride(ride)
+
+    def on_ride_removed(self, ride: StravaRide) -> None:
+        self.remove_ride_by_id(ride.id)
+
+    def find_rides_near_point(self, latitude: float, longitude: float, radius_meters: float) -> list[int]:
+        """
+        Returns the IDs of every ride whose (downsampled) track passes within `radius_meters` of a point.
+
+        Parameters:
+        -----------
+            - latitude: float
+            - longitude: float
+            - radius_meters: float
+                Search radius.  Because tracks are downsampled, distances are accurate to within roughly
+                `point_spacing_meters`
+
+        Returns:
+        -----------
+            - A sorted list of ride IDs
+        """
+        latitude_span = radius_meters / METERS_PER_DEGREE_LATITUDE
+        # Longitude degrees shrink towards the poles
+        longitude_span = latitude_span / max(np.cos(np.radians(latitude)), 1e-6)
+        candidate_ids = self._collect_candidate_ids(self._track_cells,
+                                                    latitude - latitude_span, longitude - longitude_span,
+                                                    latitude + latitude_span, longitude + longitude_span)
+
+        matches = []
+        for ride_id in candidate_ids:
+            track = self._track_points[ride_id]
+            distances = calculate_haversine_distance_array(track[:, 0], track[:, 1], latitude, longitude)
+            if distances.min() <= radius_meters:
+                matches.append(ride_id)
+        return sorted(matches)
+
+    def find_rides_starting_in_box(self,
+                                   min_latitude: float,
+                                   min_longitude: float,
+                                   max_latitude: float,
+                                   max_longitude: float) -> list[int]:
+        """Returns a sorted list of IDs for rides whose starting point falls inside the bounding box"""
+        return self._find_points_in_box(self._start_cells, self._start_points,
+                                        min_latitude, min_longitude, max_latitude, max_longitude)
+
+    def find_rides_ending_in_box(self,
+                                 min_latitude: float,
+                                 min_longitude: float,
+                                 max_latitude: float,
+                                 max_longitude: float) -> list[int]:
+        """Returns a sorted list of IDs for rides whose ending point falls inside the bounding box"""
+        return self._find_points_in_box(self._end_cells, self._end_points,
+                                        min_latitude, min_longitude, max_latitude, max_longitude)
+
+    # Internal use
+    def _convert_to_unique_cells(self, latlng_array: np.ndarray) -> list[tuple]:
+        cells = np.unique(convert_latlng_array_to_grid_cells(latlng_array, self.cell_size_degrees), axis=0)
+        return [tuple(cell) for cell in cells.tolist()]
+
+    @staticmethod
+    def _discard_from_cells(cell_dict: dict, cells: list[tuple], ride_id: int) -> None:
+        for cell in cells:
+            cell_dict[cell].discard(ride_id)
+            if not cell_dict[cell]:
+                del cell_dict[cell]
+
+    @staticmethod
+    def _extract_endpoint(ride: StravaRide, key: str, track: np.ndarray):
+        """Uses the ride metadata if available, falling back on the first/last point of the GPS track"""
+        point = ride.metadata.get(key)
+        if point and len(point) == 2 and None not in point:
+            return np.array(point, dtype=np.float64)
+        if len(track):
+            return track[0] if key == 'start_latlng' else track[-1]
+        return None
+
+    def _collect_candidate_ids(self, cell_dict: dict,
+                               min_latitude, min_longitude, max_latitude, max_longitude) -> set:
+        """Returns the union of ride IDs bucketed in every grid cell overlapping the bounding box"""
+        (min_row, min_col), (max_row, max_col) = convert_latlng_array_to_grid_cells(
+            np.array([[min_latitude, min_longitude], [max_latitude, max_longitude]]), self.cell_size_degrees).tolist()
+
+        candidate_ids = set()
+        # Very large boxes overlap more cells than are populated, so scan the populated cells instead
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(cell_dict):
+            for (row, col), ride_ids in cell_dict.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    candidate_ids.update(ride_ids)
+            return candidate_ids
+
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                candidate_ids.update(cell_dict.get((row, col), ()))
+        return candidate_ids
+
+    def _find_points_in_box(self, cell_dict, point_dict,
+                            min_latitude, min_longitude, max_latitude, max_longitude) -> list[int]:
+        candidate_ids = self._collect_candidate_ids(cell_dict, min_latitude, min_longitude, max_latitude, max_longitude)
+        return sorted(ride_id for ride_id in candidate_ids
+                      if min_latitude <= point_dict[ride_id][0] <= max_latitude
+                      and min_longitude <= point_dict[ride_id][1] <= max_longitude)
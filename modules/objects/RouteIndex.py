@@ -0,0 +1,202 @@
+from collections import defaultdict
+from typing import Union
+import numpy as np
+from modules.geo_functions import METERS_PER_DEGREE_LATITUDE, convert_latlng_array_to_grid_cells, decode_polyline, \
+    resample_latlng_array
+from modules.objects.StravaRide import StravaRide
+
+# Large odd constant used to pack (row, column) grid cells into a single uint64 token
+_CELL_PACKING_CONSTANT = np.uint64(0x9E3779B97F4A7C15)
+
+
+class RouteIndex:
+    """
+    Groups rides which follow the same route using MinHash signatures and locality-sensitive hashing (LSH).
+
+    Each ride's `map.summary_polyline` is decoded, re-sampled so there are no gaps between points, and converted into
+    the set of grid cells it passes through.  Two rides on the same route share most of their cells, so the Jaccard
+    similarity of their cell sets is high.  A MinHash signature estimates that similarity from a small, fixed number of
+    integers, and LSH banding over the signatures means finding candidate matches is a handful of dictionary lookups
+    rather than a comparison against every ride in the history.
+
+    Each RideHub keeps one in sync with its rides as `ride_hub.route_index`, registered as a listener:
+
+        route_index = RouteIndex()
+        ride_hub.register_listener(route_index)
+
+    Methods:
+
+        add_ride(self, ride: StravaRide):
+            Computes and indexes the route signature for a ride.  Rides without a polyline are ignored.
+
+        remove_ride_by_id(self, ride_id: int):
+            Removes a ride from the index.
+
+        find_rides_on_same_route(self, ride_id: int):
+            Returns the IDs of rides on the same route as a ride which is already indexed.
+
+        find_rides_on_polyline(self, polyline: str):
+            Returns the IDs of indexed rides which follow an arbitrary encoded polyline.
+
+        cluster_routes(self):
+            Groups every indexed ride into route clusters.
+    """
+
+    def __init__(self,
+                 num_hashes: int = 64,
+                 num_bands: int = 16,
+                 cell_size_degrees: float = 0.002,
+                 similarity_threshold: float = 0.5,
+                 seed: int = 42):
+        if num_hashes % num_bands:
+            raise ValueError(f"`num_hashes` ({num_hashes}) must be divisible by `num_bands` ({num_bands})")
+
+        self.num_hashes = num_hashes
+        self.num_bands = num_bands
+        self.cell_size_degrees = cell_size_degrees
+        self.similarity_threshold = similarity_threshold
+
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash functions need odd multipliers
+        self._hash_multipliers = rng.integers(1, 2 ** 63, size=num_hashes, dtype=np.uint64) | np.uint64(1)
+        self._hash_offsets = rng.integers(0, 2 ** 63, size=num_hashes, dtype=np.uint64)
+
+        self._signatures = {}
+        self._band_buckets = defaultdict(set)
+
+    def __str__(self):
+        return f"RouteIndex(n_rides={len(self._signatures)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, ride_id: int):
+        return ride_id in self._signatures
+
+    def add_ride(self, ride: StravaRide) -> None:
+        """
+        Adds a ride's route signature to the index.  Re-adding a ride replaces it.
+        """
+        polyline = (ride.metadata.get('map') or {}).get('summary_polyline')
+        signature = self.create_route_signature(polyline)
+        if signature is None:
+            return
+
+        if ride.id in self:
+            self.remove_ride_by_id(ride.id)
+        self._signatures[ride.id] = signature
+        for band_key in self._create_band_keys(signature):
+            self._band_buckets[band_key].add(ride.id)
+
+    def remove_ride_by_id(self, ride_id: int) -> None:
+        """
+        Removes a ride from the index.  Removing a ride which was never indexed is a no-op
+        """
+        signature = self._signatures.pop(ride_id, None)
+        if signature is None:
+            return
+        for band_key in self._create_band_keys(signature):
+            self._band_buckets[band_key].discard(ride_id)
+            if not self._band_buckets[band_key]:
+                del self._band_buckets[band_key]
+
+    # RideHub listener interface
+    def on_ride_added(self, ride: StravaRide) -> None:
+        self.add_ride(ride)
+
+    def on_ride_removed(self, ride: StravaRide) -> None:
+        self.remove_ride_by_id(ride.id)
+
+    def create_route_signature(self, polyline: str) -> Union[np.ndarray, None]:
+        """
+        Returns the MinHash signature (a uint64 array of length `num_hashes`) of the grid cells an encoded polyline
+        passes through.  Returns None if the polyline is empty
+        """
+        points = decode_polyline(polyline)
+        if not len(points):
+            return None
+
+        # Re-sample at half the cell size so that no cell along the path is skipped
+        spacing_meters = self.cell_size_degrees * METERS_PER_DEGREE_LATITUDE / 2
+        cells = convert_latlng_array_to_grid_cells(resample_latlng_array(points, spacing_meters),
+                                                   self.cell_size_degrees).astype(np.uint64)
+        tokens = np.unique(cells[:, 0] * _CELL_PACKING_CONSTANT + cells[:, 1])
+
+        # (num_hashes, n_tokens) matrix of hash values.  uint64 arithmetic wraps, which is what multiply-shift expects
+        hashed_tokens = self._hash_multipliers[:, None] * tokens[None, :] + self._hash_offsets[:, None]
+        return hashed_tokens.min(axis=1)
+
+    def estimate_similarity(self, ride_id_1: int, ride_id_2: int) -> float:
+        """Returns the estimated Jaccard similarity between the routes of two indexed rides"""
+        return float(np.mean(self._signatures[ride_id_1] == self._signatures[ride_id_2]))
+
+    def find_rides_on_same_route(self, ride_id: int) -> list[tuple[int, float]]:
+        """
+        Returns every other indexed ride on the same route as `ride_id`.
+
+        Returns:
+        -----------
+            - A list of (ride_id, estimated_similarity) tuples, most similar first
+        """
+        if ride_id not in self:
+            raise ValueError(f"Ride {ride_id} is not in this RouteIndex. It may not have a polyline")
+        return [match for match in self._find_matches(self._signatures[ride_id]) if match[0] != ride_id]
+
+    def find_rides_on_polyline(self, polyline: str) -> list[tuple[int, float]]:
+        """
+        Returns every indexed ride following the route described by an encoded polyline.
+
+        Returns:
+        -----------
+            - A list of (ride_id, estimated_similarity) tuples, most similar first
+        """
+        signature = self.create_route_signature(polyline)
+        return [] if signature is None else self._find_matches(signature)
+
+    def cluster_routes(self, min_cluster_size: int = 2) -> list[list[int]]:
+        """
+        Groups indexed rides into routes.  Rides are linked when their estimated similarity clears the
+        `similarity_threshold`, and clusters are the connected groups of linked rides.
+
+        Returns:
+        -----------
+            - A list of clusters (each a sorted list of ride IDs), largest first
+        """
+        parents = {ride_id: ride_id for ride_id in self._signatures}
+
+        def find_root(ride_id):
+            while parents[ride_id] != ride_id:
+                parents[ride_id] = parents[parents[ride_id]]
+                ride_id = parents[ride_id]
+            return ride_id
+
+        for ride_id, signature in self._signatures.items():
+            for match_id, _ in self._find_matches(signature):
+                parents[find_root(match_id)] = find_root(ride_id)
+
+        clusters = defaultdict(list)
+        for ride_id in self._signatures:
+            clusters[find_root(ride_id)].append(ride_id)
+        return sorted([sorted(cluster) for cluster in clusters.values() if len(cluster) >= min_cluster_size],
+                      key=len, reverse=True)
+
+    # Internal use
+    def _create_band_keys(self, signature: np.ndarray) -> list[tuple]:
+        rows_per_band = self.num_hashes // self.num_bands
+        return [(band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes())
+                for band in range(self.num_bands)]
+
+    def _find_matches(self, signature: np.ndarray) -> list[tuple[int, float]]:
+        candidate_ids = set()
+        for band_key in self._create_band_keys(signature):
+            candidate_ids.update(self._band_buckets.get(band_key, ()))
+
+        matches = []
+        for candidate_id in candidate_ids:
+            similarity = float(np.mean(self._signatures[candidate_id] == signature))
+            if similarity >= self.similarity_threshold:
+                matches.append((candidate_id, similarity))
+        return sorted(matches, key=lambda x: x[1], reverse=True)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict
 
 
@@ -11,6 +11,8 @@ class StravaRide:
     id: int
     metadata: Dict
     metrics_dict: Dict[str, list]
+    # Arrays derived from the streams (e.g. power_functions.get_power_series()), kept for reuse but never saved
+    stream_cache: Dict = field(default_factory=dict, init=False, repr=False, compare=False)
 
     def to_dict(self):
         """
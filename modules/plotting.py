@@ -1,17 +1,24 @@
-import json
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 from modules.data_functions import create_ride_summary_dataframe
+from modules.instrumentation import timed
 from modules.objects.RideHub import RideHub
+from modules.objects.RideHeatmap import RideHeatmap
 from modules.training_stress_balance_functions import calculate_ctl_and_atl_arrays, get_ctl_and_atl_dataframe
+from modules.universal_functions import downsample_lttb
 
 # import matplotlib.pyplot as plt
 # import seaborn as sns
 
-
-with open('data/saved_strava_rides.json', 'r') as f:
-    ride_hub = RideHub(*json.load(f))
+# Streams shown on the individual ride plot - (column, label, color)
+INDIVIDUAL_RIDE_STREAMS = [('watts', 'Power (W)', 'orange'),
+                           ('heartrate', 'Heart Rate (bpm)', 'red'),
+                           ('cadence', 'Cadence (rpm)', 'purple'),
+                           ('altitude', 'Altitude (m)', 'green'),
+                           ('velocity_smooth', 'Speed', 'blue')]
 
 # Global layout parameters
 GLOBAL_LAYOUT_KWARGS = {
@@ -41,9 +48,10 @@ GLOBAL_LAYOUT_KWARGS = {
 }
 
 
-def plot_tsb_ctl_atl():
-    """Produces a plot showing CTL, ATL, and TSB over the last 42 days"""
-    plot_df = get_ctl_and_atl_dataframe().head(43).sort_values('date', ascending=True)
+@timed('plotting.plot_tsb_ctl_atl')
+def plot_tsb_ctl_atl(rides: RideHub = None):
+    """Produces a plot showing CTL, ATL, and TSB over the last 42 days.  `rides` defaults to the full ride hub"""
+    plot_df = get_ctl_and_atl_dataframe(rides).head(43).sort_values('date', ascending=True)
     ctl, atl = plot_df.ctl.to_numpy(), plot_df.atl.to_numpy()
     tsb = [0]
     tsb.extend([ctl[idx - 1] - atl[idx - 1] for idx in range(1, len(ctl))])
@@ -111,19 +119,21 @@ def plot_tsb_ctl_atl():
 #     plt.annotate(text=f"20-minute average: {round(annotation_value)} watts", xy=(1400, annotation_value + 30), size=12)
 #     plt.show()
 
-def plot_weekly_tss():
+@timed('plotting.plot_weekly_tss')
+def plot_weekly_tss(rides: RideHub = None):
     """
     Generates a weekly Total Stress Score (TSS) plot.
 
     This function creates a bar chart representing the weekly Total Stress Score (TSS)
     by summarizing data from the ride summary dataframe. It also adds a smooth trend
     line to the plot, which is computed using a rolling mean over 3 weeks. The plot is
-    prepared using Plotly's Graph Objects library and customized with layout parameters.
+    prepared using Plotly's Graph Objects library and customized with layout parameters.  `rides` defaults to the
+    full ride hub.
 
     Returns:
         fig (plotly.graph_objs._figure.Figure): A Plotly figure object containing the bar chart with a trend line.
     """
-    temp_df = create_ride_summary_dataframe()
+    temp_df = create_ride_summary_dataframe(rides)
     temp_df['date_group'] = pd.to_datetime(temp_df.start_date) - pd.to_timedelta(7, unit='d')
     plot_df = temp_df.groupby([pd.Grouper(key='date_group', freq="W")]).tss.sum() \
         .reset_index().sort_values('date_group', ascending=False).copy()
@@ -152,3 +162,90 @@ def plot_weekly_tss():
     figure_kwargs.update(title_params)
     fig.update_layout(GLOBAL_LAYOUT_KWARGS)
     return fig
+
+
+@timed('plotting.plot_ride_heatmap')
+def plot_ride_heatmap(heatmap: RideHeatmap, zoom: int = 12):
+    """
+    Produces a map of every GPS point recorded across all outdoor rides.
+
+    The points are pre-binned by the RideHeatmap, so the figure only contains one (weighted) point per non-empty
+    Web-Mercator pixel at the requested zoom level, regardless of how many raw GPS points are in the ride history.
+    Counts are log-scaled so that frequently-ridden roads don't wash out everything else.
+    """
+    latlng_array, counts = heatmap.get_pixel_counts(zoom)
+    fig = go.Figure()
+    fig.add_trace(go.Densitymapbox(lat=latlng_array[:, 0],
+                                   lon=latlng_array[:, 1],
+                                   z=np.log1p(counts),
+                                   radius=4,
+                                   colorscale='Hot',
+                                   showscale=False,
+                                   hoverinfo='skip'))
+
+    title_params = {
+        "title":
+            {"text": f"Ride Heatmap | {len(heatmap.ride_ids)} rides",
+             "x": 0.5,
+             "font": {
+                 'size': 24,
+                 'color': 'black'}
+             }
+    }
+
+    figure_kwargs = GLOBAL_LAYOUT_KWARGS.copy()
+    figure_kwargs.update(title_params)
+    fig.update_layout(figure_kwargs)
+    fig.update_layout(mapbox={'style': 'carto-darkmatter',
+                              'center': {'lat': float(np.median(latlng_array[:, 0])) if len(counts) else 0,
+                                         'lon': float(np.median(latlng_array[:, 1])) if len(counts) else 0},
+                              'zoom': 10},
+                      margin={'l': 0, 'r': 0, 't': 60, 'b': 0})
+    return fig
+
+
+@timed('plotting.plot_individual_ride_streams')
+def plot_individual_ride_streams(metrics_df: pd.DataFrame,
+                                 time_range: tuple[int, int] = None,
+                                 max_points_per_trace: int = 1500):
+    """
+    Produces a stacked plot of the per-second streams (power, heart rate, cadence, altitude and speed) for one ride.
+
+    Each trace is downsampled with Largest-Triangle-Three-Buckets so that it never contains more than
+    `max_points_per_trace` points.  When a `time_range` is provided, only that window of the full-resolution data is
+    downsampled, so zooming in on a section of the ride brings back the detail that was dropped at full zoom.
+
+    Parameters:
+    -----------
+        - metrics_df: pd.DataFrame
+            The output of `create_individual_ride_metrics_dataframe()`
+        - time_range: tuple[int, int]
+            Optional (start_second, end_second) window to plot
+        - max_points_per_trace: int
+            The point budget for each trace
+    """
+    plot_df = metrics_df
+    if time_range is not None:
+        plot_df = metrics_df[metrics_df.time.between(*time_range)]
+
+    streams = [stream for stream in INDIVIDUAL_RIDE_STREAMS if stream[0] in plot_df.columns]
+    fig = make_subplots(rows=len(streams), cols=1, shared_xaxes=True, vertical_spacing=0.02,
+                        subplot_titles=[label for _, label, _ in streams])
+    time_array = plot_df.time.to_numpy()
+
+    for row, (column, label, color) in enumerate(streams, start=1):
+        values = plot_df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep = downsample_lttb(time_array, values, max_points_per_trace)
+        fig.add_trace(go.Scattergl(x=time_array[keep],
+                                   y=values[keep],
+                                   mode='lines',
+                                   name=label,
+                                   line={'width': 1, 'color': color},
+                                   showlegend=False,
+                                   hovertemplate=f'{label}: %{{y}}<br>Second: %{{x}}<extra></extra>'),
+                      row=row, col=1)
+
+    figure_kwargs = GLOBAL_LAYOUT_KWARGS.copy()
+    figure_kwargs.update({"height": 180 * len(streams)})
+    fig.update_layout(figure_kwargs)
+    return fig
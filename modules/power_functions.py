@@ -1,25 +1,48 @@
-from typing import Iterable
+from typing import Iterable, Union
 import numpy as np
 from global_variables import CURRENT_LACTATE_THRESHOLD
+from modules.instrumentation import timed
+from modules.objects.PowerSeries import PowerSeries, calculate_normalized_power_for_series
 from modules.objects.RideHub import RideHub
-from modules.universal_functions import create_moving_average_array
+from modules.objects.StravaRide import StravaRide
+from modules.quality_functions import QUALITY_FLAGS_STREAM, apply_stream_quality_screening, get_screened_stream
 
 
-def _convert_power_array_to_normalized_power_value(input_array: Iterable,
-                                                   window_size: int = 30) -> int:
+# Internal use
+def _get_clean_watts(metrics_dict: dict, moving_only: bool) -> np.ndarray:
+    """The screened watts stream (see `get_screened_stream()`), optionally only where metrics_dict['moving'] is True"""
+    watts = get_screened_stream(metrics_dict, 'watts')
+    moving = metrics_dict.get('moving')
+    if moving_only and moving is not None and len(moving) == len(watts):
+        return watts[np.asarray(moving, dtype=bool)]
+    return watts
+
+
+def get_power_series(ride: StravaRide, moving_only: bool = False) -> PowerSeries:
     """
-    Returns a normalized power value from an array of data from a power meter.
-    The default value for window size is 30, which is the widely accepted value
+    Returns the ride's cleaned watts stream and its prefix sum as a PowerSeries, building it the first time.
+
+    The series is kept in `ride.stream_cache` along with the streams it was built from, and rebuilt if any of them is
+    replaced (e.g. when the ride is screened again by `recompute`).  `moving_only` keeps only the samples where
+    metrics_dict['moving'] is True, as normalized power does
     """
-    power_averages = create_moving_average_array(input_array=input_array, window_size=window_size)
-    return round(np.mean(power_averages ** 4) ** 0.25)
+    metrics_dict = ride.metrics_dict
+    sources = tuple(metrics_dict.get(key) for key in ('watts', QUALITY_FLAGS_STREAM, 'moving'))
+    cached = ride.stream_cache.get(('watts', moving_only))
+    if cached is None or any(source is not cached_source for source, cached_source in zip(sources, cached[0])):
+        cached = (sources, PowerSeries(_get_clean_watts(metrics_dict, moving_only)))
+        ride.stream_cache[('watts', moving_only)] = cached
+    return cached[1]
 
 
+@timed('metrics.calculate_normalized_power')
 def calculate_normalized_power_from_metrics_dict(input_dict: dict) -> int:
     """
     Returns an integer representing the normalized power from a StravaRide.metrics_dict dictionary.
     This function filters the data in such a way that the metrics_dict['moving'] array == True, so non-moving
-    power measurements are ignored.
+    power measurements are ignored.  Samples flagged by stream quality screening are interpolated over first.
+
+    For a StravaRide, `calculate_normalized_power()` reuses the ride's cached PowerSeries instead.
 
     Params:
     -------
@@ -27,29 +50,52 @@ def calculate_normalized_power_from_metrics_dict(input_dict: dict) -> int:
 
     Returns:
     --------
-    An integer representing the normalized power for the ride associated with the user-provided metrics dictionary
+    An integer representing the normalized power for the ride associated with the user-provided metrics dictionary,
+    or NaN if it has fewer than 30 moving samples
     """
     # Guard clause (fail fast)
     if not isinstance(input_dict, dict):
         raise TypeError(f"Argument provided for the input_dict parameter must be a dictionary. {type(input_dict)}"
                         f"was passed")
 
-    # Grab the boolean array - [False, True,True..etc]
-    boolean_array = np.array(input_dict.get('moving'))
-    # Return the subset array
-    return _convert_power_array_to_normalized_power_value(np.array(input_dict.get('watts'))[boolean_array])
+    return PowerSeries(_get_clean_watts(input_dict, moving_only=True)).normalized_power()
 
 
-def identify_heart_rate_zone(heart_rate_value: int) -> int:
-    """Identifies heart rate zones based on the lactate threshold in the global variables file.
-    This method was researched and proposed by Andrew Coggan"""
-    if heart_rate_value > CURRENT_LACTATE_THRESHOLD:
+def calculate_normalized_power(ride: StravaRide) -> Union[int, float]:
+    """
+    Normalized power of a ride's moving samples, read from its cached PowerSeries.
+    NaN for rides with fewer than 30 moving samples
+    """
+    return get_power_series(ride, moving_only=True).normalized_power()
+
+
+def calculate_xpower(ride: StravaRide) -> Union[int, float]:
+    """xPower (normalized power with a 25-second EWMA in place of the 30-second rolling average) of a ride"""
+    return get_power_series(ride, moving_only=True).xpower()
+
+
+@timed('metrics.calculate_normalized_power_for_rides')
+def calculate_normalized_power_for_rides(rides: Iterable[StravaRide]) -> np.ndarray:
+    """
+    Normalized power of many rides in a single vectorized call over their cached PowerSeries.
+
+    Returns:
+    -----------
+        - A float array with one value per ride, in order.  NaN for rides with fewer than 30 moving samples
+    """
+    return calculate_normalized_power_for_series([get_power_series(ride, moving_only=True) for ride in rides])
+
+
+def identify_heart_rate_zone(heart_rate_value: int, lactate_threshold: int = CURRENT_LACTATE_THRESHOLD) -> int:
+    """Identifies heart rate zones based on a lactate threshold, which defaults to the one in the global variables
+    file.  This method was researched and proposed by Andrew Coggan"""
+    if heart_rate_value > lactate_threshold:
         return 5
-    if heart_rate_value >= round(CURRENT_LACTATE_THRESHOLD * 0.95, 0):
+    if heart_rate_value >= round(lactate_threshold * 0.95, 0):
         return 4
-    if heart_rate_value >= round(CURRENT_LACTATE_THRESHOLD * 0.89, 0):
+    if heart_rate_value >= round(lactate_threshold * 0.89, 0):
         return 3
-    if heart_rate_value >= round(CURRENT_LACTATE_THRESHOLD * 0.8, 0):
+    if heart_rate_value >= round(lactate_threshold * 0.8, 0):
         return 2
     return 1
 
@@ -63,6 +109,7 @@ def calculate_training_stress_score(total_seconds: int,
     return 100*((total_seconds * normalized_power * intensity_factor) / (ftp * 3600))
 
 
+@timed('metrics.create_power_curve')
 def create_individual_ride_power_curve_array(ride_hub: RideHub,
                                              ride_id: int) -> np.ndarray:
     """Returns an array representing an individual ride curve.
@@ -72,8 +119,50 @@ def create_individual_ride_power_curve_array(ride_hub: RideHub,
     For example, a value of 450 at index position 10 means that 450 watts was the maximum average power over a 10-second
     window throughout the ride.
 
-    These are calculated via sliding window algorithm
+    These are calculated from the ride's cached PowerSeries, over the watts stream with flagged samples (e.g. spikes)
+    interpolated over, so a single bad sample can't set the ride's short-duration bests
     """
+    return get_power_series(ride_hub[ride_id]).create_power_curve()
 
-    watts_array = ride_hub[ride_id].metrics_dict['watts']
-    return np.array([np.max(create_moving_average_array(watts_array, i)) for i in range(1, len(watts_array) + 1)])
\ No newline at end of file
+
+def recompute_ride_metrics(ride_hub: RideHub,
+                           power_curves: bool = False,
+                           ftp: int = None,
+                           since: str = None,
+                           screen_quality: bool = False) -> tuple[int, int]:
+    """
+    Re-derives the per-ride values stored alongside each ride's streams.
+
+    Parameters:
+    -----------
+        - ride_hub: RideHub
+        - power_curves: bool
+            Recompute every power curve.  Otherwise only missing power curves are calculated
+        - ftp: int
+            If provided, overwrites the FTP stored on each ride
+        - since: str
+            Only recompute rides which started on or after this date (YYYY-MM-DD)
+        - screen_quality: bool
+            Re-screen every ride's streams for sensor faults.  Otherwise only rides which have never been screened
+            are.  A ride's power curve is recomputed whenever it is screened, since the flags change its watts
+
+    Returns:
+    -----------
+        - The number of rides which were updated, and the number of rides considered
+    """
+    rides = [ride for ride in ride_hub if not since or ride.metadata.get('start_date', '')[:10] >= since]
+    updated_count = 0
+    for ride in rides:
+        updated = False
+        screened = screen_quality or QUALITY_FLAGS_STREAM not in ride.metrics_dict
+        if screened:
+            apply_stream_quality_screening(ride)
+            updated = True
+        if power_curves or screened or not ride.metrics_dict.get('power_curve'):
+            ride.metrics_dict['power_curve'] = list(create_individual_ride_power_curve_array(ride_hub, ride.id))
+            updated = True
+        if ftp is not None:
+            ride.metadata['ftp'] = ftp
+            updated = True
+        updated_count += updated
+    return updated_count, len(rides)
@@ -0,0 +1,195 @@
+import warnings
+from typing import Iterable
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+QUALITY_FLAGS_STREAM = 'quality_flags'
+# One bit per screened stream in the per-second `quality_flags` stream.  A set bit marks a bad sample
+QUALITY_FLAG_BITS = {'watts': 1, 'heartrate': 2, 'cadence': 4}
+# Metadata keys written by `apply_stream_quality_screening()`
+QUALITY_METADATA_KEYS = ('quality_score', 'quality_issues')
+
+# Per-stream screening settings:
+#   - valid_range: samples outside [min, max] are physically implausible and always flagged
+#   - zero_is_valid: zero watts/cadence is coasting, but a heart rate of zero is a strap dropout
+#   - spike_min_deviation: a spike must also be at least this far from the rolling median, so that noise on very
+#     steady efforts (tiny MAD) isn't flagged
+#   - max_spike_seconds: longer excursions are real efforts (e.g. a sprint), not sensor spikes
+#   - flatline_seconds: a sensor repeating exactly the same non-zero value for this long has frozen
+STREAM_QUALITY_SETTINGS = {'watts': {'valid_range': (0, 2500),
+                                     'zero_is_valid': True,
+                                     'spike_min_deviation': 300,
+                                     'max_spike_seconds': 3,
+                                     'flatline_seconds': 30},
+                           'heartrate': {'valid_range': (30, 230),
+                                         'zero_is_valid': False,
+                                         'spike_min_deviation': 25,
+                                         'max_spike_seconds': 3,
+                                         'flatline_seconds': 120},
+                           'cadence': {'valid_range': (0, 200),
+                                       'zero_is_valid': True,
+                                       'spike_min_deviation': 40,
+                                       'max_spike_seconds': 3,
+                                       'flatline_seconds': 90}}
+
+ROLLING_WINDOW_SECONDS = 31
+MAD_THRESHOLD = 6
+# Scales the median absolute deviation to the standard deviation of normally distributed data
+MAD_TO_STANDARD_DEVIATION = 1.4826
+
+
+# Internal use
+def _convert_stream_to_float_array(stream: Iterable) -> np.ndarray:
+    """Float array with missing (None) values as NaN, keeping every sample in place"""
+    array = np.asarray(stream)
+    if array.dtype == object:
+        array = np.where(array == None, np.nan, array)  # noqa: E711 - elementwise comparison
+    return array.astype(np.float64)
+
+
+def _find_runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) indices of every run of True values"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _keep_runs(mask: np.ndarray, min_length: int = 1, max_length: int = None) -> np.ndarray:
+    """Returns `mask` with only the runs of True values whose length is within [min_length, max_length]"""
+    starts, ends = _find_runs(mask)
+    lengths = ends - starts
+    keep = (lengths >= min_length) & (lengths <= (max_length if max_length is not None else len(mask)))
+    # Mark kept runs with +1/-1 at their edges, then a cumulative sum fills them in
+    markers = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.add.at(markers, starts[keep], 1)
+    np.add.at(markers, ends[keep], -1)
+    return np.cumsum(markers[:-1]) > 0
+
+
+def calculate_rolling_median_and_mad(array: np.ndarray,
+                                     window_size: int = ROLLING_WINDOW_SECONDS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Centered rolling median and median absolute deviation (MAD) of an array, computed for every sample at once over a
+    sliding-window view.  The ends are padded by repeating the first/last values, and NaN values are ignored.
+    """
+    half_window = window_size // 2
+    padded = np.pad(array, half_window, mode='edge')
+    windows = sliding_window_view(padded, window_size)
+    # Windows which are entirely dropouts or coasting are expected (NaN median and MAD), not worth a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        median = np.nanmedian(windows, axis=1)
+        mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+    return median, mad
+
+
+def detect_stream_issues(stream: Iterable, stream_name: str) -> dict[str, np.ndarray]:
+    """
+    Screens one stream for the three kinds of sensor fault which distort power and heart rate metrics.
+
+        - dropouts: missing samples, and values outside the stream's valid range (e.g. a heart rate of zero)
+        - spikes: samples more than MAD_THRESHOLD robust standard deviations (and at least `spike_min_deviation`)
+          from the rolling median, in excursions no longer than `max_spike_seconds`
+        - flatline: the same non-zero value repeated for at least `flatline_seconds`
+
+    Every check is vectorized over the whole stream.
+
+    Returns:
+    -----------
+        - {'dropouts': bool array, 'spikes': bool array, 'flatline': bool array}, one value per sample
+    """
+    settings = STREAM_QUALITY_SETTINGS[stream_name]
+    array = _convert_stream_to_float_array(stream)
+    minimum, maximum = settings['valid_range']
+
+    is_zero = array == 0
+    out_of_range = (array < minimum) | (array > maximum)
+    if settings['zero_is_valid']:
+        out_of_range &= ~is_zero
+    dropouts = np.isnan(array) | out_of_range
+
+    # Exclude dropouts (and coasting zeros, which would drag the median down) from the rolling statistics
+    screened = np.where(dropouts | (is_zero & settings['zero_is_valid']), np.nan, array)
+    if np.isnan(screened).all():
+        return {'dropouts': dropouts, 'spikes': np.zeros(len(array), dtype=bool),
+                'flatline': np.zeros(len(array), dtype=bool)}
+    median, mad = calculate_rolling_median_and_mad(screened)
+    deviation = np.abs(screened - median)
+    threshold = np.maximum(MAD_THRESHOLD * MAD_TO_STANDARD_DEVIATION * np.nan_to_num(mad),
+                           settings['spike_min_deviation'])
+    spikes = _keep_runs(np.nan_to_num(deviation) > threshold, max_length=settings['max_spike_seconds'])
+
+    repeated = np.concatenate(([False], np.diff(array) == 0)) & ~is_zero & ~dropouts
+    # A run of n repeated samples means n + 1 identical values, starting one sample earlier
+    flatline = _keep_runs(repeated, min_length=settings['flatline_seconds'] - 1)
+    flatline |= np.concatenate((flatline[1:], [False]))
+
+    return {'dropouts': dropouts, 'spikes': spikes & ~dropouts, 'flatline': flatline}
+
+
+def screen_metrics_dict(metrics_dict: dict) -> tuple[np.ndarray, dict]:
+    """
+    Screens every stream in QUALITY_FLAG_BITS which is present in a StravaRide.metrics_dict.
+
+    Returns:
+    -----------
+        - A uint8 array with one value per sample, where the bit for each stream (QUALITY_FLAG_BITS) is set on the
+          samples that stream should not be trusted for
+        - A report of the form {'quality_score': float, 'quality_issues': {stream: {issue: sample count}}}.  The
+          score is the fraction of screened samples which passed, from 0 to 1
+    """
+    n_samples = len(metrics_dict.get('time') or [])
+    flags = np.zeros(n_samples, dtype=np.uint8)
+    issues, n_checked, n_flagged = {}, 0, 0
+
+    for stream_name, bit in QUALITY_FLAG_BITS.items():
+        stream = metrics_dict.get(stream_name)
+        if stream is None or len(stream) != n_samples or not n_samples:
+            continue
+        stream_issues = detect_stream_issues(stream, stream_name)
+        is_bad = stream_issues['dropouts'] | stream_issues['spikes'] | stream_issues['flatline']
+        flags[is_bad] |= bit
+        issues[stream_name] = {issue: int(mask.sum()) for issue, mask in stream_issues.items()}
+        n_checked += n_samples
+        n_flagged += int(is_bad.sum())
+
+    quality_score = round(1 - n_flagged / n_checked, 4) if n_checked else None
+    return flags, {'quality_score': quality_score, 'quality_issues': issues}
+
+
+def apply_stream_quality_screening(ride) -> dict:
+    """
+    Screens a StravaRide once and stores the result alongside it: the per-sample flags as the `quality_flags` stream,
+    and the score and issue counts in its metadata.  The raw streams are left untouched; metrics read them through
+    `get_screened_stream()`, which honors the stored flags without screening again.
+
+    Returns:
+    -----------
+        - The quality report (see `screen_metrics_dict()`)
+    """
+    flags, report = screen_metrics_dict(ride.metrics_dict)
+    ride.metrics_dict[QUALITY_FLAGS_STREAM] = flags.tolist()
+    ride.metadata.update(report)
+    return report
+
+
+def get_screened_stream(metrics_dict: dict, stream_name: str) -> np.ndarray:
+    """
+    Returns a stream as a float array with every sample flagged in the ride's `quality_flags` stream replaced by
+    linear interpolation between the nearest good samples, so spikes and dropouts no longer distort averages.
+
+    Rides which haven't been screened (no `quality_flags` stream) are returned as-is, with missing values as zero
+    """
+    array = _convert_stream_to_float_array(metrics_dict.get(stream_name) or [])
+    flags = metrics_dict.get(QUALITY_FLAGS_STREAM)
+    bit = QUALITY_FLAG_BITS.get(stream_name)
+    if flags is None or bit is None or len(flags) != len(array):
+        return np.nan_to_num(array)
+
+    is_bad = (np.asarray(flags, dtype=np.uint8) & bit).astype(bool) | np.isnan(array)
+    if not is_bad.any():
+        return array
+    if is_bad.all():
+        return np.zeros(len(array))
+    good_indices = np.flatnonzero(~is_bad)
+    array[is_bad] = np.interp(np.flatnonzero(is_bad), good_indices, array[good_indices])
+    return array
@@ -0,0 +1,266 @@
+import json
+import os
+from contextlib import contextmanager
+from typing import Generator, Iterable
+from modules.create_logger import create_logger
+from modules.instrumentation import timed
+from modules.objects.RideHub import RideHub
+from modules.objects.StravaRide import StravaRide
+
+SAVED_RIDES_PATH = 'data/saved_strava_rides.json'
+DEFAULT_READ_CHUNK_SIZE = 1 << 20
+
+logger = create_logger('RideIOLogger', 'info')
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Internal use
+def _acquire_file_lock(lock_file) -> None:
+    """Blocks until this process holds the exclusive lock on `lock_file`"""
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ten seconds of retrying
+            continue
+
+
+def _release_file_lock(lock_file) -> None:
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _build_ride_hub(ride_dicts: Iterable[dict], ride_hub_class: type) -> RideHub:
+    """Adds ride dictionaries to a new hub one at a time, skipping duplicate IDs"""
+    ride_hub = ride_hub_class()
+    seen_ride_ids = set(ride_hub.ride_ids)
+    for ride_dict in ride_dicts:
+        if ride_dict['id'] in seen_ride_ids:
+            continue
+        seen_ride_ids.add(ride_dict['id'])
+        ride_hub.add_ride(StravaRide.from_dict(ride_dict))
+    return ride_hub
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in ' \t\n\r':
+        position += 1
+    return position
+
+
+def iter_rides_from_json_file(path: str = SAVED_RIDES_PATH,
+                              chunk_size: int = DEFAULT_READ_CHUNK_SIZE) -> Generator[dict, None, None]:
+    """
+    Incrementally parses a saved rides file (a JSON array of `StravaRide.to_dict()` dictionaries), yielding one ride
+    dictionary at a time.
+
+    The file is read in chunks and each array element is decoded as soon as it is complete, so only the ride being
+    parsed (plus one chunk) is held in memory at any time.  Peak memory is proportional to the largest single ride
+    rather than the size of the whole history, unlike `json.load()`.
+
+    Parameters:
+    -----------
+        - path: str
+            Path to the saved rides JSON file
+        - chunk_size: int
+            Number of characters to read at a time.  Doubled temporarily when a single ride is larger than a chunk
+
+    Returns:
+    -----------
+        - A generator of ride dictionaries with 'id', 'metadata' and 'metrics_dict' keys
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer, position, end_of_file = file.read(chunk_size), 0, False
+
+        position = _skip_whitespace(buffer, position)
+        if buffer[position:position + 1] != '[':
+            raise ValueError(f"{path} does not contain a JSON array of rides")
+        position += 1
+        read_size = chunk_size
+
+        while True:
+            position = _skip_whitespace(buffer, position)
+            if position < len(buffer) and buffer[position] == ',':
+                position = _skip_whitespace(buffer, position + 1)
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                ride_dict, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if end_of_file:
+                    raise ValueError(f"{path} ended before the JSON array was closed")
+                # Drop what has already been parsed, then read more.  Each failed attempt doubles the read size so
+                # that a ride much larger than `chunk_size` is not re-scanned over and over
+                next_chunk = file.read(read_size)
+                end_of_file = not next_chunk
+                buffer, position = buffer[position:] + next_chunk, 0
+                read_size *= 2
+                continue
+
+            read_size = chunk_size
+            yield ride_dict
+
+
+def get_rides_file_modified_time(path: str = SAVED_RIDES_PATH) -> float:
+    """The rides file's modification time, or 0.0 if it hasn't been written yet"""
+    return os.path.getmtime(path) if os.path.exists(path) else 0.0
+
+
+@contextmanager
+def lock_rides_file(path: str = SAVED_RIDES_PATH) -> Generator[None, None, None]:
+    """
+    Holds an exclusive lock on `<path>.lock` for the duration of the block.
+
+    Every writer of a rides file (the dashboard's refresh, `cli.py sync`/`recompute` and the webhook worker) reads,
+    changes and saves the file inside this lock, so writers in different processes or threads take turns instead of
+    one saving a stale hub over rides another has just written.  Readers don't need it, since files are replaced in
+    one step (see `write_rides_to_json_file()`).  The lock is not reentrant
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", 'a+') as lock_file:
+        _acquire_file_lock(lock_file)
+        try:
+            yield
+        finally:
+            _release_file_lock(lock_file)
+
+
+@timed('ingest.load_ride_hub')
+def load_ride_hub(path: str = SAVED_RIDES_PATH, ride_hub_class: type = RideHub) -> RideHub:
+    """
+    Builds a RideHub from a saved rides file, one ride at a time (see `iter_rides_from_json_file()`).
+    Rides with duplicate IDs are skipped, matching `RideHub(*rides)`
+    """
+    return _build_ride_hub(iter_rides_from_json_file(path), ride_hub_class)
+
+
+@timed('ingest.sync_ride_hub_with_file')
+def sync_ride_hub_with_json_file(ride_hub: RideHub, path: str = SAVED_RIDES_PATH) -> dict:
+    """
+    Brings an already-loaded RideHub up to date with a saved rides file which another process (e.g. the webhook
+    worker) has written since, streaming the file one ride at a time.  Rides are added, replaced (when either their
+    metadata or their streams differ) or removed through the hub, so its listeners stay in sync and the hub object
+    itself is kept.
+
+    Returns:
+    -----------
+        - {'added': int, 'updated': int, 'removed': int}
+    """
+    counts = {'added': 0, 'updated': 0, 'removed': 0}
+    seen_ride_ids = set()
+    for ride_dict in iter_rides_from_json_file(path):
+        ride_id = ride_dict['id']
+        if ride_id in seen_ride_ids:
+            continue
+        seen_ride_ids.add(ride_id)
+
+        existing_ride = ride_hub.get_ride(ride_id)
+        # Both parts are compared, since e.g. `cli.py recompute --power-curves` only rewrites the streams
+        if existing_ride is not None and existing_ride.metadata == ride_dict['metadata'] \
+                and existing_ride.metrics_dict == ride_dict['metrics_dict']:
+            continue
+        if existing_ride is not None:
+            ride_hub.remove_ride_by_id(ride_id)
+        ride_hub.add_ride(StravaRide.from_dict(ride_dict))
+        counts['updated' if existing_ride is not None else 'added'] += 1
+
+    for ride_id in set(ride_hub.ride_ids) - seen_ride_ids:
+        ride_hub.remove_ride_by_id(ride_id)
+        counts['removed'] += 1
+    return counts
+
+
+@timed('ingest.write_rides')
+def write_rides_to_json_file(rides: Iterable, path: str = SAVED_RIDES_PATH) -> int:
+    """
+    Writes rides (StravaRide objects or ride dictionaries) to a JSON array file, serializing one ride at a time.
+    The file is written to a temporary path and then moved into place, so a crash mid-write never leaves a truncated
+    history behind.
+
+    Returns:
+    -----------
+        - The number of rides written
+    """
+    temporary_path = f"{path}.tmp"
+    ride_count = 0
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for ride in rides:
+            file.write(', ' if ride_count else '')
+            file.write(json.dumps(ride.to_dict() if isinstance(ride, StravaRide) else ride))
+            ride_count += 1
+        file.write(']')
+    os.replace(temporary_path, path)
+    return ride_count
+
+
+def migrate_json_file_to_encoded_store(json_path: str, output_directory: str, compact: bool = True) -> int:
+    """
+    Streams a saved rides file into a directory of per-ride encoded stream files (see `modules.stream_codec`),
+    without ever holding more than one ride in memory.
+
+    Each ride produces `<id>.streams` (the encoded metrics_dict), and every ride's metadata is appended to
+    `metadata.jsonl`.  Read the store back with `iter_rides_from_encoded_store()` or
+    `load_ride_hub_from_encoded_store()`.
+
+    Returns:
+    -----------
+        - The number of rides migrated
+    """
+    from modules.stream_codec import encode_metrics_dict
+
+    os.makedirs(output_directory, exist_ok=True)
+    ride_count = 0
+    with open(os.path.join(output_directory, 'metadata.jsonl'), 'w', encoding='utf-8') as metadata_file:
+        for ride_dict in iter_rides_from_json_file(json_path):
+            with open(os.path.join(output_directory, f"{ride_dict['id']}.streams"), 'wb') as stream_file:
+                stream_file.write(encode_metrics_dict(ride_dict['metrics_dict'], compact=compact))
+            metadata_file.write(json.dumps({'id': ride_dict['id'], 'metadata': ride_dict['metadata']}) + '\n')
+            ride_count += 1
+
+    logger.info(f"Migrated {ride_count} rides from {json_path} to {output_directory}")
+    return ride_count
+
+
+def iter_rides_from_encoded_store(directory: str) -> Generator[dict, None, None]:
+    """
+    Reads back a directory written by `migrate_json_file_to_encoded_store()`, yielding one ride dictionary at a time
+    in the same form as `iter_rides_from_json_file()`.  Streams are decoded back into lists, with missing samples as
+    None and float streams at their stored precision (see `stream_codec.convert_typed_array_to_stream()`)
+    """
+    from modules.stream_codec import convert_typed_array_to_stream, decode_metrics_dict
+
+    with open(os.path.join(directory, 'metadata.jsonl'), 'r', encoding='utf-8') as metadata_file:
+        for line in metadata_file:
+            ride_dict = json.loads(line)
+            with open(os.path.join(directory, f"{ride_dict['id']}.streams"), 'rb') as stream_file:
+                arrays = decode_metrics_dict(stream_file.read())
+            ride_dict['metrics_dict'] = {stream_name: convert_typed_array_to_stream(stream_name, array)
+                                         for stream_name, array in arrays.items()}
+            yield ride_dict
+
+
+@timed('ingest.load_ride_hub_from_encoded_store')
+def load_ride_hub_from_encoded_store(directory: str, ride_hub_class: type = RideHub) -> RideHub:
+    """Builds a RideHub from a directory written by `migrate_json_file_to_encoded_store()`, one ride at a time"""
+    return _build_ride_hub(iter_rides_from_encoded_store(directory), ride_hub_class)
@@ -0,0 +1,288 @@
+import json
+import struct
+import sys
+import zlib
+from typing import Iterable
+import numpy as np
+
+# Smallest dtype that comfortably holds each Strava stream.  Integer streams are promoted automatically if a ride
+# contains a value which does not fit (e.g. a power spike above 65,535 watts).  Coordinates stay float64 because
+# float32's ~7 significant digits cannot hold a latitude to the 6 decimal places Strava reports
+STREAM_DTYPES = {'time': np.uint32,
+                 'watts': np.uint16,
+                 'heartrate': np.uint8,
+                 'cadence': np.uint8,
+                 'temp': np.int8,
+                 'moving': np.bool_,
+                 'distance': np.float32,
+                 'altitude': np.float32,
+                 'velocity_smooth': np.float32,
+                 'grade_smooth': np.float32,
+                 'latlng': np.float64,
+                 'power_curve': np.float32,
+                 'quality_flags': np.uint8}
+
+# Float streams are quantized to the precision Strava reports them at before delta encoding
+STREAM_QUANTIZATION_SCALES = {'distance': 10,
+                              'altitude': 10,
+                              'velocity_smooth': 1000,
+                              'grade_smooth': 10,
+                              'latlng': 1_000_000,
+                              'power_curve': 100}
+
+_INTEGER_PROMOTIONS = [np.uint8, np.uint16, np.uint32, np.int64]
+_SIGNED_INTEGER_PROMOTIONS = [np.int8, np.int16, np.int32, np.int64]
+_HEADER_LENGTH_FORMAT = '<I'
+_PAYLOAD_ALIGNMENT = 8
+
+
+# Internal use
+def _choose_integer_dtype(array: np.ndarray, preferred_dtype) -> np.dtype:
+    """Returns the preferred dtype if every value fits, otherwise the next-widest integer dtype which does"""
+    if not len(array):
+        return np.dtype(preferred_dtype)
+    promotions = _SIGNED_INTEGER_PROMOTIONS if array.min() < 0 else _INTEGER_PROMOTIONS
+    minimum_size = np.dtype(preferred_dtype).itemsize
+    for dtype in promotions:
+        info = np.iinfo(dtype)
+        if np.dtype(dtype).itemsize >= minimum_size and info.min <= array.min() and array.max() <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode_zigzag(array: np.ndarray) -> np.ndarray:
+    """Maps signed integers onto unsigned integers so small negative deltas stay small: 0, -1, 1, -2 -> 0, 1, 2, 3"""
+    array = array.astype(np.int64)
+    return ((array << 1) ^ (array >> 63)).astype(np.uint64)
+
+
+def _decode_zigzag(array: np.ndarray) -> np.ndarray:
+    array = array.astype(np.uint64)
+    return (array >> np.uint64(1)).astype(np.int64) ^ -(array & np.uint64(1)).astype(np.int64)
+
+
+def _encode_varint_array(array: np.ndarray) -> bytes:
+    """
+    Encodes unsigned integers as LEB128 varints (7 bits per byte, high bit set on every byte except the last).
+    Every value is split into its 7-bit groups at once, and only the groups which are needed are kept.
+    """
+    values = np.asarray(array, dtype=np.uint64)
+    if not len(values):
+        return b''
+
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = ((values[:, None] >> shifts[None, :]) & np.uint64(0x7f)).astype(np.uint8)
+    byte_counts = 1 + np.count_nonzero((values[:, None] >> shifts[None, 1:]) > 0, axis=1)
+    needed = np.arange(10)[None, :] < byte_counts[:, None]
+    continuation = np.arange(10)[None, :] < (byte_counts - 1)[:, None]
+    return (groups | (continuation.astype(np.uint8) << 7))[needed].tobytes()
+
+
+def _decode_varint_array(buffer: bytes) -> np.ndarray:
+    """Inverse of `_encode_varint_array()`"""
+    chunks = np.frombuffer(buffer, dtype=np.uint8)
+    if not len(chunks):
+        return np.empty(0, dtype=np.uint64)
+
+    is_last_chunk = (chunks & 0x80) == 0
+    value_ids = np.concatenate(([0], np.cumsum(is_last_chunk)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], value_ids[1:] != value_ids[:-1])))
+    chunk_positions = (np.arange(len(chunks)) - value_starts[value_ids]).astype(np.uint64)
+    return np.add.reduceat((chunks & 0x7f).astype(np.uint64) << (np.uint64(7) * chunk_positions), value_starts)
+
+
+def _estimate_python_object_bytes(value) -> int:
+    """Rough in-memory size of a (possibly nested) list of Python scalars"""
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(_estimate_python_object_bytes(i) for i in value)
+    return sys.getsizeof(value)
+
+
+def convert_stream_to_float_array(stream: Iterable) -> np.ndarray:
+    """
+    Converts a metrics_dict stream into a float64 array with every missing value as NaN, keeping each sample in
+    place.  A `latlng` point which is missing altogether (None rather than [lat, lng]) becomes a row of NaNs
+    """
+    try:
+        return np.asarray(stream, dtype=np.float64)
+    except (TypeError, ValueError):
+        # A None in place of a [lat, lng] pair makes the stream ragged
+        width = next(len(value) for value in stream if value is not None)
+        return np.array([[np.nan] * width if value is None else value for value in stream], dtype=np.float64)
+
+
+def convert_stream_to_typed_array(stream_name: str, stream: Iterable) -> np.ndarray:
+    """
+    Converts a single metrics_dict stream (a list of Python values) into a NumPy array with the dtype in
+    `STREAM_DTYPES`.  Streams without a known dtype are stored as float64.
+
+    Missing (None) samples are not zero - a power dropout is not coasting - so if any are missing the result is a
+    `np.ma.MaskedArray` with those samples masked (whole rows for `latlng`).  The masked values are stored as zero.
+    """
+    preferred_dtype = STREAM_DTYPES.get(stream_name, np.float64)
+    array = convert_stream_to_float_array(stream)
+    missing = np.isnan(array)
+    if array.ndim > 1:
+        missing = np.repeat(missing.any(axis=1, keepdims=True), array.shape[1], axis=1)
+    array = np.where(missing, 0.0, array)
+
+    if np.issubdtype(preferred_dtype, np.integer):
+        array = np.round(array).astype(_choose_integer_dtype(array, preferred_dtype))
+    else:
+        array = array.astype(preferred_dtype)
+    return np.ma.MaskedArray(array, mask=missing) if missing.any() else array
+
+
+def convert_metrics_dict_to_typed_arrays(metrics_dict: dict) -> dict[str, np.ndarray]:
+    """
+    Returns a copy of a StravaRide.metrics_dict where every stream is a compactly typed NumPy array
+    (uint16 power, uint8 heart rate and cadence, float32 distances, etc.)
+    """
+    return {stream_name: convert_stream_to_typed_array(stream_name, stream)
+            for stream_name, stream in metrics_dict.items()}
+
+
+def encode_metrics_dict(metrics_dict: dict, compact: bool = True) -> bytes:
+    """
+    Encodes a StravaRide.metrics_dict into a single binary blob.
+
+    The blob is a small JSON header describing each stream, followed by each stream's payload:
+        - compact=True (the cold-storage format): numeric streams are quantized, delta encoded, zigzag encoded,
+          written as varints and then zlib compressed.  Boolean streams are bit-packed.
+        - compact=False (the hot format): each stream's typed array is written as-is, so `decode_metrics_dict()` can
+          wrap the bytes in NumPy arrays without copying them.
+    Streams with missing samples also get a bit-packed mask of them, so they decode as missing rather than zero.
+
+    Parameters:
+    -----------
+        - metrics_dict: dict
+            A dictionary from a StravaRide.metrics_dict
+        - compact: bool
+            Whether to use the compressed cold-storage codec
+
+    Returns:
+    -----------
+        - The encoded bytes
+    """
+    header, payloads, offset = [], [], 0
+    for stream_name, array in convert_metrics_dict_to_typed_arrays(metrics_dict).items():
+        entry = {'name': stream_name, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        missing = None
+        if np.ma.isMaskedArray(array):
+            # One bit per sample, appended after the stream's own payload
+            missing = np.packbits(np.ma.getmaskarray(array).reshape(len(array), -1).any(axis=1)).tobytes()
+            array = np.ma.getdata(array)
+
+        if not compact:
+            entry['codec'] = 'raw'
+            payload = array.tobytes()
+        elif array.dtype == np.bool_:
+            entry['codec'] = 'bitpacked'
+            payload = np.packbits(array.ravel()).tobytes()
+        else:
+            scale = STREAM_QUANTIZATION_SCALES.get(stream_name, 1)
+            quantized = np.round(array.astype(np.float64) * scale).astype(np.int64)
+            # 2D streams (latlng) are delta encoded along each column
+            deltas = np.diff(quantized, axis=0, prepend=np.zeros((1,) + quantized.shape[1:], dtype=np.int64))
+            entry.update({'codec': 'delta_zigzag_varint', 'scale': scale})
+            payload = zlib.compress(_encode_varint_array(_encode_zigzag(deltas.ravel())), 6)
+
+        # Pad so that every raw payload starts on an aligned boundary
+        padding = -offset % _PAYLOAD_ALIGNMENT
+        payloads.append(b'\x00' * padding + payload)
+        entry.update({'offset': offset + padding, 'length': len(payload)})
+        offset += padding + len(payload)
+        if missing is not None:
+            payloads.append(missing)
+            entry.update({'missing_offset': offset, 'missing_length': len(missing)})
+            offset += len(missing)
+        header.append(entry)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(header_bytes) + struct.calcsize(_HEADER_LENGTH_FORMAT)) % _PAYLOAD_ALIGNMENT)
+    return struct.pack(_HEADER_LENGTH_FORMAT, len(header_bytes)) + header_bytes + b''.join(payloads)
+
+
+def decode_metrics_dict(buffer: bytes) -> dict[str, np.ndarray]:
+    """
+    Decodes a blob written by `encode_metrics_dict()` into a dictionary of typed NumPy arrays.
+
+    Streams written with the raw (hot) codec are returned as read-only views over `buffer` - no data is copied, so
+    decoding from a memory-mapped file only touches the pages that are actually read.  Streams which had missing
+    samples are returned as `np.ma.MaskedArray`s, as from `convert_stream_to_typed_array()`.
+    """
+    buffer = memoryview(buffer)
+    header_length = struct.unpack_from(_HEADER_LENGTH_FORMAT, buffer)[0]
+    payload_start = struct.calcsize(_HEADER_LENGTH_FORMAT) + header_length
+    header = json.loads(bytes(buffer[struct.calcsize(_HEADER_LENGTH_FORMAT):payload_start]))
+
+    output = {}
+    for entry in header:
+        dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+        start = payload_start + entry['offset']
+        payload = buffer[start:start + entry['length']]
+
+        if entry['codec'] == 'raw':
+            output[entry['name']] = np.frombuffer(payload, dtype=dtype).reshape(shape)
+        elif entry['codec'] == 'bitpacked':
+            output[entry['name']] = np.unpackbits(np.frombuffer(payload, dtype=np.uint8),
+                                                  count=int(np.prod(shape))).astype(np.bool_).reshape(shape)
+        elif entry['codec'] == 'delta_zigzag_varint':
+            deltas = _decode_zigzag(_decode_varint_array(zlib.decompress(payload))).reshape(shape)
+            output[entry['name']] = (np.cumsum(deltas, axis=0) / entry['scale']).astype(dtype)
+        else:
+            raise ValueError(f"Unknown codec {entry['codec']} for stream {entry['name']}")
+
+        if 'missing_offset' in entry:
+            start = payload_start + entry['missing_offset']
+            missing = np.unpackbits(np.frombuffer(buffer[start:start + entry['missing_length']], dtype=np.uint8),
+                                    count=shape[0]).astype(np.bool_)
+            mask = np.broadcast_to(missing.reshape((-1,) + (1,) * (len(shape) - 1)), shape)
+            output[entry['name']] = np.ma.MaskedArray(output[entry['name']], mask=mask)
+
+    return output
+
+
+def convert_typed_array_to_stream(stream_name: str, array: np.ndarray) -> list:
+    """
+    Inverse of `convert_stream_to_typed_array()`: a list of Python values, with masked samples as None.
+    Float streams are rounded to the precision in `STREAM_QUANTIZATION_SCALES`, so both layouts give back the values
+    the compact layout quantizes to
+    """
+    missing = np.ma.getmaskarray(array).reshape(len(array), -1).any(axis=1) if len(array) else np.zeros(0, bool)
+    values = np.ma.getdata(array)
+    if np.issubdtype(values.dtype, np.floating):
+        scale = STREAM_QUANTIZATION_SCALES.get(stream_name)
+        values = values.astype(np.float64)
+        if scale is not None:
+            values = np.round(values, int(np.ceil(np.log10(scale))))
+    stream = values.tolist()
+    for idx in np.flatnonzero(missing):
+        stream[idx] = None
+    return stream
+
+
+def create_stream_encoding_report(rides: Iterable) -> list[dict]:
+    """
+    Measures the storage cost of each ride's metrics_dict before and after encoding.
+
+    Parameters:
+    -----------
+        - rides: Iterable
+            An iterable of StravaRide objects (e.g. a RideHub)
+
+    Returns:
+    -----------
+        - A list of dictionaries, one per ride, with the sample count and the bytes used as Python objects in memory,
+          as JSON on disk, as typed NumPy arrays (hot) and with the compact codec (cold)
+    """
+    report = []
+    for ride in rides:
+        typed_arrays = convert_metrics_dict_to_typed_arrays(ride.metrics_dict)
+        report.append({'id': ride.id,
+                       'n_samples': len(ride.metrics_dict.get('time', [])),
+                       'python_object_bytes': _estimate_python_object_bytes(list(ride.metrics_dict.values())),
+                       'json_bytes': len(json.dumps(ride.metrics_dict).encode('utf-8')),
+                       'typed_array_bytes': sum(array.nbytes for array in typed_arrays.values()),
+                       'compact_bytes': len(encode_metrics_dict(ride.metrics_dict, compact=True))})
+    return report
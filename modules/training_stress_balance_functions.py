@@ -2,11 +2,13 @@ from datetime import datetime, timedelta
 from typing import Union
 import numpy as np
 import pandas as pd
-from modules.data_functions import create_ride_summary_dataframe
-
-# Alpha values for CTL and ATL (acute and chronic training loads)
-ALPHA_CTL = 2 / (42 + 1)
-ALPHA_ATL = 2 / (7 + 1)
+from modules.athlete_functions import resolve_ride_hub
+# The forecast needs no DataFrames, so it lives in forecast_functions and keeps the CLI free of pandas
+from modules.forecast_functions import ALPHA_ATL, ALPHA_CTL, calculate_max_weekly_ctl_ramp, \
+    create_ewma_projection_matrix, create_taper_plan_matrix, find_plan_for_target_tsb, get_fitness_checkpoint, \
+    project_ctl_atl_tsb
+from modules.instrumentation import timed
+from modules.objects.RideHub import RideHub
 
 
 def calculate_ewma(array: Union[list, np.ndarray], alpha: float) -> np.ndarray:
@@ -28,30 +30,34 @@ def calculate_ewma(array: Union[list, np.ndarray], alpha: float) -> np.ndarray:
     return np.array(output)
 
 
-def get_daily_tss_score_dataframe() -> pd.DataFrame:
+@timed('dataframe.get_daily_tss_score')
+def get_daily_tss_score_dataframe(rides: RideHub = None) -> pd.DataFrame:
     """
         Returns a DataFrame containing the daily Training Stress Score (TSS) for the past 42 days plus the current
         day for a total of 43 days.
 
         Values dates with no training are filled in with a value of zero.
 
+        Reads the ride hub's cached TSS column rather than building the full ride summary DataFrame, so only the
+        first call after a ride is added has to look at its power stream.  `rides` defaults to the full ride hub.
+
         Returns:
             pd.DataFrame: A DataFrame with columns 'date' and daily TSS score for the past 42 days.
     """
-    summary_df = create_ride_summary_dataframe()
+    rides = resolve_ride_hub(rides)
+    start_dates, tss_values = rides.get_training_stress_scores()
 
-    filtered_df = summary_df[['start_date', 'tss']].set_index('start_date')
-    filtered_df.index = pd.to_datetime(filtered_df.index)
-    filtered_df = filtered_df.groupby(filtered_df.index.date).tss.sum()
+    filtered_df = pd.Series(tss_values, index=pd.DatetimeIndex(start_dates), name='tss')
+    filtered_df = filtered_df.groupby(filtered_df.index.date).sum()
     date_range = pd.date_range(filtered_df.index.min(), datetime.today())
     return filtered_df.reindex(date_range, fill_value=0).rename_axis('date').reset_index()
 
 
-def get_daily_tss_score_array() -> np.ndarray:
+def get_daily_tss_score_array(rides: RideHub = None) -> np.ndarray:
     """This function computes the daily TSS (training stress score) for the last 43 days.
     Days with no training are filled in with a value of zero.
     """
-    return get_daily_tss_score_dataframe().tss.to_numpy()
+    return get_daily_tss_score_dataframe(rides).tss.to_numpy()
 
 
 def calculate_ctl_and_atl_arrays(tss_values):
@@ -85,7 +91,8 @@ def calculate_ctl_and_atl_arrays(tss_values):
     return ctl_values, atl_values
 
 
-def get_ctl_and_atl_dataframe() -> pd.DataFrame:
+@timed('dataframe.get_ctl_and_atl')
+def get_ctl_and_atl_dataframe(rides: RideHub = None) -> pd.DataFrame:
     """
     Fetches and processes a DataFrame containing daily TSS (Training Stress Score) values.
 
@@ -98,6 +105,6 @@ def get_ctl_and_atl_dataframe() -> pd.DataFrame:
     Returns:
         pd.DataFrame: A DataFrame containing the original TSS scores along with the computed CTL and ATL values, sorted by date in descending order.
     """
-    tss_df = get_daily_tss_score_dataframe()
+    tss_df = get_daily_tss_score_dataframe(rides)
     tss_df['ctl'],tss_df['atl'] = calculate_ctl_and_atl_arrays(tss_df.tss.to_numpy())
     return tss_df.sort_values('date',ascending=False)
@@ -2,18 +2,23 @@ import numpy as np
 from typing import Iterable, Generator
 
 
-def _remove_None_objects_and_coerce_nan_values_to_zero(input_array: np.ndarray) -> np.ndarray:
-    """Removes None values and coerces all np.NaN values to zero."""
-    filtered_array = np.array([x for x in input_array if x is not None], dtype=np.float64)
+def _remove_None_objects_and_coerce_nan_values_to_zero(input_array: Iterable) -> np.ndarray:
+    """
+    Removes None values and coerces all np.NaN values to zero.
+    Float arrays without NaN values are returned as-is, without a copy
+    """
+    array = np.asarray(input_array)
+    if array.dtype == object:
+        array = np.array([x for x in array if x is not None], dtype=np.float64)
+    array = array.astype(np.float64, copy=False)
     # Coerce np.NaN to zero
-    return np.nan_to_num(filtered_array)
+    return np.nan_to_num(array) if np.isnan(array).any() else array
 
 
 def _generate_sliding_window_segments_from_an_array(input_array: Iterable,
                                                     window_size: int = 30) -> Generator:
     """Creates a Python generator to yield sliding window segments from an array."""
-    array = np.array(input_array, dtype=np.float64)
-    array = _remove_None_objects_and_coerce_nan_values_to_zero(array)
+    array = _remove_None_objects_and_coerce_nan_values_to_zero(input_array)
 
     # Fail fast
     if len(array) < window_size:
@@ -30,12 +35,68 @@ def _generate_sliding_window_segments_from_an_array(input_array: Iterable,
 
 def create_moving_average_array(input_array: Iterable,
                                 window_size: int = 30) -> np.ndarray:
-    """Creates a moving average from an array of size `window_size`."""
-    array = np.array(input_array, dtype=np.float64)
-    array = _remove_None_objects_and_coerce_nan_values_to_zero(array)
+    """
+    Creates a moving average from an array of size `window_size`.
+    Every window's average is a difference of two prefix sums, so this is O(n) whatever the window size.  When
+    averaging one stream repeatedly, use `modules.objects.PowerSeries`, which keeps the prefix sum
+    """
+    array = _remove_None_objects_and_coerce_nan_values_to_zero(input_array)
 
     if len(array) < window_size:
         return np.array([])
 
-    kernel = np.ones(window_size) / window_size
-    return np.convolve(array, kernel, mode='valid')
+    cumulative_sum = np.concatenate(([0.0], np.cumsum(array)))
+    return (cumulative_sum[window_size:] - cumulative_sum[:-window_size]) / window_size
+
+
+def downsample_lttb(x_array: Iterable, y_array: Iterable, max_points: int) -> np.ndarray:
+    """
+    Selects the indices of at most `max_points` points which preserve the visual shape of a series, using the
+    Largest-Triangle-Three-Buckets (LTTB) algorithm.
+
+    The first and last points are always kept.  The remaining points are split into `max_points - 2` equally sized
+    buckets, and from each bucket the point forming the largest triangle with the previously selected point and the
+    average of the next bucket is kept.  Bucket boundaries and averages are computed up front with NumPy, leaving only
+    the (inherently sequential) selection as a loop over buckets rather than over points.
+
+    Parameters:
+    -----------
+        - x_array: Iterable
+            Monotonically increasing x values (e.g. the `time` stream)
+        - y_array: Iterable
+            The values to downsample.  NaN values are treated as zero for the purposes of point selection
+        - max_points: int
+            The maximum number of points to keep.  Must be at least 3
+
+    Returns:
+    -----------
+        - A sorted integer array of indices into the input arrays
+    """
+    x = np.asarray(x_array, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y_array, dtype=np.float64))
+    n_points = len(x)
+
+    if max_points < 3:
+        raise ValueError(f"`max_points` must be at least 3.  {max_points} was passed")
+    if n_points <= max_points:
+        return np.arange(n_points)
+
+    # Interior buckets, plus a final "bucket" holding only the last point
+    bucket_edges = np.linspace(1, n_points - 1, max_points - 1).astype(np.int64)
+    bucket_starts = bucket_edges[:-1]
+    bucket_sizes = np.diff(bucket_edges)
+    bucket_x_means = np.append(np.add.reduceat(x[:-1], bucket_starts) / bucket_sizes, x[-1])
+    bucket_y_means = np.append(np.add.reduceat(y[:-1], bucket_starts) / bucket_sizes, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n_points - 1
+    previous = 0
+    for bucket, (start, end) in enumerate(zip(bucket_edges[:-1], bucket_edges[1:])):
+        next_x, next_y = bucket_x_means[bucket + 1], bucket_y_means[bucket + 1]
+        # Twice the triangle area - the constant factor doesn't change the argmax
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
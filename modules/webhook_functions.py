@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from modules.api_functions import generate_access_token
+from modules.athlete_functions import ATHLETES_DIRECTORY, DEFAULT_ATHLETE_ID, list_athlete_profiles, \
+    load_athlete_ride_hub
+from modules.create_logger import create_logger
+from modules.gear_functions import create_gear_ledger
+from modules.instrumentation import increment_counter, timer
+from modules.objects.AthleteProfile import AthleteProfile
+from modules.objects.EventQueue import EventQueue
+from modules.objects.RideDataProcessor import RideDataProcessor
+
+DEFAULT_QUEUE_DIRECTORY = 'data/webhook_queue'
+DEFAULT_WEBHOOK_PORT = 8787
+# Strava access tokens last 6 hours.  Tokens are refreshed a little early so they never expire mid-request
+ACCESS_TOKEN_LIFETIME_SECONDS = 5 * 60 * 60
+REQUIRED_EVENT_KEYS = ('object_type', 'object_id', 'aspect_type', 'owner_id')
+
+logger = create_logger('WebhookLogger', 'info')
+
+
+# Internal use
+def _create_request_handler(event_queue: EventQueue, verify_token: str) -> type:
+    """Builds the request handler class for `create_webhook_server()`, bound to a queue and verify token"""
+
+    class StravaWebhookRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            """Subscription validation: echo hub.challenge back if hub.verify_token matches"""
+            query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+            if query.get('hub.mode') != 'subscribe' or query.get('hub.verify_token') != verify_token:
+                self._send_json(403, {'error': 'Invalid verify token'})
+                return
+            self._send_json(200, {'hub.challenge': query.get('hub.challenge', '')})
+
+        def do_POST(self):
+            """Event delivery: validate, enqueue durably, and acknowledge.  Processing happens in the worker"""
+            try:
+                event = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                validate_webhook_event(event)
+            except ValueError as error:
+                self._send_json(400, {'error': str(error)})
+                return
+
+            with timer('webhook.enqueue'):
+                event_queue.put(event)
+            increment_counter('webhook.events_received')
+            # Strava expects a 200 within two seconds, so nothing else happens before responding
+            self._send_json(200, {'status': 'queued'})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+        def _send_json(self, status_code: int, body: dict) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StravaWebhookRequestHandler
+
+
+def validate_webhook_event(event: dict) -> None:
+    """Raises a ValueError if `event` is not a Strava push subscription event"""
+    if not isinstance(event, dict):
+        raise ValueError(f"Events must be JSON objects.  {type(event)} was passed")
+    missing_keys = [key for key in REQUIRED_EVENT_KEYS if key not in event]
+    if missing_keys:
+        raise ValueError(f"Event is missing {missing_keys}")
+    if event['aspect_type'] not in ('create', 'update', 'delete'):
+        raise ValueError(f"Unknown aspect_type: {event['aspect_type']}")
+
+
+def create_webhook_server(event_queue: EventQueue,
+                          verify_token: str,
+                          host: str = '127.0.0.1',
+                          port: int = DEFAULT_WEBHOOK_PORT) -> ThreadingHTTPServer:
+    """
+    Creates (but does not start) the HTTP endpoint for Strava push subscriptions.
+
+        GET  /?hub.mode=subscribe&hub.verify_token=...&hub.challenge=...   subscription validation
+        POST /  {"object_type": "activity", "object_id": 123, "aspect_type": "create", "owner_id": 456, ...}
+
+    Events are written to `event_queue` before the response is sent, so an acknowledged event is never lost.
+    Synthetic events can be posted the same way for testing:
+
+        curl -X POST localhost:8787 -d '{"object_type": "activity", "object_id": 123, "aspect_type": "create",
+                                         "owner_id": 456}'
+    """
+    return ThreadingHTTPServer((host, port), _create_request_handler(event_queue, verify_token))
+
+
+class WebhookEventWorker:
+    """
+    Applies queued webhook events to each athlete's ride hub through `RideDataProcessor.process_activity_event()`,
+    which fetches only the affected activity.
+
+    Events are routed to the athlete whose ID matches the event's `owner_id`, and any other owner's events go to the
+    default athlete (see `list_athlete_profiles()`).  Each athlete's hub and access token are loaded on their first
+    event and kept, so a steady trickle of events doesn't reload anyone's history.  Before each event the processor takes the
+    rides file's lock and syncs the hub if the dashboard or `cli.py sync` has written the file since, so the worker
+    never saves over their rides (see RideDataProcessor).  Failed events are retried by the queue.
+
+    Methods:
+
+        process_next_event(self, timeout: float = 0):
+            Claims and applies one event.  Returns False if none arrived within `timeout` seconds.
+
+        run(self, stop_event: threading.Event):
+            Processes events until `stop_event` is set.
+    """
+
+    def __init__(self, event_queue: EventQueue, athletes_directory: str = ATHLETES_DIRECTORY):
+        self.event_queue = event_queue
+        self.athletes_directory = athletes_directory
+        self._processors = {}
+
+    def process_next_event(self, timeout: float = 0) -> bool:
+        """Claims the oldest queued event and applies it.  Returns False if no event arrived within `timeout`"""
+        claimed = self.event_queue.claim(timeout=timeout)
+        if claimed is None:
+            return False
+
+        handle, event = claimed
+        try:
+            if event['object_type'] != 'activity':
+                # Athlete events (e.g. deauthorization) don't affect stored rides
+                outcome = 'ignored'
+            else:
+                with timer('webhook.process_event'):
+                    processor = self._get_processor(self._get_athlete_profile(event['owner_id']))
+                    outcome = processor.process_activity_event(event['aspect_type'], int(event['object_id']))
+        except Exception as error:
+            logger.error(f"Event {handle} ({event.get('aspect_type')} {event.get('object_id')}) failed: {error}")
+            self.event_queue.fail(handle, repr(error))
+            return True
+
+        self.event_queue.complete(handle)
+        increment_counter(f"webhook.events_{outcome}")
+        logger.info(f"Event {handle}: {event['aspect_type']} {event['object_type']} {event['object_id']} -> {outcome}")
+        return True
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Processes events as they arrive until `stop_event` is set"""
+        while not stop_event.is_set():
+            self.process_next_event(timeout=1.0)
+
+    # Internal use
+    def _get_athlete_profile(self, owner_id: int) -> AthleteProfile:
+        profiles = {profile.athlete_id: profile for profile in list_athlete_profiles(self.athletes_directory)}
+        if str(owner_id) in profiles:
+            return profiles[str(owner_id)]
+        # The default athlete's Strava ID isn't recorded, so events from owners who haven't been set up are theirs
+        if DEFAULT_ATHLETE_ID in profiles:
+            return profiles[DEFAULT_ATHLETE_ID]
+        raise ValueError(f"No athlete is set up for owner_id {owner_id}")
+
+    def _get_processor(self, profile: AthleteProfile) -> RideDataProcessor:
+        """Returns the athlete's processor, loading their hub on first use and refreshing expired access tokens"""
+        processor, token_created_at = self._processors.get(profile.athlete_id, (None, 0))
+        if processor is None:
+            ride_hub = load_athlete_ride_hub(profile)
+            # Logs gear thresholds reached by incoming rides
+            create_gear_ledger(ride_hub, profile.gear_path)
+            processor = RideDataProcessor('', {}, ride_hub, save_path=profile.rides_path, ftp=profile.ftp)
+        if time.monotonic() - token_created_at > ACCESS_TOKEN_LIFETIME_SECONDS or not processor.token:
+            processor.token = generate_access_token(profile.refresh_token)
+            processor.headers = {'Authorization': f'Authorization: Bearer {processor.token}'}
+            token_created_at = time.monotonic()
+        self._processors[profile.athlete_id] = (processor, token_created_at)
+        return processor
@@ -1,11 +1,15 @@
 import streamlit as st
+from modules.dashboard_functions import select_athlete
+from modules.instrumentation import profile_block
 from modules.plotting import plot_tsb_ctl_atl
 
 # Streamlit page
 st.title("Training Stress Balance")
+_, ride_hub = select_athlete()
 
 # Fetch the figure and update its layout
-fig = plot_tsb_ctl_atl()
+with profile_block('page.training_stress_balance'):
+    fig = plot_tsb_ctl_atl(ride_hub)
 fig.update_layout(
     autosize=False,
     width=800,  # Adjust the width as needed
@@ -1,7 +1,11 @@
 import streamlit as st
+from modules.dashboard_functions import select_athlete
+from modules.instrumentation import profile_block
 from modules.plotting import plot_weekly_tss
 
 # Streamlit page
 st.title("Weekly TSS")
-fig2 = plot_weekly_tss()
+_, ride_hub = select_athlete()
+with profile_block('page.weekly_tss'):
+    fig2 = plot_weekly_tss(ride_hub)
 st.plotly_chart(fig2, use_container_width=False)
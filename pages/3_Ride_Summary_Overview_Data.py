@@ -1,8 +1,20 @@
+from datetime import date, timedelta
 import streamlit as st
+from modules.dashboard_functions import select_athlete
 from modules.data_functions import create_ride_summary_dataframe
+from modules.instrumentation import profile_block
 
 # Streamlit page
 st.title("Ride History")
 st.header("Ride Summary")
-df = create_ride_summary_dataframe()
+_, ride_hub = select_athlete()
+
+date_range = st.date_input("Rides between", value=(), max_value=date.today(),
+                           help="Leave empty to show the whole ride history")
+with profile_block('page.ride_summary'):
+    if len(date_range) == 2:
+        # The end of a query range is exclusive, so include the whole of the last selected day
+        df = create_ride_summary_dataframe(ride_hub.query(start=date_range[0], end=date_range[1] + timedelta(days=1)))
+    else:
+        df = create_ride_summary_dataframe(ride_hub)
 st.dataframe(df)
@@ -0,0 +1,34 @@
+import streamlit as st
+from modules.athlete_functions import get_athlete_ride_hub, load_athlete_profile
+from modules.dashboard_functions import select_athlete
+from modules.instrumentation import profile_block
+from modules.objects.RideHeatmap import RideHeatmap
+from modules.plotting import plot_ride_heatmap
+
+
+@st.cache_resource
+def load_heatmap(athlete_id: str) -> RideHeatmap:
+    """
+    Loads an athlete's pre-computed heatmap and brings it in line with their rides: rides added since it was last
+    saved are folded in, and it is rebuilt if any of its rides have since been deleted
+    """
+    heatmap_directory = load_athlete_profile(athlete_id).heatmap_directory
+    ride_hub = get_athlete_ride_hub(athlete_id)
+    heatmap = RideHeatmap.load(heatmap_directory)
+    if heatmap.reconcile(ride_hub):
+        heatmap.save(heatmap_directory)
+    ride_hub.register_listener(heatmap, replay_existing_rides=False)
+    return heatmap
+
+
+# Streamlit page
+st.title("Ride Heatmap")
+athlete, _ = select_athlete()
+heatmap = load_heatmap(athlete.athlete_id)
+# The hub's listener updates the cached heatmap whenever rides are synced from the saved file, e.g. after a refresh
+if heatmap.has_unsaved_changes:
+    heatmap.save(athlete.heatmap_directory)
+zoom = st.select_slider("Detail level", options=heatmap.zoom_levels, value=heatmap.zoom_levels[-2])
+with profile_block('page.ride_heatmap'):
+    fig = plot_ride_heatmap(heatmap, zoom=zoom)
+st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,42 @@
+import streamlit as st
+from modules.athlete_functions import get_athlete_ride_hub, load_athlete_profile
+from modules.dashboard_functions import select_athlete
+from modules.data_functions import create_individual_ride_metrics_dataframe, create_route_performance_dataframe
+from modules.instrumentation import profile_block
+from modules.plotting import plot_individual_ride_streams
+
+
+@st.cache_data
+def load_ride_metrics(athlete_id: str, ride_id: int):
+    """Caches the full-resolution streams so that changing the zoom window only re-samples them"""
+    lactate_threshold = load_athlete_profile(athlete_id).lactate_threshold
+    return create_individual_ride_metrics_dataframe(ride_id, get_athlete_ride_hub(athlete_id), lactate_threshold)
+
+
+# Streamlit page
+st.title("Individual Ride")
+athlete, ride_hub = select_athlete()
+
+rides = sorted(ride_hub, key=lambda ride: ride.metadata.get('start_date', ''), reverse=True)
+ride = st.selectbox("Ride", rides,
+                    format_func=lambda x: f"{x.metadata.get('start_date', '')[:10]} - {x.metadata.get('name', x.id)}")
+metrics_df = load_ride_metrics(athlete.athlete_id, ride.id)
+
+max_points = st.sidebar.slider("Points per trace", min_value=250, max_value=5000, value=1500, step=250)
+first_second, last_second = int(metrics_df.time.min()), int(metrics_df.time.max())
+time_range = st.slider("Time window (seconds)", min_value=first_second, max_value=last_second,
+                       value=(first_second, last_second))
+
+with profile_block('page.individual_ride'):
+    fig = plot_individual_ride_streams(metrics_df, time_range=time_range, max_points_per_trace=max_points)
+st.plotly_chart(fig, use_container_width=True)
+
+st.subheader("Same route")
+if ride.id in ride_hub.route_index:
+    route_df = create_route_performance_dataframe(ride.id, ride_hub)
+    if len(route_df) > 1:
+        st.dataframe(route_df)
+    else:
+        st.caption("No other rides follow this route")
+else:
+    st.caption("This ride has no GPS route")
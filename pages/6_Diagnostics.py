@@ -0,0 +1,41 @@
+import pandas as pd
+import streamlit as st
+from modules.instrumentation import PROFILING_ENVIRONMENT_VARIABLE, dump_metrics, get_metrics_snapshot, \
+    get_profile_reports, is_profiling_enabled, reset_metrics
+
+# Streamlit page
+st.title("Diagnostics")
+st.caption("Timings are collected in-process since the app started.  Visit other pages to populate them.")
+
+snapshot = get_metrics_snapshot()
+
+st.header("Stage Timings")
+if snapshot['timings']:
+    timings_df = pd.DataFrame.from_dict(snapshot['timings'], orient='index')
+    timings_df = timings_df[['count', 'mean_ms', 'min_ms', 'max_ms', 'last_ms', 'total_ms']]
+    st.dataframe(timings_df.sort_values('total_ms', ascending=False).round(1))
+
+    selected = st.selectbox("Timing histogram", sorted(snapshot['timings']))
+    histogram_df = pd.DataFrame({'bucket_ms': [f"<= {bound}" for bound in snapshot['histogram_buckets_ms']],
+                                 'count': snapshot['timings'][selected]['histogram']}).set_index('bucket_ms')
+    st.bar_chart(histogram_df)
+else:
+    st.info("No timings recorded yet.")
+
+st.header("Counters")
+st.json(snapshot['counters'])
+
+st.header("Profiles")
+if not is_profiling_enabled():
+    st.info(f"Set the {PROFILING_ENVIRONMENT_VARIABLE}=1 environment variable to capture a cProfile/tracemalloc "
+            f"report for every page load.")
+for name, profile in get_profile_reports().items():
+    with st.expander(f"{name} | {profile['elapsed_ms']:.0f} ms | peak {profile['peak_memory_bytes'] / 1e6:.1f} MB "
+                     f"| {profile['captured_at']}"):
+        st.code(profile['report'])
+
+st.download_button("Download metrics (JSON)", data=dump_metrics(), file_name='strava_metrics.json',
+                   mime='application/json')
+if st.button("Reset metrics"):
+    reset_metrics()
+    st.rerun()